@@ -0,0 +1,266 @@
+# Lazy Chip micro-benchmarks.
+# Runs headless, on synthetic meshes at several scales and resolutions:
+#
+#   blender -b --factory-startup --python-exit-code 1 -P benchmarks/lazy_chip_benchmark.py -- \
+#       --output results.json [--baseline baseline.json] [--threshold 1.2] [--quick]
+#
+# Every case applies the damage through LAZYCHIP_OP_applydamage and collects
+# the stage timings recorded by the Lazy Chip profiler, then times
+# is_watertight_mesh (on fresh, then cached diagnostics) and
+# make_non_manifold_iterate on the result. The decimation cases time the
+# quadric decimation against the engine's edge collapse on spheres. The results
+# are written as JSON; when a baseline is given, the medians are compared
+# against it and the exit code is 1 if any stage got slower than the threshold.
+
+import os
+import sys
+import math
+import json
+import time
+import argparse
+import platform
+import numpy as np
+import bpy
+import bmesh
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import lazy_chip
+import lazy_decimation
+from lazy_chip.engine import decimate_collapse
+from lazy_chip.profiling import profiler
+from lazy_chip.mesh_operators import is_watertight_mesh, make_non_manifold_iterate, diagnostics_cache
+
+
+# Meshes, scales and resolutions of the full run, and of the quick one
+SHAPES = ["cube", "brick", "sculpt"]
+SCALES = [1.0, 2.0, 4.0]
+RESOLUTIONS = [32, 64, 128]
+QUICK_SCALES = [1.0]
+QUICK_RESOLUTIONS = [32]
+# Icosphere subdivisions of the decimation cases, and ratio they go down to
+DECIMATION_SUBDIVISIONS = [5, 6, 7]
+QUICK_DECIMATION_SUBDIVISIONS = [5]
+DECIMATION_RATIO = 0.1
+
+
+def parse_arguments():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(description="Lazy Chip stage benchmarks")
+    parser.add_argument("--output", default="lazy_chip_benchmark.json", help="Where to write the results")
+    parser.add_argument("--baseline", default=None, help="Results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="Slowdown ratio reported as a regression")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs of each case")
+    parser.add_argument("--modifiers", action="store_true", help="Use the modifier pipeline instead of the in-memory engine")
+    parser.add_argument("--quick", action="store_true", help="Only the smallest scale and resolution")
+    return parser.parse_args(argv)
+
+
+def build_shape(bm, shape):
+    """
+    Fills the bmesh with one of the synthetic test meshes, about one unit wide.
+    """
+    if shape == "cube":
+        bmesh.ops.create_cube(bm, size=1.0)
+    elif shape == "brick":
+        bmesh.ops.create_cube(bm, size=1.0)
+        bmesh.ops.scale(bm, vec=(2.0, 1.0, 0.6), verts=bm.verts)
+        bmesh.ops.bevel(bm, geom=bm.edges[:], offset=0.08, segments=3, affect='EDGES')
+    elif shape == "sculpt":
+        # Dense, lumpy sphere standing in for a sculpted mesh
+        bmesh.ops.create_icosphere(bm, subdivisions=6, radius=0.5)
+        for vert in bm.verts:
+            x, y, z = vert.co
+            vert.co *= 1.0 + 0.08 * math.sin(9.0 * x) * math.sin(7.0 * y) * math.sin(11.0 * z)
+    else:
+        raise ValueError("Unknown shape " + shape)
+
+
+def make_object(shape, scale):
+    mesh = bpy.data.meshes.new("bench_" + shape)
+    bm = bmesh.new()
+    build_shape(bm, shape)
+    bmesh.ops.scale(bm, vec=(scale, scale, scale), verts=bm.verts)
+    bm.to_mesh(mesh)
+    bm.free()
+    current_object = bpy.data.objects.new("bench_" + shape, mesh)
+    bpy.context.scene.collection.objects.link(current_object)
+    return current_object
+
+
+def clear_scene():
+    for current_object in list(bpy.data.objects):
+        bpy.data.objects.remove(current_object, do_unlink=True)
+    for mesh in list(bpy.data.meshes):
+        bpy.data.meshes.remove(mesh, do_unlink=True)
+
+
+def set_up_props(scene, resolution, use_engine):
+    # Deterministic settings: fixed seed, one attempt, and a fixed scale so
+    # that bigger objects mean more voxels
+    weathering_props = scene.weathering_props
+    weathering_props.live_preview_property = False
+    weathering_props.random_seed_property = False
+    weathering_props.seed_property = 1
+    weathering_props.attempts_property = 1
+    weathering_props.fix_between_steps_property = False
+    weathering_props.fixed_scale_check_property = True
+    weathering_props.fixed_scale_property = 1.0
+    weathering_props.resolution_property = resolution
+    weathering_props.use_engine_property = use_engine
+    weathering_props.use_workers_property = False
+    weathering_props.cache_size_property = 0
+
+
+def summarize(values):
+    values = np.array(values)
+    return {
+        "median": float(np.median(values)),
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "runs": len(values),
+    }
+
+
+def run_case(shape, scale, resolution, repeats, use_engine):
+    """
+    Stage timings of one case, over the given number of runs.
+    """
+    stage_times = {}
+    for repeat in range(repeats):
+        clear_scene()
+        current_object = make_object(shape, scale)
+        set_up_props(bpy.context.scene, resolution, use_engine)
+        for selected_object in bpy.context.selected_objects:
+            selected_object.select_set(False)
+        current_object.select_set(True)
+        bpy.context.view_layer.objects.active = current_object
+
+        profiler.clear()
+        start_t = time.perf_counter()
+        bpy.ops.lazychip.op_applydamage()
+        stage_times.setdefault("apply damage", []).append(time.perf_counter() - start_t)
+        for stage_name, stage in profiler.statistics.items():
+            stage_times.setdefault(stage_name, []).append(stage["total"])
+
+        # Once on fresh diagnostics, then on the cached ones
+        diagnostics_cache.invalidate(current_object.data)
+        start_t = time.perf_counter()
+        is_watertight_mesh(current_object)
+        stage_times.setdefault("is_watertight_mesh", []).append(time.perf_counter() - start_t)
+        start_t = time.perf_counter()
+        is_watertight_mesh(current_object)
+        stage_times.setdefault("is_watertight_mesh (cached)", []).append(time.perf_counter() - start_t)
+
+        bpy.context.view_layer.objects.active = current_object
+        start_t = time.perf_counter()
+        make_non_manifold_iterate(current_object, 5)
+        stage_times.setdefault("make_non_manifold_iterate", []).append(time.perf_counter() - start_t)
+
+    return {
+        "shape": shape,
+        "scale": scale,
+        "resolution": resolution,
+        "faces": len(current_object.data.polygons),
+        "stages": {stage_name: summarize(values) for stage_name, values in stage_times.items()},
+    }
+
+
+def run_decimation_case(subdivisions, repeats):
+    """
+    Times the quadric decimation of Smart Decimation and the edge collapse
+    of the engine on the same sphere, down to DECIMATION_RATIO.
+    """
+    bm = bmesh.new()
+    bmesh.ops.create_icosphere(bm, subdivisions=subdivisions, radius=0.5)
+    verts = np.array([vert.co[:] for vert in bm.verts])
+    tris = np.array([[vert.index for vert in face.verts] for face in bm.faces])
+    bm.free()
+
+    stage_times = {}
+    for repeat in range(repeats):
+        start_t = time.perf_counter()
+        lazy_decimation.quadric_decimate(verts, tris, int(len(tris) * DECIMATION_RATIO))
+        stage_times.setdefault("quadric_decimate", []).append(time.perf_counter() - start_t)
+        start_t = time.perf_counter()
+        decimate_collapse(verts, tris, DECIMATION_RATIO)
+        stage_times.setdefault("decimate_collapse", []).append(time.perf_counter() - start_t)
+
+    return {
+        "subdivisions": subdivisions,
+        "faces": len(tris),
+        "stages": {stage_name: summarize(values) for stage_name, values in stage_times.items()},
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints the median ratio of every stage against the baseline and returns
+    the stages slower than the threshold.
+    """
+    regressions = []
+    for case_name, case in results["cases"].items():
+        baseline_case = baseline["cases"].get(case_name)
+        if baseline_case is None:
+            print("%-28s not in the baseline" % case_name)
+            continue
+        for stage_name, stage in case["stages"].items():
+            baseline_stage = baseline_case["stages"].get(stage_name)
+            if baseline_stage is None or baseline_stage["median"] <= 0:
+                continue
+            ratio = stage["median"] / baseline_stage["median"]
+            flag = ""
+            if ratio > threshold:
+                flag = "  SLOWER"
+                regressions.append((case_name, stage_name, ratio))
+            elif ratio < 1.0 / threshold:
+                flag = "  faster"
+            print("%-28s %-26s %9.4fs -> %9.4fs  x%.2f%s" % (
+                case_name, stage_name, baseline_stage["median"], stage["median"], ratio, flag))
+    return regressions
+
+
+def main():
+    arguments = parse_arguments()
+    lazy_chip.register()
+
+    scales = QUICK_SCALES if arguments.quick else SCALES
+    resolutions = QUICK_RESOLUTIONS if arguments.quick else RESOLUTIONS
+    results = {
+        "blender": bpy.app.version_string,
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "pipeline": "modifiers" if arguments.modifiers else "engine",
+        "repeats": arguments.repeats,
+        "cases": {},
+    }
+    for shape in SHAPES:
+        for scale in scales:
+            for resolution in resolutions:
+                case_name = "%s_x%g_r%d" % (shape, scale, resolution)
+                case = run_case(shape, scale, resolution, arguments.repeats, not arguments.modifiers)
+                results["cases"][case_name] = case
+                print("%-28s %8.3fs  (%d faces)" % (
+                    case_name, case["stages"]["apply damage"]["median"], case["faces"]))
+    for subdivisions in QUICK_DECIMATION_SUBDIVISIONS if arguments.quick else DECIMATION_SUBDIVISIONS:
+        case_name = "decimate_ico%d" % subdivisions
+        case = run_decimation_case(subdivisions, arguments.repeats)
+        results["cases"][case_name] = case
+        print("%-28s %8.3fs quadric, %8.3fs collapse  (%d faces)" % (
+            case_name, case["stages"]["quadric_decimate"]["median"],
+            case["stages"]["decimate_collapse"]["median"], case["faces"]))
+
+    with open(arguments.output, "w") as output_file:
+        json.dump(results, output_file, indent=2)
+    print("Results written to " + arguments.output)
+
+    lazy_chip.unregister()
+    if arguments.baseline:
+        with open(arguments.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, arguments.threshold)
+        if regressions:
+            print(str(len(regressions)) + " stages slower than x" + str(arguments.threshold))
+            sys.exit(1)
+
+
+main()
@@ -3,6 +3,13 @@ from . import mesh_operators
 from . import ui
 from . import preset_operators
 from . import damage
+from . import cache
+from . import preview
+from . import profiling
+from . import stash
+from . import variants
+from . import offload
+from . import journal
 
 
 bl_info = {
@@ -34,6 +41,13 @@ def register():
     preset_operators.register()
     mesh_operators.register()
     damage.register()
+    cache.register()
+    preview.register()
+    profiling.register()
+    stash.register()
+    variants.register()
+    offload.register()
+    journal.register()
 
     # Creating local variable
     bpy.types.Scene.weathering_props = bpy.props.PointerProperty(type=ui.WeatheringProps)
@@ -44,6 +58,13 @@ def unregister():
     preset_operators.unregister()
     mesh_operators.unregister()
     damage.unregister()
+    cache.unregister()
+    preview.unregister()
+    profiling.unregister()
+    stash.unregister()
+    variants.unregister()
+    journal.unregister()
+    offload.unregister()
 
     del bpy.types.Scene.weathering_props
 
@@ -0,0 +1,226 @@
+import bpy
+import os
+import json
+import time
+import random
+from types import SimpleNamespace
+from .engine import DamageParameters
+from .budget import plan_job
+from .variants import preset_params, damage_until_watertight
+from .mesh_operators import is_watertight_mesh, make_non_manifold_iterate
+from .preset_operators import PRESETS
+from .profiling import profiler
+
+# Headless chipping of folders of printable models.
+# Every file goes through import -> chip -> watertight repair -> export on its
+# own, and everything it created is removed before the next one, so that the
+# memory stays flat over a long batch. Nothing here depends on the selection,
+# the active object or the scene settings: the damage settings are given as
+# DamageParameters.
+
+EXTENSIONS = (".stl", ".obj")
+
+
+def has_operator(module, name):
+    return name in dir(module)
+
+
+def import_models(path):
+    """
+    Imports an STL or OBJ file, returning the new mesh objects.
+    """
+    before = set(bpy.data.objects)
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".stl":
+        if has_operator(bpy.ops.wm, "stl_import"):
+            bpy.ops.wm.stl_import(filepath=path)
+        else:
+            bpy.ops.import_mesh.stl(filepath=path)
+    elif extension == ".obj":
+        bpy.ops.wm.obj_import(filepath=path)
+    else:
+        raise ValueError("Unsupported file " + path)
+    return [current_object for current_object in bpy.data.objects
+            if current_object not in before and current_object.type == 'MESH']
+
+
+def export_models(objects, path):
+    """
+    Exports the objects to an STL or OBJ file.
+    """
+    for current_object in bpy.context.view_layer.objects:
+        current_object.select_set(current_object in objects)
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".stl":
+        if has_operator(bpy.ops.wm, "stl_export"):
+            bpy.ops.wm.stl_export(filepath=path, export_selected_objects=True)
+        else:
+            bpy.ops.export_mesh.stl(filepath=path, use_selection=True)
+    elif extension == ".obj":
+        bpy.ops.wm.obj_export(filepath=path, export_selected_objects=True)
+    else:
+        raise ValueError("Unsupported file " + path)
+
+
+# Datablocks an import and the chipping can create
+CREATED_DATA = ("objects", "meshes", "materials", "images")
+
+
+def data_snapshot():
+    """
+    Session ids of the datablocks that a file can add, to tell them apart
+    from those of the open session afterwards.
+    """
+    return {data_name: {datablock.session_uid for datablock in getattr(bpy.data, data_name)}
+            for data_name in CREATED_DATA}
+
+
+def remove_created(snapshot):
+    """
+    Removes the datablocks created since the snapshot, and only those.
+    """
+    created = []
+    for data_name in CREATED_DATA:
+        created += [datablock for datablock in getattr(bpy.data, data_name)
+                    if datablock.session_uid not in snapshot[data_name]]
+    bpy.data.batch_remove(created)
+
+
+def budget_settings(voxel_budget=256, memory_budget=4096, over_budget='TILE'):
+    """
+    Budget settings in the form plan_job reads them from the scene.
+    """
+    return SimpleNamespace(voxel_budget_property=voxel_budget, memory_budget_property=memory_budget,
+                           over_budget_property=over_budget)
+
+
+def chip_models(context, objects, params, attempts, budget, repair=True):
+    """
+    Damages each object in place. Returns the attempts used, whether all the
+    results are watertight, and the chip and repair times.
+    """
+    used_attempts = 0
+    chip_time = repair_time = 0.0
+    watertight = True
+    for current_object in objects:
+        start_t = time.perf_counter()
+        object_params, message = plan_job(current_object.dimensions, params, budget)
+        if message is not None:
+            print(current_object.name + " " + message)
+        object_params = DamageParameters.from_dict(object_params.to_dict())
+        with profiler.span("object", current_object.name):
+            chipped_mesh, attempts_done = damage_until_watertight(
+                context, current_object, object_params, current_object.data.name + "_chipped",
+                None, None, attempts)
+        original_mesh = current_object.data
+        current_object.data = chipped_mesh
+        bpy.data.meshes.remove(original_mesh)
+        used_attempts += attempts_done
+        chip_time += time.perf_counter() - start_t
+
+        start_t = time.perf_counter()
+        if repair and not is_watertight_mesh(current_object):
+            context.view_layer.objects.active = current_object
+            with profiler.span("fix manifold", current_object.name):
+                make_non_manifold_iterate(current_object, 5)
+        watertight = watertight and is_watertight_mesh(current_object)
+        repair_time += time.perf_counter() - start_t
+    return used_attempts, watertight, chip_time, repair_time
+
+
+def input_files(input_dir, recursive=False):
+    """
+    Model files of the folder, as paths relative to it, in a stable order.
+    """
+    paths = []
+    for directory, subdirectories, file_names in os.walk(input_dir):
+        subdirectories.sort()
+        for file_name in sorted(file_names):
+            if file_name.lower().endswith(EXTENSIONS):
+                paths.append(os.path.relpath(os.path.join(directory, file_name), input_dir))
+        if not recursive:
+            break
+    return paths
+
+
+def chip_file(context, input_path, output_path, params, attempts=5, budget=None, repair=True):
+    """
+    Import, chip, repair and export of one file. Returns its report.
+    """
+    budget = budget or budget_settings()
+    report = {"file": input_path, "output": output_path}
+    snapshot = data_snapshot()
+    # Timed on its own, the profile of the session is left as it was
+    with profiler.isolated():
+        start_t = time.perf_counter()
+        try:
+            objects = import_models(input_path)
+            report["import"] = time.perf_counter() - start_t
+            report["objects"] = len(objects)
+            report["faces_in"] = sum(len(current_object.data.polygons) for current_object in objects)
+
+            report["attempts"], report["watertight"], report["chip"], report["repair"] = chip_models(
+                context, objects, params, attempts, budget, repair)
+            report["faces_out"] = sum(len(current_object.data.polygons) for current_object in objects)
+
+            export_start_t = time.perf_counter()
+            os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+            export_models(objects, output_path)
+            report["export"] = time.perf_counter() - export_start_t
+        except Exception as error:
+            report["error"] = repr(error)
+        finally:
+            remove_created(snapshot)
+        report["total"] = time.perf_counter() - start_t
+        report["stages"] = {stage_name: stage["total"] for stage_name, stage in profiler.statistics.items()}
+    return report
+
+
+def chip_folder(input_dir, output_dir, params, attempts=5, budget=None, repair=True,
+                output_format=None, recursive=False, random_seed=False):
+    """
+    Chips every model of the input folder into the output folder, keeping the
+    relative paths. The output format is the one of each input unless given
+    ("stl" or "obj"). Returns the reports of all the files.
+    """
+    reports = []
+    file_paths = input_files(input_dir, recursive)
+    for index, relative_path in enumerate(file_paths):
+        output_path = os.path.join(output_dir, relative_path)
+        if output_format is not None:
+            output_path = os.path.splitext(output_path)[0] + "." + output_format
+        file_params = DamageParameters.from_dict(params.to_dict())
+        if random_seed:
+            file_params.seed = random.randint(0, 999999)
+        report = chip_file(bpy.context, os.path.join(input_dir, relative_path), output_path,
+                           file_params, attempts, budget, repair)
+        reports.append(report)
+        print("[%d/%d] %-40s %s" % (index + 1, len(file_paths), relative_path, summary_line(report)))
+    return reports
+
+
+def summary_line(report):
+    if "error" in report:
+        return "FAILED " + report["error"]
+    return "%8.2fs  (import %.2f, chip %.2f, repair %.2f, export %.2f)  %d -> %d faces%s" % (
+        report["total"], report["import"], report["chip"], report["repair"], report["export"],
+        report["faces_in"], report["faces_out"], "" if report["watertight"] else "  NOT WATERTIGHT")
+
+
+def write_report(reports, path):
+    with open(path, "w") as report_file:
+        json.dump({"blender": bpy.app.version_string, "files": reports}, report_file, indent=2)
+
+
+def batch_params(preset_key=None, **values):
+    """
+    Damage settings of a batch: the defaults, then the preset, then the given
+    values (DamageParameters attributes, None ones are skipped).
+    """
+    if preset_key is not None and preset_key not in PRESETS:
+        raise ValueError("Unknown preset " + preset_key + ", one of: " + ", ".join(PRESETS))
+    params = preset_params(None, preset_key)
+    for attribute, value in values.items():
+        if value is not None:
+            setattr(params, attribute, value)
+    return params
@@ -0,0 +1,99 @@
+import numpy as np
+from .engine import DamageParameters, _GRID_PADDING, min_tile_voxels
+
+# Voxel and memory budget of a damage job.
+# The voxel size comes from the smallest dimension of the object, so a thin
+# object at a high resolution can ask for billions of voxels. The job is
+# estimated from the object dimensions before it runs and, when over budget,
+# either runs anyway with a warning, runs at a lower resolution, or runs in
+# tiles of bounded size (in-memory engine only).
+
+# Rough peak memory of the engine, measured on the remesh -> decimate stack:
+# a few bytes per grid voxel, most of it per surface cell of the remesh.
+BYTES_PER_VOXEL = 10
+BYTES_PER_SURFACE_CELL = 800
+MIN_RESOLUTION = 16
+
+
+class JobEstimate:
+    """
+    Predicted size of the remesh grid and peak memory of a damage job.
+    """
+
+    def __init__(self, voxel_size, grid_shape, surface_cells):
+        self.voxel_size = voxel_size
+        self.grid_shape = grid_shape
+        self.surface_cells = surface_cells
+
+    @property
+    def voxel_count(self):
+        return float(np.prod(self.grid_shape, dtype=np.float64))
+
+    @property
+    def surface_bytes(self):
+        return self.surface_cells * BYTES_PER_SURFACE_CELL
+
+    @property
+    def peak_bytes(self):
+        return self.voxel_count * BYTES_PER_VOXEL + self.surface_bytes
+
+    def __repr__(self):
+        return "%.1fM voxels, %.0f MB" % (self.voxel_count / 1e6, self.peak_bytes / (1024 * 1024))
+
+
+def estimate_job(dimensions, params):
+    """
+    Estimates the job from the object dimensions, the surface being
+    approximated by the one of the bounding box.
+    """
+    dimensions = np.maximum(np.array(dimensions, dtype=np.float64), 0.0)
+    reference = params.fixed_scale if params.fixed_scale_check else dimensions.min()
+    if reference <= 0:
+        return JobEstimate(0.0, (np.inf, np.inf, np.inf), np.inf)
+    voxel_size = reference / params.resolution
+    grid_shape = tuple(int(n) for n in np.ceil(dimensions / voxel_size) + 2 * _GRID_PADDING + 1)
+    x, y, z = dimensions
+    surface_cells = int(2 * (x * y + y * z + z * x) / voxel_size ** 2)
+    return JobEstimate(voxel_size, grid_shape, surface_cells)
+
+
+def fit_resolution(dimensions, params, voxel_budget, memory_budget):
+    """
+    Highest resolution, up to the requested one, whose job fits the budgets.
+    """
+    low, high = MIN_RESOLUTION, params.resolution
+    trial = DamageParameters.from_dict(params.to_dict())
+    while low < high:
+        trial.resolution = (low + high + 1) // 2
+        estimate = estimate_job(dimensions, trial)
+        if estimate.voxel_count <= voxel_budget and estimate.peak_bytes <= memory_budget:
+            low = trial.resolution
+        else:
+            high = trial.resolution - 1
+    return low
+
+
+def plan_job(dimensions, params, weathering_props, can_tile=True):
+    """
+    Checks the job against the budgets of the settings. Returns the
+    parameters to run it with, and a message if it was over budget.
+    """
+    voxel_budget = weathering_props.voxel_budget_property * 1e6
+    memory_budget = weathering_props.memory_budget_property * 1024 * 1024
+    estimate = estimate_job(dimensions, params)
+    if estimate.voxel_count <= voxel_budget and estimate.peak_bytes <= memory_budget:
+        return params, None
+
+    action = weathering_props.over_budget_property
+    if action == 'WARN':
+        return params, "over budget (" + repr(estimate) + ")"
+
+    planned = DamageParameters.from_dict(params.to_dict())
+    tile_voxels = min(voxel_budget, (memory_budget - estimate.surface_bytes) / BYTES_PER_VOXEL)
+    if action == 'TILE' and can_tile and tile_voxels >= max(1e6, min_tile_voxels(estimate.grid_shape)):
+        planned.max_tile_voxels = int(tile_voxels)
+        return planned, "over budget (" + repr(estimate) + "), damaged in tiles of " + \
+            str(round(tile_voxels / 1e6, 1)) + "M voxels"
+
+    planned.resolution = fit_resolution(dimensions, params, voxel_budget, memory_budget)
+    return planned, "over budget (" + repr(estimate) + "), resolution lowered to " + str(planned.resolution)
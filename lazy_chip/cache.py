@@ -0,0 +1,95 @@
+import bpy
+import hashlib
+from collections import OrderedDict
+from bpy.types import Operator
+
+# Session cache of the remeshed and smoothed base meshes.
+# Remesh and smooth do not depend on seed, noise or decimation, so tweaking
+# those only has to redo the stages after the smooth.
+
+
+class BaseMeshCache:
+    """
+    LRU cache of tuples of arrays (verts, faces, ...), bounded by the memory
+    they use. None entries are allowed in the tuples.
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(arrays, settings):
+        """
+        Content hash of the source arrays combined with the settings the
+        base mesh depends on.
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        for array in arrays:
+            digest.update(b"-" if array is None else array.tobytes())
+        digest.update(repr(tuple(settings)).encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    @staticmethod
+    def entry_size(arrays):
+        return sum(array.nbytes for array in arrays if array is not None)
+
+    def put(self, key, *arrays):
+        if key in self.entries:
+            return
+        size = self.entry_size(arrays)
+        if size > self.max_bytes:
+            return
+
+        # The cached arrays are shared between runs, nothing may edit them
+        for array in arrays:
+            if array is not None:
+                array.flags.writeable = False
+        self.entries[key] = arrays
+        self.used_bytes += size
+        self.evict()
+
+    def evict(self):
+        while self.used_bytes > self.max_bytes and self.entries:
+            self.used_bytes -= self.entry_size(self.entries.popitem(last=False)[1])
+
+    def resize(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.evict()
+
+    def clear(self):
+        self.entries.clear()
+        self.used_bytes = 0
+
+
+base_mesh_cache = BaseMeshCache()
+
+
+class LAZYCHIP_OP_clearcache(Operator):
+    bl_label = "Clear Cache"
+    bl_idname = "lazychip.op_clearcache"
+    bl_description = "Frees the remeshed and smoothed meshes kept for quicker reruns"
+
+    def execute(self, context):
+        base_mesh_cache.clear()
+        return {'FINISHED'}
+
+
+def register():
+    bpy.utils.register_class(LAZYCHIP_OP_clearcache)
+
+def unregister():
+    bpy.utils.unregister_class(LAZYCHIP_OP_clearcache)
+    base_mesh_cache.clear()
@@ -2,11 +2,44 @@ import bpy
 import bmesh
 import mathutils
 import random
+import numpy as np
 from bpy.types import Operator
 
-# For profiling only:
 import time
 from .mesh_operators import make_non_manifold_iterate, is_watertight_mesh
+from .engine import DamageParameters, damage_steps, band_group_weights, transform_vertices, mesh_to_arrays, arrays_to_mesh
+from .workers import WorkerPool, SeedRace
+from .cache import base_mesh_cache
+from .stash import swap_in_chipped, restore_original, keep_damage, pair, original_mesh_of
+from .preview import take_preview_result
+from .noise import displacement
+from .profiling import profiler
+from .budget import plan_job
+from .journal import begin_batch, end_batch
+
+# Seconds between two steps of the interactive Apply Damage, and number of
+# steps of an object damaged by the in-memory engine
+TICK_INTERVAL = 0.01
+STAGE_COUNT = 4
+
+
+def speculative_seeds(weathering_props):
+    """
+    True if the workers race several seeds per object, which then uses up
+    all the attempts in one go.
+    """
+    return weathering_props.use_engine_property and weathering_props.use_workers_property \
+        and weathering_props.speculative_seeds_property > 1
+
+
+def worker_pool(weathering_props):
+    """
+    Pool of background workers for a batch, racing seeds if set.
+    """
+    pool = WorkerPool(weathering_props.worker_count_property)
+    if speculative_seeds(weathering_props):
+        return SeedRace(pool, weathering_props.speculative_seeds_property, weathering_props.attempts_property)
+    return pool
 
 
 def clone_object(context, i_selected_object):
@@ -24,30 +57,20 @@ class LAZYCHIP_OP_removedamage(Operator):
     bl_label = "Remove Damage"
     bl_idname = "lazychip.op_removedamage"
     bl_options = {'REGISTER', 'UNDO'}
+    records_journal = False
     
     def remove_damage(self, context, i_selected_object):
-        if '_chipped' in i_selected_object.data.name:
-            selected_name = i_selected_object.data.name
-            selected_name_split = selected_name.split('_chipped', 1)[0]
-            if bpy.data.meshes.find(selected_name_split) != -1:
-                i_selected_object.data = bpy.data.meshes[selected_name_split]
-                bpy.data.meshes.remove(
-                    bpy.data.meshes[selected_name], do_unlink=True)
-            elif bpy.data.meshes.find(selected_name_split.rsplit('.', 1)[0]) != -1:
-                i_selected_object.data = bpy.data.meshes[selected_name_split.rsplit('.', 1)[
-                    0]]
-                bpy.data.meshes.remove(
-                    bpy.data.meshes[selected_name], do_unlink=True)
-            else:
-                pass
+        restore_original(i_selected_object)
                 
     def execute(self, context):
         bpy.ops.object.mode_set(mode='OBJECT')
         scene = context.scene
         all_meshes = [
             curr_object for curr_object in context.selected_objects if curr_object.type == 'MESH']
+        begin_batch(self.records_journal, self.bl_label, all_meshes)
         for i_selected_object in all_meshes:
             self.remove_damage(context, i_selected_object)
+        end_batch(scene.weathering_props, self.records_journal)
         return {'FINISHED'}
     
 
@@ -55,64 +78,39 @@ class LAZYCHIP_OP_clearstash(Operator):
     bl_label = "Clear Stash"
     bl_idname = "lazychip.op_clearstash"
     bl_options = {'REGISTER', 'UNDO'}
+    records_journal = False
     
     def clear_stash(self, context, i_selected_object):
-        if '_chipped' in i_selected_object.data.name:
-            selected_name = i_selected_object.data.name
-            selected_name_split = selected_name.split('_chipped', 1)[0]
-            if bpy.data.meshes.find(selected_name_split) != -1:
-                i_selected_object.data.name = selected_name_split + "_applied" 
-            elif bpy.data.meshes.find(selected_name_split.rsplit('.', 1)[0]) != -1:
-                i_selected_object.data = bpy.data.meshes[selected_name_split.rsplit('.', 1)[
-                    0]]
-                bpy.data.meshes.remove(
-                    bpy.data.meshes[selected_name], do_unlink=True)
-            else:
-                pass
+        keep_damage(i_selected_object)
                 
     def execute(self, context):
         bpy.ops.object.mode_set(mode='OBJECT')
         scene = context.scene
         all_meshes = [
             curr_object for curr_object in context.selected_objects if curr_object.type == 'MESH']
+        begin_batch(self.records_journal, self.bl_label, all_meshes)
         for i_selected_object in all_meshes:
             self.clear_stash(context, i_selected_object)
+        end_batch(scene.weathering_props, self.records_journal)
         return {'FINISHED'}
 
 class LAZYCHIP_OP_applydamage(Operator):
     bl_label = "Apply Damage"
     bl_idname = "lazychip.op_applydamage"
     bl_options = {'REGISTER', 'UNDO'}
+    records_journal = False
     
 
     def remove_damage(self, context, i_selected_object):
-        if '_chipped' in i_selected_object.data.name:
-            selected_name = i_selected_object.data.name
-            # assign the original mesh back
-            selected_name_split = selected_name.split('_chipped', 1)[0]
-            if bpy.data.meshes.find(selected_name_split) != -1:
-                i_selected_object.data = bpy.data.meshes[selected_name_split]
-                bpy.data.meshes.remove(
-                    bpy.data.meshes[selected_name], do_unlink=True)
-            elif bpy.data.meshes.find(selected_name_split.rsplit('.', 1)[0]) != -1:
-                i_selected_object.data = bpy.data.meshes[selected_name_split.rsplit('.', 1)[0]]
-                bpy.data.meshes.remove(
-                    bpy.data.meshes[selected_name], do_unlink=True)
-            else:
-                pass
+        restore_original(i_selected_object)
                 
-    def apply_damage(self, context, i_selected_object):    
-
-        # Start timing for performance profiling
-        start_t = time.time() 
+    def apply_damage(self, context, i_selected_object, curr_resolution_property):    
 
         context.view_layer.objects.active = i_selected_object
-        bpy.ops.object.convert(target='MESH')
+        with profiler.span("convert"):
+            bpy.ops.object.convert(target='MESH')
 
-        self.report({'INFO'}, "SUB_T1: " + str(time.time() - start_t))
-        
         scene = context.scene
-        curr_resolution_property = scene.weathering_props.resolution_property
         curr_dimensions = i_selected_object.dimensions
         curr_scale = i_selected_object.scale
         all_dimensions_ratio = min(curr_dimensions.x/curr_scale.x, min(
@@ -125,63 +123,49 @@ class LAZYCHIP_OP_applydamage(Operator):
         new_remesh_modifier.use_smooth_shade = False
         edge_relax_value = scene.weathering_props.edge_relax_property
 
-        self.report({'INFO'}, "SUB_T2: " + str(time.time() - start_t))
-
         new_smooth_property = i_selected_object.modifiers.new("Smooth", 'SMOOTH')
         new_smooth_property.iterations = int(curr_resolution_property*edge_relax_value)
-        edge_push_value = scene.weathering_props.edge_push_property
-        rescaled_noise_value = scene.weathering_props.noise_strength_property * \
-            rescaled_ratio
-        new_displace_modifier = i_selected_object.modifiers.new(
-            "Displace", 'DISPLACE')
-        new_displace_modifier.strength = rescaled_noise_value / 2
-        new_displace_modifier.mid_level = 1.0 - edge_push_value
-        new_displace_modifier.texture_coords = 'GLOBAL'
-        random.seed(
-            scene.weathering_props.seed_property)
-        
-        self.report({'INFO'}, "SUB_T3: " + str(time.time() - start_t))
-
-        random1 = random.uniform(-99.9, 99.9)
-        random2 = random.uniform(-99.9, 99.9)
-        random3 = random.uniform(-99.9, 99.9)
-        i_selected_object.location.x += random1
-        i_selected_object.location.y += random2
-        i_selected_object.location.z += random3
-        static_noise_depth = 4
-
-        self.report({'INFO'}, "SUB_T4: " + str(time.time() - start_t))
-
-        rescaled_noise_scale = scene.weathering_props.noise_scale_property / \
-            200 * all_dimensions_ratio
-        contrast_property = scene.weathering_props.noise_contrast_property
-        noise_modifier = bpy.data.textures.new('Clouds', type='CLOUDS')
-        noise_modifier.noise_basis = 'IMPROVED_PERLIN'
-        noise_modifier.noise_scale = rescaled_noise_scale
-        noise_modifier.noise_depth = static_noise_depth
-        noise_modifier.contrast = contrast_property
-        new_displace_modifier.texture = noise_modifier
-
-        self.report({'INFO'}, "SUB_T5: " + str(time.time() - start_t))
-
-        # **Apply Decimate Modifier Before Converting to Mesh**
-        # At this point, all modifiers except decimation are added
-        # Now, add the Decimate modifier
-        decimate_ratio = scene.weathering_props.simplify_damage_ratio_property
-        decimate_modifier = i_selected_object.modifiers.new(name="Decimate", type='DECIMATE')
-        decimate_modifier.ratio = decimate_ratio
-        self.report({'INFO'}, f"Decimate modifier added with ratio {decimate_ratio}.")
 
-        # Now, apply all modifiers by converting to mesh
-        bpy.ops.object.convert(target='MESH')
-        self.report({'INFO'}, "SUB_T6: " + str(time.time() - start_t))
+        # Applying remesh and smooth, the displacement works on the result
+        with profiler.span("remesh and smooth"):
+            bpy.ops.object.convert(target='MESH')
 
-        bpy.data.textures.remove(noise_modifier)
-        i_selected_object.location.x -= random1
-        i_selected_object.location.y -= random2
-        i_selected_object.location.z -= random3
+        with profiler.span("displace"):
+            self.displace_mesh(context, i_selected_object, all_dimensions_ratio, rescaled_ratio)
 
-        self.report({'INFO'}, "SUB_T7: " + str(time.time() - start_t))                
+        # Simplifying the damaged surface
+        decimate_ratio = scene.weathering_props.simplify_damage_ratio_property
+        decimate_modifier = i_selected_object.modifiers.new(name="Decimate", type='DECIMATE')
+        decimate_modifier.ratio = decimate_ratio
+        with profiler.span("decimate"):
+            bpy.ops.object.convert(target='MESH')
+
+    def displace_mesh(self, context, i_selected_object, all_dimensions_ratio, rescaled_ratio):
+        """
+        Displaces along the vertex normals with the vectorized clouds noise,
+        sampled in global coordinates.
+        """
+        scene = context.scene
+        mesh = i_selected_object.data
+        vertex_count = len(mesh.vertices)
+        coordinates = np.empty(vertex_count * 3, dtype=np.float32)
+        normals = np.empty(vertex_count * 3, dtype=np.float32)
+        mesh.vertices.foreach_get("co", coordinates)
+        mesh.vertices.foreach_get("normal", normals)
+        coordinates = coordinates.reshape(-1, 3).astype(np.float64)
+        normals = normals.reshape(-1, 3)
+
+        global_coordinates = transform_vertices(coordinates, i_selected_object.matrix_world)
+        distances = displacement(
+            global_coordinates,
+            noise_size=scene.weathering_props.noise_scale_property / 200 * all_dimensions_ratio,
+            contrast=scene.weathering_props.noise_contrast_property,
+            edge_push=scene.weathering_props.edge_push_property,
+            strength=scene.weathering_props.noise_strength_property * rescaled_ratio / 2,
+            seed=scene.weathering_props.seed_property)
+        coordinates += normals * distances[:, None]
+        mesh.vertices.foreach_set("co", coordinates.astype(np.float32).ravel())
+        mesh.update()
 
     def clone_object(self, context, i_selected_object):
         object_copy = i_selected_object.copy()
@@ -198,97 +182,419 @@ class LAZYCHIP_OP_applydamage(Operator):
         cloned_object = self.clone_object(
             context, target_object)
         new_boolean.object = cloned_object
-        bpy.ops.object.convert(target='MESH')
+        with profiler.span("boolean"):
+            bpy.ops.object.convert(target='MESH')
         bpy.data.meshes.remove(cloned_object.data, do_unlink=True)
         
+    def store_chipped(self, context, current_mesh, chipped_mesh):
+        """
+        Intersects the chipped mesh with the original and swaps it in,
+        stashing the original.
+        """
+        swap_in_chipped(context, current_mesh, chipped_mesh,
+                        intersect=context.scene.weathering_props.intersect_mode_property == 'BOOLEAN')
+
+    def planned_params(self, scene, current_mesh, can_tile):
+        """
+        Damage settings of the object, checked against the voxel and memory
+        budgets.
+        """
+        params, message = plan_job(
+            current_mesh.dimensions, DamageParameters.from_props(scene.weathering_props),
+            scene.weathering_props, can_tile)
+        if message is not None:
+            self.report({'WARNING'}, current_mesh.name + " " + message)
+        return params
+
+    def read_source(self, scene, current_mesh):
+        """
+        Arrays and band weights of the undamaged mesh of the object, leaving
+        its current damage in place until the new one is ready.
+        """
+        shown_mesh = current_mesh.data
+        current_mesh.data = original_mesh_of(shown_mesh) or shown_mesh
+        try:
+            with profiler.span("convert", current_mesh.name):
+                verts, tris = mesh_to_arrays(current_mesh.data, current_mesh.matrix_basis)
+            return verts, tris, band_group_weights(current_mesh, scene.weathering_props)
+        finally:
+            current_mesh.data = shown_mesh
+
+    def store_arrays(self, context, current_mesh, verts, faces):
+        """
+        Replaces the damage of the object with the given arrays.
+        """
+        self.remove_damage(context, current_mesh)
+        with profiler.span("convert", current_mesh.name):
+            verts = transform_vertices(verts, current_mesh.matrix_basis.inverted())
+            chipped_mesh = arrays_to_mesh(
+                current_mesh.data.name + '_chipped', verts, faces, current_mesh.data.materials)
+        self.store_chipped(context, current_mesh, chipped_mesh)
+
+    def submit_workers(self, context, scene, pool, all_meshes, attempt=0):
+        """
+        Queues the meshes on the worker pool, keyed by (object name, attempt).
+        Returns the meshes not queued, the ones keeping their preview.
+        """
+        weathering_props = scene.weathering_props
+        kept_meshes = []
+        for current_mesh in all_meshes:
+            if take_preview_result(current_mesh, DamageParameters.from_props(weathering_props)):
+                self.report({'INFO'}, "Keeping the preview of " + current_mesh.name)
+                kept_meshes.append(current_mesh)
+                continue
+            if weathering_props.random_seed_property:
+                weathering_props.seed_property = random.randint(0, 999999)
+            verts, tris, weights = self.read_source(scene, current_mesh)
+            pool.submit((current_mesh.name, attempt), verts, tris,
+                        self.planned_params(scene, current_mesh, True),
+                        label=current_mesh.name, weights=weights)
+        return kept_meshes
+
+    def receive_worker_result(self, context, result):
+        """
+        Swaps in the result of a worker job, returning its object and attempt.
+        """
+        (object_name, attempt), verts, faces = result
+        current_mesh = bpy.data.objects[object_name]
+        if verts is None:
+            self.report({'WARNING'}, "Worker failed on " + current_mesh.name)
+            return current_mesh, attempt
+        with profiler.span("object", current_mesh.name):
+            self.store_arrays(context, current_mesh, verts, faces)
+        return current_mesh, attempt
+
+    def apply_damage_workers(self, context, scene, all_meshes):
+        """
+        Damages all the meshes on a pool of background Blender processes, then
+        swaps the results in as they come back.
+        """
+        window_manager = context.window_manager
+        with worker_pool(scene.weathering_props) as pool:
+            self.submit_workers(context, scene, pool, all_meshes)
+            window_manager.progress_begin(0, len(all_meshes))
+            done = 0
+            for result in pool.results(timeout=0.1):
+                if result is None:
+                    continue
+                current_mesh, attempt = self.receive_worker_result(context, result)
+                done += 1
+                window_manager.progress_update(done)
+                self.report({'INFO'}, "Damaged " + current_mesh.name + " (" + str(done) + "/" + str(len(all_meshes)) + ")")
+            window_manager.progress_end()
+
+    def damage_with_modifiers(self, context, scene, current_mesh, params):
+        context.view_layer.objects.active = current_mesh
+        
+        # Setting the shading to flat
+        bpy.ops.object.shade_flat()
+        
+        # Creating a temporary clone and renaming it 
+        object_copy = self.clone_object(context, current_mesh)
+        object_copy.data.name = current_mesh.data.name + '_chipped'
+        copied_matrix_basis = object_copy.matrix_basis.copy()
+        if hasattr(object_copy.data, "transform"):
+            object_copy.data.transform(copied_matrix_basis)
+
+        # Applying the damage (now includes decimation)
+        self.apply_damage(context, object_copy, params.resolution)
+
+        copied_matrix_basis.invert()
+        if hasattr(object_copy.data, "transform"):
+            object_copy.data.transform(copied_matrix_basis)
+        
+        # Proceed with the boolean operation
+        self.apply_boolean(context, object_copy, current_mesh)
+
+        # Finalize the object
+        object_copy.name = "LazyChip_tempObject"
+        pair(object_copy.data, current_mesh.data)
+        current_mesh.data = object_copy.data
+        bpy.data.objects.remove(object_copy, do_unlink=True)
+        current_mesh.select_set(False)
+
+    def damage_steps(self, context, scene, current_mesh):
+        """
+        Damage of one object, as a generator yielding between the stages of
+        the in-memory engine. The object keeps its current mesh until the
+        last stage, so closing the generator early leaves it as it was.
+        """
+        weathering_props = scene.weathering_props
+        # The live preview may already show the final result
+        if weathering_props.use_engine_property and take_preview_result(
+                current_mesh, DamageParameters.from_props(weathering_props)):
+            self.report({'INFO'}, "Keeping the preview of " + current_mesh.name)
+            return
+
+        # Updating the seed
+        if weathering_props.random_seed_property:
+            weathering_props.seed_property = random.randint(0, 999999)
+
+        if not weathering_props.use_engine_property:
+            self.remove_damage(context, current_mesh)
+            self.damage_with_modifiers(
+                context, scene, current_mesh, self.planned_params(scene, current_mesh, False))
+            return
+
+        params = self.planned_params(scene, current_mesh, True)
+        base_mesh_cache.resize(weathering_props.cache_size_property * 1024 * 1024)
+        verts, tris, weights = self.read_source(scene, current_mesh)
+        yield "convert"
+        verts, faces = yield from damage_steps(verts, tris, params, base_mesh_cache, weights)
+        yield "decimate"
+        self.store_arrays(context, current_mesh, verts, faces)
+
+    def damage_object(self, context, scene, current_mesh):
+        for stage in self.damage_steps(context, scene, current_mesh):
+            pass
+        bpy.ops.wm.redraw_timer(type='DRAW_WIN_SWAP', iterations=1)
+
     # Partial operation within execute:
     def apply_damage_one_pass(self, context, scene, all_meshes):
+        if scene.weathering_props.use_engine_property and scene.weathering_props.use_workers_property:
+            self.apply_damage_workers(context, scene, all_meshes)
+            return
+
         active_object = context.view_layer.objects.active
         for current_mesh in all_meshes:
-
-            # Updating the seed and removing the current damage
-            if scene.weathering_props.random_seed_property:
-                scene.weathering_props.seed_property = random.randint(0, 999999)
-            self.remove_damage(context, current_mesh)
-            context.view_layer.objects.active = current_mesh
-            
-            # Setting the shading to flat
-            bpy.ops.object.shade_flat()
-            
-            # Creating a temporary clone and renaming it 
-            object_copy = self.clone_object(context, current_mesh)
-            object_copy.data.name = current_mesh.data.name + '_chipped'
-            copied_matrix_basis = object_copy.matrix_basis.copy()
-            if hasattr(object_copy.data, "transform"):
-                object_copy.data.transform(copied_matrix_basis)
-                
-            # Start timing for performance profiling
-            self.report({'INFO'}, "Starting the apply damage performance.")
-            start_t = time.time()
-
-            # Applying the damage (now includes decimation)
-            self.apply_damage(context, object_copy)
-
-            self.report({'INFO'}, "Damage applied in: " + str(time.time() - start_t) + " seconds.")
-
-            copied_matrix_basis.invert()
-            if hasattr(object_copy.data, "transform"):
-                object_copy.data.transform(copied_matrix_basis)
-            
-            # Proceed with the boolean operation
-            self.apply_boolean(context, object_copy, current_mesh)
-            self.report({'INFO'}, "Boolean operation applied.")
-
-            # Finalize the object
-            current_mesh.data.use_fake_user = True
-            object_copy.name = "LazyChip_tempObject"
-            current_mesh.data = object_copy.data
-            bpy.data.objects.remove(object_copy, do_unlink=True)
-            current_mesh.data.use_fake_user = True
-            bpy.ops.wm.redraw_timer(type='DRAW_WIN_SWAP', iterations=1)
-            current_mesh.select_set(False)
+            with profiler.span("object", current_mesh.name):
+                self.damage_object(context, scene, current_mesh)
 
         for current_mesh in all_meshes:
             current_mesh.select_set(True)
         context.view_layer.objects.active = active_object
+
+    def non_watertight(self, all_meshes):
+        non_watertight_meshes = []
+        for curr_object in all_meshes:
+            with profiler.span("watertight check", curr_object.name):
+                if not is_watertight_mesh(curr_object):
+                    non_watertight_meshes.append(curr_object)
+        return non_watertight_meshes
+
+    def selected_meshes(self, context):
+        bpy.ops.object.mode_set(mode='OBJECT')
+        weathering_props = context.scene.weathering_props
+        # Applying ends the live preview, its last full resolution result is kept
+        if weathering_props.live_preview_property:
+            weathering_props.live_preview_property = False
+        return [curr_object for curr_object in context.selected_objects if curr_object.type == 'MESH']
                 
     def execute(self, context):
-        self.report({'INFO'}, "Calling Execute. Applying damages...")
-        self.report({'INFO'}, "AAA")
         scene = context.scene
-        bpy.ops.object.mode_set(mode='OBJECT')
-        all_meshes = [
-            curr_object for curr_object in context.selected_objects if curr_object.type == 'MESH']
+        start_t = time.time()
+        all_meshes = self.selected_meshes(context)
+        object_count = len(all_meshes)
+        begin_batch(self.records_journal, self.bl_label, all_meshes)
         self.apply_damage_one_pass(context, scene, all_meshes)
 
         # If set, fixing all objects right after damage
         if scene.weathering_props.fix_between_steps_property:
             for curr_object in all_meshes:
-                make_non_manifold_iterate(curr_object, 5)
+                with profiler.span("fix manifold", curr_object.name):
+                    make_non_manifold_iterate(curr_object, 5)
 
         # Checking for non watertight
-        all_meshes = [
-            curr_object for curr_object in all_meshes if not is_watertight_mesh(curr_object)]
-        watertight_iteration = 0;
+        all_meshes = self.non_watertight(all_meshes)
+        # Racing seeds on the workers already used up all the attempts
+        watertight_iteration = scene.weathering_props.attempts_property - 1 if speculative_seeds(scene.weathering_props) else 0
         while len(all_meshes) > 0:
             if watertight_iteration >= scene.weathering_props.attempts_property - 1:
                 self.report({'ERROR'}, "Reached max level of iterations (" + str(scene.weathering_props.attempts_property) + ")")
                 break
                 
             watertight_iteration = watertight_iteration + 1
-            self.apply_damage_one_pass(context, scene, all_meshes)
+            with profiler.span("retry"):
+                self.apply_damage_one_pass(context, scene, all_meshes)
         
-            all_meshes = [
-                curr_object for curr_object in all_meshes if not is_watertight_mesh(curr_object)]
-            
+            all_meshes = self.non_watertight(all_meshes)
+
+        end_batch(scene.weathering_props, self.records_journal)
+        self.report({'INFO'}, "Damaged " + str(object_count) + " objects in " + str(round(time.time() - start_t, 3)) + " seconds.")
+        return {'FINISHED'}
+
+    # Interactive version of execute, run from the timer events of a modal
+    # handler: one stage of one object (or one worker result) per tick, so
+    # that the interface stays responsive and ESC can stop the batch.
+
+    def invoke(self, context, event):
+        all_meshes = self.selected_meshes(context)
+        if not all_meshes:
+            return {'CANCELLED'}
+        scene = context.scene
+        self.start_t = time.time()
+        self.object_count = len(all_meshes)
+        self.done = 0
+        self.failed = 0
+        self.queue = []
+        self.job = None
+        self.stage = 0
+        self.pool = None
+        self.results = None
+        self.active_object = context.view_layer.objects.active
+        begin_batch(self.records_journal, self.bl_label, all_meshes)
+        if scene.weathering_props.use_engine_property and scene.weathering_props.use_workers_property:
+            # Everything goes to the workers, the queue only gets the retries
+            self.pool = worker_pool(scene.weathering_props)
+            for current_mesh in self.submit_workers(context, scene, self.pool, all_meshes):
+                self.check_object(scene, current_mesh, 0)
+            self.results = self.pool.results(timeout=0)
+        else:
+            self.queue = [(current_mesh, 0) for current_mesh in all_meshes]
+
+        window_manager = context.window_manager
+        window_manager.progress_begin(0, self.object_count)
+        self.timer = window_manager.event_timer_add(TICK_INTERVAL, window=context.window)
+        window_manager.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            in_flight = self.cancel_in_flight()
+            self.finish(context)
+            self.report({'WARNING'}, "Cancelled after " + str(self.done) + "/" + str(self.object_count) +
+                        " objects, " + (", ".join(in_flight) or "nothing") + " left as it was")
+            # The objects already damaged stay so, and are undone as one batch
+            return {'FINISHED'}
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        if self.tick(context):
+            context.window_manager.progress_update(self.done + min(self.stage, STAGE_COUNT) / (STAGE_COUNT + 1))
+            return {'RUNNING_MODAL'}
+
+        self.finish(context)
+        if self.failed:
+            self.report({'ERROR'}, str(self.failed) + " objects not watertight after " +
+                        str(context.scene.weathering_props.attempts_property) + " attempts")
+        self.report({'INFO'}, "Damaged " + str(self.object_count) + " objects in " + str(round(time.time() - self.start_t, 3)) + " seconds.")
         return {'FINISHED'}
 
+    def tick(self, context):
+        """
+        Runs one step of the batch, False once there is nothing left.
+        """
+        scene = context.scene
+        if self.results is not None:
+            result = next(self.results, False)
+            if result is False:
+                return bool(self.queue) and self.resubmit(context)
+            if result is not None:
+                current_mesh, attempt = self.receive_worker_result(context, result)
+                self.check_object(scene, current_mesh, attempt)
+            return True
+
+        if self.job is None:
+            if not self.queue:
+                return False
+            current_mesh, attempt = self.queue.pop(0)
+            self.job = (current_mesh, attempt, self.damage_steps(context, scene, current_mesh))
+            self.stage = 0
+            self.job_start = time.time()
+        current_mesh, attempt, steps = self.job
+        try:
+            # One "object" span per job, over all of its steps
+            with profiler.resume(current_mesh.name):
+                next(steps)
+            self.stage += 1
+        except StopIteration:
+            profiler.record("object", current_mesh.name, self.job_start, time.time() - self.job_start)
+            self.job = None
+            self.stage = 0
+            self.check_object(scene, current_mesh, attempt)
+        return True
+
+    def resubmit(self, context):
+        """
+        Sends the objects queued for a retry back to the workers.
+        """
+        retries = {}
+        for current_mesh, attempt in self.queue:
+            retries.setdefault(attempt, []).append(current_mesh)
+        self.queue = []
+        for attempt, all_meshes in retries.items():
+            for current_mesh in self.submit_workers(context, context.scene, self.pool, all_meshes, attempt):
+                self.check_object(context.scene, current_mesh, attempt)
+        self.results = self.pool.results(timeout=0)
+        return True
+
+    def check_object(self, scene, current_mesh, attempt):
+        """
+        Fixes and checks a freshly damaged object, queueing it again if it is
+        not watertight and there are attempts left.
+        """
+        weathering_props = scene.weathering_props
+        if attempt == 0 and weathering_props.fix_between_steps_property:
+            with profiler.span("fix manifold", current_mesh.name):
+                make_non_manifold_iterate(current_mesh, 5)
+        with profiler.span("watertight check", current_mesh.name):
+            watertight = is_watertight_mesh(current_mesh)
+        if watertight or attempt + 1 >= weathering_props.attempts_property or speculative_seeds(weathering_props):
+            self.done += 1
+            self.failed += not watertight
+            current_mesh.select_set(True)
+        else:
+            self.queue.append((current_mesh, attempt + 1))
+
+    def cancel_in_flight(self):
+        """
+        Stops the work in progress, the objects it was on keep their mesh.
+        Returns their names.
+        """
+        in_flight = []
+        if self.job is not None:
+            current_mesh, attempt, steps = self.job
+            steps.close()
+            in_flight.append(current_mesh.name)
+            self.job = None
+        if self.pool is not None:
+            in_flight += self.pool.labels_in_flight()
+        return in_flight
+
+    def finish(self, context):
+        window_manager = context.window_manager
+        window_manager.event_timer_remove(self.timer)
+        window_manager.progress_end()
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+        context.view_layer.objects.active = self.active_object
+        end_batch(context.scene.weathering_props, self.records_journal)
+
+
+# Journal undo mode versions of the operators: no Blender undo step, the
+# batch is recorded by the journal instead.
+
+class LAZYCHIP_OP_removedamage_journal(LAZYCHIP_OP_removedamage):
+    bl_idname = "lazychip.op_removedamage_journal"
+    bl_options = {'REGISTER'}
+    records_journal = True
+
+
+class LAZYCHIP_OP_clearstash_journal(LAZYCHIP_OP_clearstash):
+    bl_idname = "lazychip.op_clearstash_journal"
+    bl_options = {'REGISTER'}
+    records_journal = True
+
+
+class LAZYCHIP_OP_applydamage_journal(LAZYCHIP_OP_applydamage):
+    bl_idname = "lazychip.op_applydamage_journal"
+    bl_options = {'REGISTER'}
+    records_journal = True
+
+
 def register():
     bpy.utils.register_class(LAZYCHIP_OP_applydamage)
     bpy.utils.register_class(LAZYCHIP_OP_clearstash)
     bpy.utils.register_class(LAZYCHIP_OP_removedamage)
+    bpy.utils.register_class(LAZYCHIP_OP_applydamage_journal)
+    bpy.utils.register_class(LAZYCHIP_OP_clearstash_journal)
+    bpy.utils.register_class(LAZYCHIP_OP_removedamage_journal)
 
 def unregister():
+    bpy.utils.unregister_class(LAZYCHIP_OP_removedamage_journal)
+    bpy.utils.unregister_class(LAZYCHIP_OP_clearstash_journal)
+    bpy.utils.unregister_class(LAZYCHIP_OP_applydamage_journal)
     bpy.utils.unregister_class(LAZYCHIP_OP_applydamage)
     bpy.utils.unregister_class(LAZYCHIP_OP_clearstash)
-    bpy.utils.unregister_class(LAZYCHIP_OP_removedamage)
\ No newline at end of file
+    bpy.utils.unregister_class(LAZYCHIP_OP_removedamage)
@@ -0,0 +1,967 @@
+import bpy
+import numpy as np
+from mathutils.bvhtree import BVHTree
+from .noise import displacement
+from .profiling import profiler
+
+# In-memory damage engine.
+# Runs the Remesh -> Smooth -> Displace -> Decimate stack of Lazy Chip on plain
+# vertex/face arrays, without modifiers, operators or scene links.
+
+
+class DamageParameters:
+    """
+    Plain copy of the weathering settings used by the engine, so that the
+    pipeline does not depend on the scene or on a live PropertyGroup.
+    """
+
+    def __init__(self, resolution=64, edge_relax=3.0, edge_push=0.7, noise_scale=40.0,
+                 noise_strength=8.0, noise_contrast=1.0, seed=0, fixed_scale_check=False,
+                 fixed_scale=1.0, simplify_damage_ratio=0.5, band_mode='NONE', band_angle=np.radians(30.0),
+                 band_width=0.1, intersect_mode='BOOLEAN', max_tile_voxels=None):
+        self.resolution = resolution
+        self.edge_relax = edge_relax
+        self.edge_push = edge_push
+        self.noise_scale = noise_scale
+        self.noise_strength = noise_strength
+        self.noise_contrast = noise_contrast
+        self.seed = seed
+        self.fixed_scale_check = fixed_scale_check
+        self.fixed_scale = fixed_scale
+        self.simplify_damage_ratio = simplify_damage_ratio
+        self.band_mode = band_mode
+        self.band_angle = band_angle
+        self.band_width = band_width
+        self.intersect_mode = intersect_mode
+        # Set by the budget check on oversized jobs, the remesh is then tiled
+        self.max_tile_voxels = max_tile_voxels
+
+    @classmethod
+    def from_props(cls, weathering_props):
+        return cls(
+            resolution=weathering_props.resolution_property,
+            edge_relax=weathering_props.edge_relax_property,
+            edge_push=weathering_props.edge_push_property,
+            noise_scale=weathering_props.noise_scale_property,
+            noise_strength=weathering_props.noise_strength_property,
+            noise_contrast=weathering_props.noise_contrast_property,
+            seed=weathering_props.seed_property,
+            fixed_scale_check=weathering_props.fixed_scale_check_property,
+            fixed_scale=weathering_props.fixed_scale_property,
+            simplify_damage_ratio=weathering_props.simplify_damage_ratio_property,
+            band_mode=weathering_props.band_mode_property,
+            band_angle=weathering_props.band_angle_property,
+            band_width=weathering_props.band_width_property,
+            intersect_mode=weathering_props.intersect_mode_property)
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(**values)
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+# Mesh <-> array conversion.
+
+def mesh_to_arrays(mesh, matrix=None):
+    """
+    Reads the vertices and the triangulated faces of a mesh datablock.
+    If a matrix is given, the vertices are transformed by it.
+    """
+    verts = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", verts)
+    verts = verts.reshape(-1, 3).astype(np.float64)
+
+    mesh.calc_loop_triangles()
+    tris = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get("vertices", tris)
+    tris = tris.reshape(-1, 3)
+
+    if matrix is not None:
+        verts = transform_vertices(verts, matrix)
+    return verts, tris
+
+
+def arrays_to_mesh(name, verts, faces, materials=()):
+    """
+    Writes the given vertices and faces (all faces with the same number of
+    corners) into a new, flat shaded mesh datablock.
+    """
+    mesh = bpy.data.meshes.new(name)
+    face_size = faces.shape[1] if len(faces) else 3
+    mesh.vertices.add(len(verts))
+    mesh.loops.add(len(faces) * face_size)
+    mesh.polygons.add(len(faces))
+    mesh.vertices.foreach_set("co", np.asarray(verts, dtype=np.float32).ravel())
+    mesh.loops.foreach_set("vertex_index", np.asarray(faces, dtype=np.int32).ravel())
+    mesh.polygons.foreach_set("loop_start", np.arange(0, len(faces) * face_size, face_size, dtype=np.int32))
+    mesh.polygons.foreach_set("use_smooth", np.zeros(len(faces), dtype=bool))
+    mesh.update(calc_edges=True)
+    for material in materials:
+        mesh.materials.append(material)
+    return mesh
+
+
+def transform_vertices(verts, matrix):
+    matrix = np.array(matrix, dtype=np.float64)
+    return verts @ matrix[:3, :3].T + matrix[:3, 3]
+
+
+# Topology helpers.
+
+def unique_edges(faces):
+    """
+    Returns the sorted, unique edges of a face array.
+    """
+    edges = np.stack([faces, np.roll(faces, -1, axis=1)], axis=-1).reshape(-1, 2)
+    edges = np.sort(edges, axis=1)
+    return np.unique(edges, axis=0)
+
+
+def triangulate(faces):
+    if faces.shape[1] == 3:
+        return faces
+    fan = [np.stack([faces[:, 0], faces[:, i], faces[:, i + 1]], axis=1)
+           for i in range(1, faces.shape[1] - 1)]
+    return np.concatenate(fan)
+
+
+def compact_vertices(verts, faces):
+    """
+    Drops the vertices that are not used by any face.
+    """
+    used, inverse = np.unique(faces, return_inverse=True)
+    return verts[used], inverse.reshape(faces.shape)
+
+
+def face_normals(verts, faces):
+    """
+    Area weighted face normals (Newell's method, works for any polygon size).
+    """
+    corners = verts[faces]
+    return np.cross(corners, np.roll(corners, -1, axis=1)).sum(axis=1) * 0.5
+
+
+def vertex_normals(verts, faces):
+    normals = np.zeros_like(verts)
+    area_normals = face_normals(verts, faces)
+    for corner in range(faces.shape[1]):
+        np.add.at(normals, faces[:, corner], area_normals)
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    return normals / np.maximum(lengths, 1e-12)
+
+
+# Voxel remesh.
+# The source is voxelized by casting rays along grid columns (parity fill),
+# then a surface-net is extracted: one vertex per boundary cell, one quad per
+# grid edge that crosses the surface.
+
+# Tiny offset keeping source vertices off the grid lines, where the parity
+# count would see a shared edge twice.
+_GRID_JITTER = np.array([1.3e-4, 2.9e-4, 4.1e-4])
+_GRID_PADDING = 2
+_RASTER_CHUNK = 1 << 22
+
+# Tiles share this many grid points with their neighbours, more than the
+# reach of the ambiguity removal, so that the occupancy of the owned columns
+# is the same as on the whole grid.
+_TILE_OVERLAP = 10
+_MIN_TILE_SIDE = 8
+
+
+def _build_ambiguity_table():
+    """
+    For each 2x2x2 block configuration, flags whether the inside or the outside
+    corners are split in more than one group. Those blocks would produce a
+    non-manifold vertex or edge in the surface-net.
+    """
+    corners = [(i >> 2 & 1, i >> 1 & 1, i & 1) for i in range(8)]
+    neighbours = [[j for j in range(8) if sum(abs(a - b) for a, b in zip(corners[i], corners[j])) == 1]
+                  for i in range(8)]
+
+    def groups(members):
+        members = set(members)
+        count = 0
+        while members:
+            count += 1
+            stack = [members.pop()]
+            while stack:
+                for j in neighbours[stack.pop()]:
+                    if j in members:
+                        members.remove(j)
+                        stack.append(j)
+        return count
+
+    table = np.zeros(256, dtype=bool)
+    for config in range(256):
+        inside = [i for i in range(8) if config >> i & 1]
+        outside = [i for i in range(8) if not config >> i & 1]
+        table[config] = groups(inside) > 1 or groups(outside) > 1
+    return table
+
+
+_AMBIGUOUS_BLOCKS = _build_ambiguity_table()
+
+
+def _axis_hits(grid_verts, tris, shape, axis):
+    """
+    Intersects every grid column parallel to the given axis with the triangles.
+    Returns the flat column indices and the hit coordinates along the axis,
+    both in grid units.
+    """
+    u, v = [a for a in range(3) if a != axis]
+    corners = grid_verts[tris]
+    cu, cv, ct = corners[..., u], corners[..., v], corners[..., axis]
+
+    u_min = np.clip(np.ceil(cu.min(axis=1)), 0, shape[u] - 1).astype(np.int64)
+    u_max = np.clip(np.floor(cu.max(axis=1)), 0, shape[u] - 1).astype(np.int64)
+    v_min = np.clip(np.ceil(cv.min(axis=1)), 0, shape[v] - 1).astype(np.int64)
+    v_max = np.clip(np.floor(cv.max(axis=1)), 0, shape[v] - 1).astype(np.int64)
+    widths = np.maximum(u_max - u_min + 1, 0)
+    counts = widths * np.maximum(v_max - v_min + 1, 0)
+
+    all_columns = []
+    all_hits = []
+    start = 0
+    while start < len(tris):
+        # Keeping the candidate list bounded in memory
+        cumulative = np.cumsum(counts[start:])
+        stop = start + max(1, int(np.searchsorted(cumulative, _RASTER_CHUNK, side='right')))
+        chunk = np.arange(start, stop)
+        start = stop
+
+        tri_index = np.repeat(chunk, counts[chunk])
+        if len(tri_index) == 0:
+            continue
+        offsets = np.repeat(np.cumsum(counts[chunk]) - counts[chunk], counts[chunk])
+        local = np.arange(len(tri_index)) - offsets
+        pu = u_min[tri_index] + local % widths[tri_index]
+        pv = v_min[tri_index] + local // widths[tri_index]
+
+        u0, u1, u2 = cu[tri_index].T
+        v0, v1, v2 = cv[tri_index].T
+        denominator = (v1 - v2) * (u0 - u2) + (u2 - u1) * (v0 - v2)
+        valid = np.abs(denominator) > 1e-18
+        denominator = np.where(valid, denominator, 1.0)
+        l0 = ((v1 - v2) * (pu - u2) + (u2 - u1) * (pv - v2)) / denominator
+        l1 = ((v2 - v0) * (pu - u2) + (u0 - u2) * (pv - v2)) / denominator
+        l2 = 1.0 - l0 - l1
+        inside = valid & (l0 >= 0) & (l1 >= 0) & (l2 >= 0)
+
+        t0, t1, t2 = ct[tri_index].T
+        all_columns.append((pu * shape[v] + pv)[inside])
+        all_hits.append((l0 * t0 + l1 * t1 + l2 * t2)[inside])
+
+    if not all_columns:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    return np.concatenate(all_columns), np.concatenate(all_hits)
+
+
+def _occupancy(columns, hits, shape, axis):
+    """
+    Parity fill along the given axis: a grid point is inside when an odd number
+    of surface hits lie below it on its column.
+    """
+    u, v = [a for a in range(3) if a != axis]
+    toggles = np.zeros((shape[u] * shape[v], shape[axis] + 1), dtype=np.uint8)
+    np.add.at(toggles, (columns, np.clip(np.ceil(hits), 0, shape[axis]).astype(np.int64)), 1)
+    inside = np.bitwise_xor.accumulate(toggles & 1, axis=1)[:, :shape[axis]].astype(bool)
+    inside = inside.reshape(shape[u], shape[v], shape[axis])
+    return np.moveaxis(inside, 2, axis)
+
+
+def _remove_ambiguities(inside, max_iterations=8):
+    """
+    Fills the 2x2x2 blocks whose configuration would make the surface-net
+    non-manifold.
+    """
+    for _ in range(max_iterations):
+        config = np.zeros(tuple(n - 1 for n in inside.shape), dtype=np.uint8)
+        for bit in range(8):
+            i, j, k = bit >> 2 & 1, bit >> 1 & 1, bit & 1
+            corner = inside[i:inside.shape[0] - 1 + i, j:inside.shape[1] - 1 + j, k:inside.shape[2] - 1 + k]
+            config |= corner.astype(np.uint8) << bit
+        ambiguous = _AMBIGUOUS_BLOCKS[config]
+        if not ambiguous.any():
+            break
+        for bit in range(8):
+            i, j, k = bit >> 2 & 1, bit >> 1 & 1, bit & 1
+            inside[i:inside.shape[0] - 1 + i, j:inside.shape[1] - 1 + j, k:inside.shape[2] - 1 + k] |= ambiguous
+    return inside
+
+
+def _crossings(hit_columns, hit_values, inside, axis):
+    """
+    Finds the grid edges along the given axis that cross the surface, with
+    the position of the crossing along the edge (exact where a hit was found,
+    midpoint otherwise).
+    """
+    change = np.diff(inside, axis=axis)
+    lower = np.argwhere(change)
+    u, v = [a for a in range(3) if a != axis]
+    shape = inside.shape
+
+    fraction = np.full(len(lower), 0.5)
+    if len(hit_values):
+        segment = np.floor(hit_values).astype(np.int64)
+        hit_keys = hit_columns * (shape[axis] + 1) + segment
+        # Where several hits share an edge, the lowest one is used
+        order = np.lexsort((hit_values, hit_keys))
+        hit_keys = hit_keys[order]
+        edge_keys = (lower[:, u] * shape[v] + lower[:, v]) * (shape[axis] + 1) + lower[:, axis]
+        found = np.clip(np.searchsorted(hit_keys, edge_keys), 0, len(hit_keys) - 1)
+        matches = hit_keys[found] == edge_keys
+        fraction[matches] = hit_values[order][found[matches]] - lower[matches, axis]
+
+    # Oriented from inside to outside
+    outward = inside[tuple(lower.T)]
+    return lower, np.clip(fraction, 0.0, 1.0), outward
+
+
+def min_tile_voxels(shape):
+    """
+    Voxels of the smallest tile of a grid, overlap included, filled along
+    its longest axis.
+    """
+    return (_MIN_TILE_SIDE + 2 * _TILE_OVERLAP) ** 2 * max(shape)
+
+
+def _tile_ranges(shape, ray_axis, max_tile_voxels):
+    """
+    Splits the grid points across the ray axis in tiles of whole columns,
+    each one with at most max_tile_voxels points including the overlap.
+    Returns the owned (start, stop) ranges along the two other axes.
+    """
+    u, v = [a for a in range(3) if a != ray_axis]
+    if max_tile_voxels is None or shape[0] * shape[1] * shape[2] <= max_tile_voxels:
+        return [((0, shape[u]), (0, shape[v]))]
+    if max_tile_voxels < min_tile_voxels(shape):
+        raise ValueError("A tile of " + str(_MIN_TILE_SIDE) + " columns does not fit in " +
+                         str(max_tile_voxels) + " voxels with the overlap")
+    side = int(np.sqrt(max_tile_voxels / shape[ray_axis])) - 2 * _TILE_OVERLAP
+    return [((u0, min(u0 + side, shape[u])), (v0, min(v0 + side, shape[v])))
+            for u0 in range(0, shape[u], side) for v0 in range(0, shape[v], side)]
+
+
+def _tile_surface(grid_verts, tris, tri_bounds, shape, ray_axis, owned):
+    """
+    Surface crossings of one tile of the global grid. Occupancy is computed
+    with an overlap around the owned columns, so that it matches the untiled
+    one there; only the crossings starting in the owned columns are returned,
+    as (axis, lower grid point, crossing point, outward) in global grid units.
+    """
+    u, v = [a for a in range(3) if a != ray_axis]
+    start = np.zeros(3, dtype=np.int64)
+    stop = np.array(shape, dtype=np.int64)
+    for axis, (owned_start, owned_stop) in zip((u, v), owned):
+        start[axis] = max(owned_start - _TILE_OVERLAP, 0)
+        stop[axis] = min(owned_stop + _TILE_OVERLAP, shape[axis])
+    tile_shape = tuple(int(n) for n in stop - start)
+
+    # Only the triangles reaching the tile
+    reaching = np.all((tri_bounds[1] >= start - 1) & (tri_bounds[0] <= stop), axis=1)
+    tile_verts = grid_verts - start
+    tile_tris = tris[reaching]
+
+    all_hits = []
+    for axis in range(3):
+        columns, hits = _axis_hits(tile_verts, tile_tris, tile_shape, axis)
+        in_tile = (hits >= 0) & (hits < tile_shape[axis])
+        all_hits.append((columns[in_tile], hits[in_tile]))
+    inside = _occupancy(*all_hits[ray_axis], tile_shape, ray_axis)
+    inside = _remove_ambiguities(inside)
+    inside[[0, -1], :, :] = False
+    inside[:, [0, -1], :] = False
+    inside[:, :, [0, -1]] = False
+
+    surface = []
+    for axis in range(3):
+        lower, fraction, outward = _crossings(*all_hits[axis], inside, axis)
+        lower = lower + start
+        owned_mask = np.ones(len(lower), dtype=bool)
+        for owned_axis, (owned_start, owned_stop) in zip((u, v), owned):
+            owned_mask &= (lower[:, owned_axis] >= owned_start) & (lower[:, owned_axis] < owned_stop)
+        lower, fraction, outward = lower[owned_mask], fraction[owned_mask], outward[owned_mask]
+        points = lower.astype(np.float64)
+        points[:, axis] += fraction
+        surface.append((axis, lower, points, outward))
+    return surface
+
+
+def voxel_remesh(verts, tris, voxel_size, max_tile_voxels=None):
+    """
+    Voxel remesh of a closed triangle mesh.
+    Returns the new vertices and quads. With max_tile_voxels, the grid is
+    voxelized in tiles of at most that many voxels, stitched on the global
+    grid: the result is the same as the untiled one.
+    """
+    origin = verts.min(axis=0) - _GRID_PADDING * voxel_size
+    shape = tuple(int(n) for n in np.ceil((verts.max(axis=0) - origin) / voxel_size) + _GRID_PADDING + 1)
+    grid_verts = (verts - origin) / voxel_size + _GRID_JITTER
+
+    # Filling along the longest axis keeps the number of columns low
+    ray_axis = int(np.argmax(shape))
+
+    corners = grid_verts[tris]
+    tri_bounds = corners.min(axis=1), corners.max(axis=1)
+
+    cell_shape = tuple(n - 1 for n in shape)
+    cell_sums = []
+    all_quads = []
+    for owned in _tile_ranges(shape, ray_axis, max_tile_voxels):
+        for axis, lower, points, outward in _tile_surface(grid_verts, tris, tri_bounds, shape, ray_axis, owned):
+            # The four cells around each edge, counter-clockwise around the axis
+            b, c = (axis + 1) % 3, (axis + 2) % 3
+            quad_cells = []
+            for db, dc in ((-1, -1), (0, -1), (0, 0), (-1, 0)):
+                cell = lower.copy()
+                cell[:, b] += db
+                cell[:, c] += dc
+                quad_cells.append(np.ravel_multi_index(cell.T, cell_shape))
+            quads = np.stack(quad_cells, axis=1)
+            quads[~outward] = quads[~outward, ::-1]
+            all_quads.append(quads)
+            cell_sums.append((quads.ravel(), np.repeat(points, 4, axis=0)))
+
+    quads = np.concatenate(all_quads)
+    cells, quads = np.unique(quads, return_inverse=True)
+    quads = quads.reshape(-1, 4)
+
+    # Each cell vertex is the average of the crossings around it
+    sums = np.zeros((len(cells), 3))
+    counts = np.zeros(len(cells))
+    for cell_ids, points in cell_sums:
+        index = np.searchsorted(cells, cell_ids)
+        np.add.at(sums, index, points)
+        np.add.at(counts, index, 1)
+    new_verts = sums / counts[:, None]
+
+    new_verts = (new_verts - _GRID_JITTER) * voxel_size + origin
+    return new_verts, quads
+
+
+# Smooth, same as the Smooth modifier with the default factor.
+
+def smooth_vertices(verts, faces, iterations, factor=0.5, movable=None):
+    """
+    Laplacian smooth. If a movable mask is given, only those vertices move
+    and the work is limited to them.
+    """
+    if iterations <= 0:
+        return verts
+    edges = unique_edges(faces)
+    sources = np.concatenate([edges[:, 0], edges[:, 1]])
+    targets = np.concatenate([edges[:, 1], edges[:, 0]])
+    moved = np.arange(len(verts))
+    if movable is not None:
+        moved = np.flatnonzero(movable)
+        local = np.full(len(verts), -1)
+        local[moved] = np.arange(len(moved))
+        kept = movable[sources]
+        sources, targets = local[sources[kept]], targets[kept]
+    degree = np.bincount(sources, minlength=len(moved)).astype(np.float64)
+    degree = np.maximum(degree, 1)[:, None]
+
+    verts = verts.copy()
+    for _ in range(iterations):
+        average = np.stack([np.bincount(sources, weights=verts[targets, axis], minlength=len(moved))
+                            for axis in range(3)], axis=1) / degree
+        verts[moved] += (average - verts[moved]) * factor
+    return verts
+
+
+# Displace, replicating the Displace modifier driven by a Clouds texture.
+
+def displace_vertices(verts, faces, strength, edge_push, noise_size, contrast, seed, weights=None, offset=0.0):
+    """
+    With band weights, the noise is faded out with the weight and the
+    vertices outside of the band are pushed out by the offset instead.
+    """
+    normals = vertex_normals(verts, faces)
+    if weights is None:
+        distances = displacement(verts, noise_size, contrast, edge_push, strength, seed)
+        return verts + normals * distances[:, None]
+    distances = offset * (1.0 - weights)
+    band = weights > 0
+    distances[band] += weights[band] * displacement(verts[band], noise_size, contrast, edge_push, strength, seed)
+    return verts + normals * distances[:, None]
+
+
+# Edge band: the part of the surface the chipping is limited to, around the
+# sharp edges or the vertices of a vertex group.
+
+BAND_FALLOFF_STEPS = 4
+# Outside of the band the remeshed surface is pushed this many voxels out of
+# the original, so that the boolean keeps the original faces there.
+BAND_OFFSET = 2.0
+
+
+def sharp_edges(verts, tris, angle):
+    """
+    Edges whose two faces meet at more than the given angle (radians), and
+    open edges.
+    """
+    half_edges = np.sort(np.stack([tris, np.roll(tris, -1, axis=1)], axis=-1).reshape(-1, 2), axis=1)
+    edges, inverse, counts = np.unique(half_edges, axis=0, return_inverse=True, return_counts=True)
+    order = np.argsort(inverse.ravel(), kind='stable') // 3
+    first = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    second = np.minimum(first + 1, len(order) - 1)
+    normals = face_normals(verts, tris)
+    normals /= np.maximum(np.linalg.norm(normals, axis=1, keepdims=True), 1e-12)
+    cosines = (normals[order[first]] * normals[order[second]]).sum(axis=1)
+    return edges[(counts != 2) | (cosines < np.cos(angle))]
+
+
+def band_samples(verts, tris, params, spacing, weights=None):
+    """
+    Points along the edges (or on the vertex group) the band is built around.
+    """
+    if params.band_mode == 'GROUP':
+        if weights is None:
+            return np.zeros((0, 3))
+        marked = weights >= 0.5
+        edges = unique_edges(tris)
+        edges = edges[marked[edges[:, 0]] & marked[edges[:, 1]]]
+        points = [verts[marked]]
+    else:
+        edges = sharp_edges(verts, tris, params.band_angle)
+        points = []
+
+    starts, ends = verts[edges[:, 0]], verts[edges[:, 1]]
+    steps = np.maximum(np.ceil(np.linalg.norm(ends - starts, axis=1) / spacing).astype(np.int64), 1)
+    edge_index = np.repeat(np.arange(len(edges)), steps + 1)
+    offsets = np.repeat(np.cumsum(steps + 1) - (steps + 1), steps + 1)
+    t = (np.arange(len(edge_index)) - offsets) / steps[edge_index]
+    points.append(starts[edge_index] + (ends[edge_index] - starts[edge_index]) * t[:, None])
+    return np.concatenate(points)
+
+
+def band_weights(verts, faces, samples, width):
+    """
+    Weight of each vertex in the band: 1 within about the band width from the
+    samples, fading to 0 over a few edges.
+    """
+    if len(samples) == 0:
+        return np.zeros(len(verts))
+
+    # Cells of half the width around the samples, grown by two cells
+    cell_size = width / 2
+    origin = np.minimum(verts.min(axis=0), samples.min(axis=0)) - 3 * cell_size
+    cell_shape = np.ceil((np.maximum(verts.max(axis=0), samples.max(axis=0)) - origin) / cell_size).astype(np.int64) + 4
+    sample_cells = np.unique(((samples - origin) // cell_size).astype(np.int64), axis=0)
+    reach = np.stack(np.meshgrid(*[np.arange(-2, 3)] * 3, indexing='ij'), axis=-1).reshape(-1, 3)
+    marked = np.unique(np.ravel_multi_index(
+        (sample_cells[:, None, :] + reach[None]).reshape(-1, 3).T, cell_shape, mode='clip'))
+    vertex_cells = np.ravel_multi_index(((verts - origin) // cell_size).astype(np.int64).T, cell_shape, mode='clip')
+    weights = np.isin(vertex_cells, marked).astype(np.float64)
+
+    # Falloff over the edges next to the band
+    edges = unique_edges(faces)
+    sources = np.concatenate([edges[:, 0], edges[:, 1]])
+    targets = np.concatenate([edges[:, 1], edges[:, 0]])
+    degree = np.maximum(np.bincount(sources, minlength=len(verts)), 1)
+    for _ in range(BAND_FALLOFF_STEPS):
+        grown = np.bincount(sources, weights=weights[targets], minlength=len(verts)) / degree
+        weights = np.maximum(weights, grown)
+    weights[weights < 1.0 / (2 ** BAND_FALLOFF_STEPS)] = 0.0
+    return weights
+
+
+# Decimate, collapsing the shortest edges in independent batches.
+
+_COLLAPSE_CHUNK = 1 << 14
+
+
+def _neighbour_table(edges, vertex_count):
+    sources = np.concatenate([edges[:, 0], edges[:, 1]])
+    targets = np.concatenate([edges[:, 1], edges[:, 0]])
+    order = np.argsort(sources, kind='stable')
+    pointers = np.concatenate([[0], np.cumsum(np.bincount(sources, minlength=vertex_count))])
+    return pointers, targets[order]
+
+
+def _gather(pointers, values, items):
+    """
+    Concatenated rows of a CSR table for the given items, with the position
+    of the item each value belongs to.
+    """
+    counts = pointers[items + 1] - pointers[items]
+    owners = np.repeat(np.arange(len(items)), counts)
+    offsets = np.arange(len(owners)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owners, values[pointers[items][owners] + offsets]
+
+
+def _collapsible(verts, tris, a, b, pointers, neighbours, vertex_tris_pointers, vertex_tris):
+    """
+    For a batch of edges a-b, True where collapsing to the midpoint keeps the
+    mesh manifold (the two rings share exactly two vertices) and flips none
+    of the faces around them.
+    """
+    # Link condition
+    owners_a, ring_a = _gather(pointers, neighbours, a)
+    owners_b, ring_b = _gather(pointers, neighbours, b)
+    keys = np.concatenate([owners_a * len(verts) + ring_a, owners_b * len(verts) + ring_b])
+    keys, counts = np.unique(keys, return_counts=True)
+    shared = np.bincount(keys[counts == 2] // len(verts), minlength=len(a))
+
+    # Flips, the two faces on the edge disappear
+    owners_a, around_a = _gather(vertex_tris_pointers, vertex_tris, a)
+    owners_b, around_b = _gather(vertex_tris_pointers, vertex_tris, b)
+    owners = np.concatenate([owners_a, owners_b])
+    corners = tris[np.concatenate([around_a, around_b])]
+    moved = (corners == a[owners, None]) | (corners == b[owners, None])
+    kept = moved.sum(axis=1) == 1
+    owners, corners, moved = owners[kept], corners[kept], moved[kept]
+    before = verts[corners]
+    after = before.copy()
+    after[moved] = ((verts[a] + verts[b]) * 0.5)[np.repeat(owners, 3)[moved.ravel()]]
+    normal_before = np.cross(before[:, 1] - before[:, 0], before[:, 2] - before[:, 0])
+    normal_after = np.cross(after[:, 1] - after[:, 0], after[:, 2] - after[:, 0])
+    flipped = np.bincount(owners, weights=(normal_before * normal_after).sum(axis=1) <= 0, minlength=len(a))
+
+    return (shared == 2) & (flipped == 0)
+
+
+def _planar_vertices(verts, tris, tolerance=np.cos(np.radians(1.0))):
+    """
+    Vertices whose faces all lie within a small angle of their normal.
+    """
+    normals = face_normals(verts, tris)
+    normals /= np.maximum(np.linalg.norm(normals, axis=1, keepdims=True), 1e-12)
+    lowest = np.ones(len(verts))
+    vertex_normal = vertex_normals(verts, tris)
+    for corner in range(3):
+        np.minimum.at(lowest, tris[:, corner], (normals * vertex_normal[tris[:, corner]]).sum(axis=1))
+    return lowest > tolerance
+
+
+def decimate_collapse(verts, faces, ratio, keep=None):
+    """
+    Collapse decimation to the given ratio of triangles, keeping the mesh
+    manifold (link condition) and avoiding flipped faces.
+    If a keep mask is given, the ratio applies to the triangles touching the
+    kept vertices; the flat parts away from them are collapsed first, as far
+    as they can go.
+    """
+    tris = triangulate(faces)
+    if keep is None and ratio >= 1.0:
+        return verts, faces
+    if keep is None:
+        target = max(4, int(len(tris) * ratio))
+    else:
+        keep = keep.copy()
+        target = max(4, int(keep[tris].any(axis=1).sum() * min(ratio, 1.0)))
+    verts = verts.copy()
+
+    while len(tris) > target:
+        half_edges = np.sort(np.stack([tris, np.roll(tris, -1, axis=1)], axis=-1).reshape(-1, 2), axis=1)
+        edge_keys, edge_faces = np.unique(half_edges[:, 0] * len(verts) + half_edges[:, 1], return_counts=True)
+        edges = np.stack([edge_keys // len(verts), edge_keys % len(verts)], axis=1)
+        lengths = np.linalg.norm(verts[edges[:, 0]] - verts[edges[:, 1]], axis=1)
+        order = np.argsort(lengths)
+        order = order[edge_faces[order] == 2]
+        if keep is not None:
+            planar = _planar_vertices(verts, tris) & ~keep
+            free = planar[edges[order, 0]] & planar[edges[order, 1]]
+            order = np.concatenate([order[free], order[~free & (ratio < 1.0)]])
+
+        pointers, neighbours = _neighbour_table(edges, len(verts))
+        tri_vertices = tris.ravel()
+        tri_order = np.argsort(tri_vertices, kind='stable')
+        vertex_tris = tri_order // 3
+        vertex_tris_pointers = np.concatenate([[0], np.cumsum(np.bincount(tri_vertices, minlength=len(verts)))])
+
+        locked = np.zeros(len(verts), dtype=bool)
+        remap = np.arange(len(verts))
+        needed = (len(tris) - target + 1) // 2
+        collapsed = 0
+
+        # Collapses in a round touch disjoint rings, so they can all be
+        # checked up front, a chunk of candidates at a time
+        for chunk_start in range(0, len(order), _COLLAPSE_CHUNK):
+            chunk = order[chunk_start:chunk_start + _COLLAPSE_CHUNK]
+            chunk = chunk[~(locked[edges[chunk, 0]] | locked[edges[chunk, 1]])]
+            a, b = edges[chunk, 0], edges[chunk, 1]
+            valid = _collapsible(verts, tris, a, b, pointers, neighbours, vertex_tris_pointers, vertex_tris)
+            for a, b in edges[chunk[valid]]:
+                if locked[a] or locked[b]:
+                    continue
+                remap[b] = a
+                verts[a] = (verts[a] + verts[b]) * 0.5
+                if keep is not None:
+                    keep[a] |= keep[b]
+                locked[neighbours[pointers[a]:pointers[a + 1]]] = True
+                locked[neighbours[pointers[b]:pointers[b + 1]]] = True
+                collapsed += 1
+                if collapsed >= needed:
+                    break
+            if collapsed >= needed:
+                break
+        if collapsed == 0:
+            break
+
+        tris = remap[tris]
+        degenerate = (tris[:, 0] == tris[:, 1]) | (tris[:, 1] == tris[:, 2]) | (tris[:, 2] == tris[:, 0])
+        tris = tris[~degenerate]
+
+    return compact_vertices(verts, tris)
+
+
+# Full pipeline.
+
+# Clamp to the source volume.
+# Alternative to the boolean intersection: the vertices of the damaged mesh
+# that ended up outside of the source are moved onto its closest point. The
+# topology is left alone, so a manifold damaged mesh stays manifold. The
+# inside test is done on arrays, only the vertices outside go through the
+# nearest point queries of the BVH tree.
+
+_CLAMP_BATCH = 1 << 14
+
+
+def points_inside(points, verts, tris):
+    """
+    Parity test of the points against a closed mesh: a point is inside when
+    an odd number of triangles lie above it along Z. The triangles are binned
+    on an XY grid, so that each point is only tested against those over its
+    cell.
+    """
+    inside = np.zeros(len(points), dtype=bool)
+    if len(tris) == 0 or len(points) == 0:
+        return inside
+    corners = verts[tris]
+    low = verts[:, :2].min(axis=0)
+    cell_count = int(np.sqrt(len(tris))) + 1
+    cell_size = np.maximum((verts[:, :2].max(axis=0) - low) / cell_count, 1e-12)
+
+    # Cells covered by the XY bounding box of each triangle
+    cell_min = np.clip(((corners[..., :2].min(axis=1) - low) // cell_size).astype(np.int64), 0, cell_count - 1)
+    cell_max = np.clip(((corners[..., :2].max(axis=1) - low) // cell_size).astype(np.int64), 0, cell_count - 1)
+    widths = cell_max[:, 0] - cell_min[:, 0] + 1
+    counts = widths * (cell_max[:, 1] - cell_min[:, 1] + 1)
+    tri_index = np.repeat(np.arange(len(tris)), counts)
+    local = np.arange(len(tri_index)) - np.repeat(np.cumsum(counts) - counts, counts)
+    cells = ((cell_min[tri_index, 0] + local % widths[tri_index]) * cell_count
+             + cell_min[tri_index, 1] + local // widths[tri_index])
+    order = np.argsort(cells, kind='stable')
+    cell_tris = tri_index[order]
+    cell_starts = np.searchsorted(cells[order], np.arange(cell_count * cell_count + 1))
+
+    point_cells = np.floor((points[:, :2] - low) / cell_size).astype(np.int64)
+    in_grid = ((point_cells >= 0) & (point_cells < cell_count)).all(axis=1)
+    point_index = np.flatnonzero(in_grid)
+    point_cells = point_cells[in_grid, 0] * cell_count + point_cells[in_grid, 1]
+    point_counts = cell_starts[point_cells + 1] - cell_starts[point_cells]
+
+    crossings = np.zeros(len(points), dtype=np.int64)
+    start = 0
+    while start < len(point_index):
+        # Keeping the candidate list bounded in memory
+        cumulative = np.cumsum(point_counts[start:])
+        stop = start + max(1, int(np.searchsorted(cumulative, _RASTER_CHUNK, side='right')))
+        chunk = np.arange(start, stop)
+        start = stop
+
+        pair_point = np.repeat(chunk, point_counts[chunk])
+        if len(pair_point) == 0:
+            continue
+        offsets = np.arange(len(pair_point)) - np.repeat(np.cumsum(point_counts[chunk]) - point_counts[chunk], point_counts[chunk])
+        pair_tri = cell_tris[cell_starts[point_cells[pair_point]] + offsets]
+        px, py, pz = points[point_index[pair_point]].T
+
+        (x0, y0, z0), (x1, y1, z1), (x2, y2, z2) = (corners[pair_tri, corner].T for corner in range(3))
+        denominator = (y1 - y2) * (x0 - x2) + (x2 - x1) * (y0 - y2)
+        valid = np.abs(denominator) > 1e-18
+        denominator = np.where(valid, denominator, 1.0)
+        l0 = ((y1 - y2) * (px - x2) + (x2 - x1) * (py - y2)) / denominator
+        l1 = ((y2 - y0) * (px - x2) + (x0 - x2) * (py - y2)) / denominator
+        l2 = 1.0 - l0 - l1
+        above = valid & (l0 >= 0) & (l1 >= 0) & (l2 >= 0) & (l0 * z0 + l1 * z1 + l2 * z2 > pz)
+        crossings += np.bincount(point_index[pair_point][above], minlength=len(points))
+
+    return crossings % 2 == 1
+
+
+def clamp_inside(verts, source_verts, source_tris):
+    """
+    Projects the vertices outside of the closed source mesh onto its surface.
+    """
+    outside = np.flatnonzero(~points_inside(verts, source_verts, source_tris))
+    verts = verts.copy()
+    if len(outside) == 0:
+        return verts
+    tree = BVHTree.FromPolygons(source_verts.tolist(), source_tris.tolist(), all_triangles=True)
+    for start in range(0, len(outside), _CLAMP_BATCH):
+        batch = outside[start:start + _CLAMP_BATCH]
+        verts[batch] = [tree.find_nearest(vertex)[0] for vertex in verts[batch].tolist()]
+    return verts
+
+
+def reference_size(verts, params):
+    """
+    Size the damage is relative to: the smallest dimension of the object, or
+    the fixed scale if set.
+    """
+    if params.fixed_scale_check:
+        return params.fixed_scale
+    return float((verts.max(axis=0) - verts.min(axis=0)).min())
+
+
+def base_arrays(verts, tris, params, cache=None, weights=None):
+    """
+    Remesh and smooth stages, which only depend on the geometry, the
+    resolution, the edge relax and the band settings. Reused from the cache
+    when possible. Returns the vertices, the faces and the band weights (None
+    without a band).
+    """
+    voxel_size = reference_size(verts, params) / params.resolution
+    smooth_iterations = int(params.resolution * params.edge_relax)
+    use_band = params.band_mode != 'NONE'
+
+    key = None
+    if cache is not None:
+        settings = (voxel_size, smooth_iterations)
+        if use_band:
+            settings += (params.band_mode, params.band_angle, params.band_width)
+        key = cache.make_key((verts, tris, weights), settings)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    source_verts = verts
+    with profiler.span("remesh"):
+        verts, faces = voxel_remesh(verts, tris, voxel_size, params.max_tile_voxels)
+    band = None
+    if use_band:
+        with profiler.span("band"):
+            samples = band_samples(source_verts, tris, params, voxel_size, weights)
+            band = band_weights(verts, faces, samples, params.band_width * reference_size(source_verts, params))
+    with profiler.span("smooth"):
+        verts = smooth_vertices(verts, faces, smooth_iterations, movable=None if band is None else band > 0)
+    if cache is not None:
+        cache.put(key, verts, faces, band)
+    return verts, faces, band
+
+
+def damage_steps(verts, tris, params, cache=None, weights=None):
+    """
+    Damage stack as a generator, yielding the name of each stage once it is
+    done so that the caller can spread the work over time or stop between
+    stages. The new vertices and faces are the return value of the generator.
+    With the clamp intersect mode they are already inside the source, the
+    boolean intersection is then skipped.
+    """
+    all_dimensions_ratio = reference_size(verts, params)
+    rescaled_ratio = all_dimensions_ratio / params.resolution
+    source_verts = verts
+
+    verts, faces, band = base_arrays(verts, tris, params, cache, weights)
+    yield "remesh and smooth"
+    with profiler.span("displace"):
+        verts = displace_vertices(
+            verts, faces,
+            strength=params.noise_strength * rescaled_ratio / 2,
+            edge_push=params.edge_push,
+            noise_size=params.noise_scale / 200 * all_dimensions_ratio,
+            contrast=params.noise_contrast,
+            seed=params.seed,
+            weights=band,
+            offset=BAND_OFFSET * rescaled_ratio)
+    yield "displace"
+    with profiler.span("decimate"):
+        verts, faces = decimate_collapse(verts, faces, params.simplify_damage_ratio,
+                                         keep=None if band is None else band > 0)
+    if params.intersect_mode == 'CLAMP':
+        yield "decimate"
+        with profiler.span("clamp"):
+            verts = clamp_inside(verts, source_verts, tris)
+    return verts, faces
+
+
+def damage_arrays(verts, tris, params, cache=None, weights=None):
+    """
+    Applies the whole damage stack to the given arrays, returning the new
+    vertices and faces. The weights are the vertex group of the group band
+    mode, one per source vertex.
+    """
+    steps = damage_steps(verts, tris, params, cache, weights)
+    while True:
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return stop.value
+
+
+def intersect_in_memory(context, i_selected_object, chipped_mesh):
+    """
+    Intersects the chipped mesh with the original one through the depsgraph,
+    with an operand object that is never linked to the scene.
+    """
+    original_mesh = i_selected_object.data
+    operand_object = bpy.data.objects.new("LazyChip_operand", original_mesh)
+    operand_object.matrix_world = i_selected_object.matrix_world
+
+    # Only the boolean has to be evaluated on top of the chipped mesh
+    muted_modifiers = [modifier for modifier in i_selected_object.modifiers if modifier.show_viewport]
+    for modifier in muted_modifiers:
+        modifier.show_viewport = False
+    i_selected_object.data = chipped_mesh
+    new_boolean = i_selected_object.modifiers.new("Boolean", 'BOOLEAN')
+    new_boolean.operation = 'INTERSECT'
+    new_boolean.solver = 'FAST'
+    new_boolean.object = operand_object
+
+    try:
+        with profiler.span("boolean"):
+            depsgraph = context.evaluated_depsgraph_get()
+            result_mesh = bpy.data.meshes.new_from_object(i_selected_object.evaluated_get(depsgraph))
+    finally:
+        i_selected_object.modifiers.remove(new_boolean)
+        for modifier in muted_modifiers:
+            modifier.show_viewport = True
+        i_selected_object.data = original_mesh
+        bpy.data.objects.remove(operand_object, do_unlink=True)
+
+    result_mesh.name = chipped_mesh.name
+    bpy.data.meshes.remove(chipped_mesh, do_unlink=True)
+    return result_mesh
+
+
+def vertex_group_weights(i_selected_object, group_name):
+    """
+    Weights of the named vertex group, one per vertex, None if there is no
+    such group.
+    """
+    vertex_group = i_selected_object.vertex_groups.get(group_name)
+    if vertex_group is None:
+        return None
+    weights = np.zeros(len(i_selected_object.data.vertices))
+    for vertex in i_selected_object.data.vertices:
+        for group in vertex.groups:
+            if group.group == vertex_group.index:
+                weights[vertex.index] = group.weight
+    return weights
+
+
+def band_group_weights(i_selected_object, weathering_props):
+    """
+    Vertex group weights the band is built on, None unless the band follows
+    a vertex group.
+    """
+    if weathering_props.band_mode_property != 'GROUP':
+        return None
+    return vertex_group_weights(i_selected_object, weathering_props.band_group_property)
+
+
+def damage_mesh(source_mesh, matrix, params, name, cache=None, weights=None):
+    """
+    Reads the source mesh once, damages it in memory (in the space given by the
+    matrix, as the modifier stack would) and writes the result in a new mesh.
+    """
+    with profiler.span("convert"):
+        verts, tris = mesh_to_arrays(source_mesh, matrix)
+    verts, faces = damage_arrays(verts, tris, params, cache, weights)
+    with profiler.span("convert"):
+        verts = transform_vertices(verts, np.linalg.inv(np.array(matrix)))
+        return arrays_to_mesh(name, verts, faces, source_mesh.materials)
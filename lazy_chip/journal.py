@@ -0,0 +1,176 @@
+import bpy
+from bpy.app.handlers import persistent
+from bpy.types import Operator
+from .stash import HELD_KEY, ORIGINAL_KEY, STASHED_KEY, kept_meshes, unpair, release, stash_registry
+from .offload import resident, enforce_cap
+
+# Undo of the Lazy Chip batches.
+# In the default mode every batch is a Blender undo step, which holds its own
+# copy of every mesh the batch made or replaced. In journal mode the operators
+# are the "_journal" versions, without the undo step: a batch only records
+# which mesh each object showed before and after it, and the replaced meshes
+# are held (and offloaded to disk with the stash) so that the batch can be
+# undone by swapping them back. The journal keeps a limited number of
+# batches, the meshes only the dropped ones needed are released. A Blender
+# undo or redo rewinds the file under the journal, which is then dropped.
+
+
+class SwapJournal:
+    def __init__(self):
+        self.batches = []
+        self.recording = None
+
+    def begin(self, label, objects):
+        """
+        Starts recording a batch on the given objects, holding their meshes
+        so that the batch does not remove them.
+        """
+        self.recording = (label, [(current_object.name, current_object.data.name) for current_object in objects])
+        for current_object in objects:
+            hold(current_object.data)
+
+    def commit(self, max_batches):
+        """
+        Ends the recording, keeping the swaps the batch made.
+        """
+        if self.recording is None:
+            return
+        label, before = self.recording
+        self.recording = None
+        swaps = []
+        for object_name, before_name in before:
+            current_object = bpy.data.objects.get(object_name)
+            before_mesh = bpy.data.meshes.get(before_name)
+            if current_object is None or before_mesh is None or current_object.data == before_mesh:
+                continue
+            swaps.append((object_name, before_name, current_object.data.name))
+            hold(current_object.data)
+        if swaps:
+            self.batches.append((label, swaps))
+        while len(self.batches) > max_batches:
+            self.batches.pop(0)
+        self.release_unused()
+
+    def undo_last(self):
+        """
+        Swaps back the meshes of the last batch. Returns its label and the
+        number of objects restored.
+        """
+        label, swaps = self.batches.pop()
+        restored = 0
+        for object_name, before_name, after_name in reversed(swaps):
+            current_object = bpy.data.objects.get(object_name)
+            before_mesh = bpy.data.meshes.get(before_name)
+            # Objects or meshes renamed or deleted since are skipped
+            if current_object is None or before_mesh is None or current_object.data.name != after_name:
+                continue
+            current_object.data = resident(before_mesh)
+            restored += 1
+        self.release_unused()
+        return label, restored
+
+    def held_names(self):
+        return {name for label, swaps in self.batches for swap in swaps for name in swap[1:]}
+
+    def release_unused(self):
+        """
+        Releases the held meshes no batch refers to anymore. Of those, the
+        ones no object shows are removed; nothing else in the file is.
+        """
+        held_names = self.held_names()
+        released = [mesh for mesh in bpy.data.meshes if mesh.get(HELD_KEY) and mesh.name not in held_names]
+        # Damaged meshes first, unpairing them may free their originals
+        released.sort(key=lambda mesh: mesh.get(ORIGINAL_KEY) is None)
+        for mesh in released:
+            release_held(mesh)
+
+
+swap_journal = SwapJournal()
+
+
+def hold(mesh):
+    mesh[HELD_KEY] = True
+    mesh.use_fake_user = True
+
+
+def release_held(mesh):
+    """
+    Drops the hold on the mesh, removing it if no object shows it and the
+    stash does not need it.
+    """
+    del mesh[HELD_KEY]
+    unused = mesh.users - mesh.use_fake_user == 0
+    if mesh.get(ORIGINAL_KEY) is not None:
+        if unused:
+            unpair(mesh)
+            bpy.data.meshes.remove(mesh)
+    elif mesh.get(STASHED_KEY):
+        if unused and not stash_registry.chipped_meshes_of(mesh):
+            release(mesh)
+            bpy.data.meshes.remove(mesh)
+    else:
+        # Neither stashed nor damaged: an ordinary mesh again
+        mesh.use_fake_user = False
+        if mesh.users == 0:
+            bpy.data.meshes.remove(mesh)
+
+
+def begin_batch(journal, label, objects):
+    """
+    Called by the operators before a batch changes the meshes of the objects.
+    """
+    if journal:
+        swap_journal.begin(label, objects)
+
+
+def end_batch(weathering_props, journal):
+    """
+    Called by the operators once the batch is done: commits it to the journal
+    (the default mode has the undo step of the operator), then offloads the
+    meshes over the cap.
+    """
+    if journal:
+        swap_journal.commit(weathering_props.journal_batches_property)
+    enforce_cap(kept_meshes(), weathering_props.resident_stash_property)
+
+
+@persistent
+def clear_journal(*args):
+    # After a load, an undo or a redo the meshes the journal held may not
+    # match its batches anymore: all of them are forgotten
+    swap_journal.batches = []
+    swap_journal.recording = None
+    for mesh in list(bpy.data.meshes):
+        if mesh.get(HELD_KEY):
+            release_held(mesh)
+
+
+class LAZYCHIP_OP_undobatch(Operator):
+    bl_label = "Undo Damage Batch"
+    bl_idname = "lazychip.op_undobatch"
+    bl_description = "Puts back the meshes the last Lazy Chip batch replaced (journal undo mode)"
+    bl_options = {'REGISTER'}
+
+    @classmethod
+    def poll(cls, context):
+        return bool(swap_journal.batches)
+
+    def execute(self, context):
+        bpy.ops.object.mode_set(mode='OBJECT')
+        label, restored = swap_journal.undo_last()
+        enforce_cap(kept_meshes(), context.scene.weathering_props.resident_stash_property)
+        self.report({'INFO'}, "Undid " + label + " on " + str(restored) + " objects")
+        return {'FINISHED'}
+
+
+def register():
+    bpy.utils.register_class(LAZYCHIP_OP_undobatch)
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        handlers.append(clear_journal)
+
+def unregister():
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if clear_journal in handlers:
+            handlers.remove(clear_journal)
+    bpy.utils.unregister_class(LAZYCHIP_OP_undobatch)
+    swap_journal.batches = []
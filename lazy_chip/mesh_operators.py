@@ -1,89 +1,427 @@
 import bpy
 import bmesh
+import numpy as np
+from bpy.app.handlers import persistent
 from bpy.types import Operator
+from mathutils.bvhtree import BVHTree
 
 # Mesh utilities.
 
 
-# Calls the Blender 3D Print Toolbox "make manifold" once.
-def make_non_manifold(object: bpy.types.Object, ):
-    # Ensure the 3D Printing Toolbox is enabled
-    addon_key = 'mesh_3d_print_toolbox'
-    if addon_key not in bpy.context.preferences.addons:
-        bpy.ops.preferences.addon_enable(module=addon_key)
-    
-    # Save the current mode so we can return to it later
-    original_mode = object.mode
-    
-    # Ensure object is in edit mode for the operation
-    if object.mode != 'EDIT':
-        bpy.ops.object.mode_set(mode='EDIT')
-    
-    try:
-        # Perform the make non-manifold operation
-        bpy.ops.mesh.print3d_clean_non_manifold()
-    except AttributeError:
-        print("3D Printing Toolbox addon not installed!")
-        return {'CANCELLED'}
-    finally:
-        # Return to the original mode
-        if original_mode != 'EDIT':
-            bpy.ops.object.mode_set(mode=original_mode)
-    
-    return {'FINISHED'}
+class ManifoldReport:
+    """
+    Counts of the elements that make a mesh not watertight, same categories
+    as Select Non Manifold.
+    """
+
+    def __init__(self, boundary_edges=0, non_manifold_edges=0, wire_edges=0,
+                 inconsistent_edges=0, non_manifold_verts=0, loose_verts=0):
+        self.boundary_edges = boundary_edges
+        self.non_manifold_edges = non_manifold_edges
+        self.wire_edges = wire_edges
+        self.inconsistent_edges = inconsistent_edges
+        self.non_manifold_verts = non_manifold_verts
+        self.loose_verts = loose_verts
+
+    @property
+    def is_watertight(self):
+        return (self.boundary_edges + self.non_manifold_edges + self.wire_edges
+                + self.inconsistent_edges + self.non_manifold_verts + self.loose_verts) == 0
+
+    def __repr__(self):
+        return ("ManifoldReport(boundary_edges=%d, non_manifold_edges=%d, wire_edges=%d, "
+                "inconsistent_edges=%d, non_manifold_verts=%d, loose_verts=%d)" % (
+                    self.boundary_edges, self.non_manifold_edges, self.wire_edges,
+                    self.inconsistent_edges, self.non_manifold_verts, self.loose_verts))
+
+
+def manifold_masks(vertex_count, edge_verts, loop_verts, loop_edges, loop_starts):
+    """
+    Flags the non-manifold elements of a mesh given as flat arrays.
+    Returns the boundary, non-manifold (more than two faces), wire and
+    inconsistent (flipped neighbour) edge masks, and the non-manifold and
+    loose vertex masks.
+    """
+    edge_count = len(edge_verts)
+    loop_count = len(loop_verts)
+    edge_faces = np.bincount(loop_edges, minlength=edge_count)
+    boundary = edge_faces == 1
+    multi_face = edge_faces > 2
+    wire = edge_faces == 0
+
+    # Two faces walking a shared edge in the same direction have flipped normals
+    forward = (loop_verts == edge_verts[loop_edges, 0]).astype(np.int64)
+    forward_count = np.bincount(loop_edges, weights=forward, minlength=edge_count)
+    inconsistent = (edge_faces == 2) & (forward_count != 1)
+
+    # Previous loop of each loop, wrapping around inside its face
+    loop_totals = np.diff(np.append(loop_starts, loop_count))
+    previous = np.arange(loop_count) - 1
+    previous[loop_starts] = loop_starts + loop_totals - 1
+
+    # Each (vertex, edge) pair is a node, each face corner joins the two edges
+    # meeting at its vertex. A vertex is a bowtie if its nodes are not all
+    # joined in a single fan.
+    def node(vertices, edges):
+        return edges * 2 + (edge_verts[edges, 1] == vertices)
+
+    node_a = node(loop_verts, loop_edges)
+    node_b = node(loop_verts, loop_edges[previous])
+    labels = np.arange(edge_count * 2)
+    while True:
+        joined = np.minimum(labels[node_a], labels[node_b])
+        new_labels = labels.copy()
+        np.minimum.at(new_labels, node_a, joined)
+        np.minimum.at(new_labels, node_b, joined)
+        new_labels = new_labels[new_labels]
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+
+    node_verts = edge_verts.ravel()
+    fans = np.unique(node_verts * (edge_count * 2) + labels)
+    fan_count = np.bincount(fans // (edge_count * 2), minlength=vertex_count)
+
+    non_manifold_verts = fan_count > 1
+    bad_edges = boundary | multi_face | wire
+    non_manifold_verts[edge_verts[bad_edges].ravel()] = True
+    loose = np.bincount(node_verts, minlength=vertex_count) == 0
+
+    return boundary, multi_face, wire, inconsistent, non_manifold_verts, loose
+
+
+def mesh_arrays(mesh):
+    """
+    Reads the topology arrays needed by manifold_masks.
+    """
+    edge_verts = np.empty(len(mesh.edges) * 2, dtype=np.int64)
+    mesh.edges.foreach_get("vertices", edge_verts)
+    loop_verts = np.empty(len(mesh.loops), dtype=np.int64)
+    mesh.loops.foreach_get("vertex_index", loop_verts)
+    loop_edges = np.empty(len(mesh.loops), dtype=np.int64)
+    mesh.loops.foreach_get("edge_index", loop_edges)
+    loop_starts = np.empty(len(mesh.polygons), dtype=np.int64)
+    mesh.polygons.foreach_get("loop_start", loop_starts)
+    return len(mesh.vertices), edge_verts.reshape(-1, 2), loop_verts, loop_edges, loop_starts
+
+
+def manifold_report(mesh) -> ManifoldReport:
+    """
+    Counts the non-manifold elements of a mesh from its arrays, without
+    changing mode, selection or active object.
+    """
+    masks = manifold_masks(*mesh_arrays(mesh))
+    return ManifoldReport(*(int(np.count_nonzero(mask)) for mask in masks))
+
+
+# Self-intersections.
+# Exact test on the triangulation: the BVH gives the candidate triangle pairs,
+# the pairs sharing a vertex (same face or neighbours) are dropped and the
+# rest go through a separating axis test in batches.
+
+# Triangle pairs tested at once by the exact intersection test
+INTERSECTION_BATCH = 1 << 15
+
+
+def mesh_triangles(mesh):
+    """
+    Vertex positions and triangulation of the mesh, with the face each
+    triangle comes from.
+    """
+    mesh.calc_loop_triangles()
+    verts = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", verts)
+    tris = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int64)
+    mesh.loop_triangles.foreach_get("vertices", tris)
+    tri_faces = np.empty(len(mesh.loop_triangles), dtype=np.int64)
+    mesh.loop_triangles.foreach_get("polygon_index", tri_faces)
+    return verts.reshape(-1, 3).astype(np.float64), tris.reshape(-1, 3), tri_faces
+
+
+def triangles_intersect(a, b, tolerance):
+    """
+    Exact intersection test of triangle pairs, given as two (N, 3, 3) arrays.
+    Separating axes: the two normals, the nine edge-edge cross products and
+    the in-plane edge normals of both triangles (needed for coplanar pairs).
+    Triangles only touching within the tolerance are not intersecting,
+    coplanar triangles are if they overlap.
+    """
+    edges_a = np.roll(a, -1, axis=1) - a
+    edges_b = np.roll(b, -1, axis=1) - b
+    normal_a = np.cross(edges_a[:, 0], edges_a[:, 1])
+    normal_b = np.cross(edges_b[:, 0], edges_b[:, 1])
+    axes = np.concatenate([
+        normal_a[:, None],
+        normal_b[:, None],
+        np.cross(edges_a[:, :, None], edges_b[:, None, :]).reshape(-1, 9, 3),
+        np.cross(normal_a[:, None], edges_a),
+        np.cross(normal_b[:, None], edges_b),
+    ], axis=1)
+    projected_a = np.einsum("nkd,nvd->nkv", axes, a)
+    projected_b = np.einsum("nkd,nvd->nkv", axes, b)
+    lengths = np.linalg.norm(axes, axis=2)
+    gap = tolerance * lengths
+    separated = ((projected_a.max(axis=2) <= projected_b.min(axis=2) + gap)
+                 | (projected_b.max(axis=2) <= projected_a.min(axis=2) + gap))
+    coplanar = np.ptp(np.concatenate([projected_a[:, 0], projected_b[:, 0]], axis=1), axis=1) <= gap[:, 0]
+    # Coplanar pairs only have the in-plane axes, the others are all along the normal
+    separated[:, :11] &= ~coplanar[:, None]
+    # Parallel edges and degenerate triangles give no axis
+    separated &= lengths > tolerance * tolerance
+    return ~separated.any(axis=1)
+
+
+def self_intersecting_faces(mesh, tolerance=1e-6):
+    """
+    Sorted indices of the faces crossing another face not sharing a vertex
+    with it. The tolerance is relative to the size of the mesh.
+    """
+    verts, tris, tri_faces = mesh_triangles(mesh)
+    if len(tris) == 0:
+        return np.empty(0, dtype=np.int64)
+    bvh = BVHTree.FromPolygons(verts.tolist(), tris.tolist(), all_triangles=True)
+    pairs = np.array(bvh.overlap(bvh), dtype=np.int64).reshape(-1, 2)
+    pairs = pairs[pairs[:, 0] < pairs[:, 1]]
+    shared = (tris[pairs[:, 0], :, None] == tris[pairs[:, 1], None, :]).any(axis=(1, 2))
+    pairs = pairs[~shared]
+
+    tolerance *= float(np.linalg.norm(verts.max(axis=0) - verts.min(axis=0)))
+    hits = []
+    for start in range(0, len(pairs), INTERSECTION_BATCH):
+        batch = pairs[start:start + INTERSECTION_BATCH]
+        crossing = triangles_intersect(verts[tris[batch[:, 0]]], verts[tris[batch[:, 1]]], tolerance)
+        hits.append(batch[crossing])
+    if not hits:
+        return np.empty(0, dtype=np.int64)
+    return np.unique(tri_faces[np.concatenate(hits)])
+
+
+# Cached diagnostics.
+# The diagnostics of a mesh are looked up by its session_uid and kept until
+# the depsgraph reports a change of its geometry, so that the retry loop, the
+# fixes and the buttons do not compute them again on an unchanged mesh. The
+# element counts are checked as well, in case the mesh changed and the
+# depsgraph was not evaluated yet.
+
+MAX_DIAGNOSTICS = 256
+
+
+class MeshDiagnostics:
+    """
+    Non-manifold elements of a mesh: the counts, as a ManifoldReport, and the
+    indices of each kind. The self-intersecting faces are only looked for
+    when asked, then kept with the rest.
+    """
+
+    def __init__(self, arrays, counts):
+        masks = manifold_masks(*arrays)
+        self.report = ManifoldReport(*(int(np.count_nonzero(mask)) for mask in masks))
+        (self.boundary_edges, self.non_manifold_edges, self.wire_edges, self.inconsistent_edges,
+         self.non_manifold_verts, self.loose_verts) = (np.flatnonzero(mask) for mask in masks)
+        self.counts = counts
+        self._self_intersecting_faces = None
+
+    @property
+    def is_watertight(self):
+        return self.report.is_watertight
+
+    def self_intersecting_faces(self, mesh):
+        """
+        Indices of the faces crossing another face, see self_intersecting_faces.
+        """
+        if self._self_intersecting_faces is None:
+            self._self_intersecting_faces = self_intersecting_faces(mesh)
+        return self._self_intersecting_faces
+
+
+def element_counts(mesh):
+    return len(mesh.vertices), len(mesh.edges), len(mesh.loops), len(mesh.polygons)
+
+
+class DiagnosticsCache:
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, mesh) -> MeshDiagnostics:
+        diagnostics = self.entries.get(mesh.session_uid)
+        counts = element_counts(mesh)
+        if diagnostics is None or diagnostics.counts != counts:
+            diagnostics = MeshDiagnostics(mesh_arrays(mesh), counts)
+            self.entries.pop(mesh.session_uid, None)
+            self.entries[mesh.session_uid] = diagnostics
+            while len(self.entries) > MAX_DIAGNOSTICS:
+                del self.entries[next(iter(self.entries))]
+        return diagnostics
+
+    def invalidate(self, mesh):
+        self.entries.pop(mesh.session_uid, None)
+
+    def clear(self):
+        self.entries = {}
+
+
+diagnostics_cache = DiagnosticsCache()
+
+
+def object_diagnostics(object: bpy.types.Object) -> MeshDiagnostics:
+    """
+    Diagnostics of the mesh of the object, up to date with edit mode.
+    """
+    if object.mode == 'EDIT':
+        object.update_from_editmode()
+    return diagnostics_cache.get(object.data)
+
+
+@persistent
+def invalidate_diagnostics(scene, depsgraph):
+    for update in depsgraph.updates:
+        if not update.is_updated_geometry:
+            continue
+        changed_id = update.id.original
+        if isinstance(changed_id, bpy.types.Object) and changed_id.type == 'MESH':
+            diagnostics_cache.invalidate(changed_id.data)
+        elif isinstance(changed_id, bpy.types.Mesh):
+            diagnostics_cache.invalidate(changed_id)
+
+
+@persistent
+def clear_diagnostics(*args):
+    diagnostics_cache.clear()
 
 
 # Checks if the model is watertight.
-# Using https://blender.stackexchange.com/questions/160055/is-there-a-way-to-use-the-terminal-to-check-if-a-mesh-is-watertight
-def is_watertight_mesh(object: bpy.types.Object, check_self_intersection=True) -> bool:
+def is_watertight_mesh(object: bpy.types.Object, check_self_intersection=False) -> bool:
     """
     Checks whether the given object is watertight or not
     :param object: Object the inspect
+    :param check_self_intersection: Also requires no self-intersecting faces
     :return: True if watertight, False otherwise
     """
-    
-    old_active_object = bpy.context.view_layer.objects.active
-    
-    old_mode = old_active_object.mode
+    diagnostics = object_diagnostics(object)
+    if not diagnostics.is_watertight:
+        return False
+    return not check_self_intersection or len(diagnostics.self_intersecting_faces(object.data)) == 0
 
-    bpy.context.view_layer.objects.active = object
 
-    bpy.ops.object.mode_set(mode='EDIT')
+# Manifold repair.
+# Same steps as the 3D Print Toolbox "clean non-manifold", done with bmesh
+# operations on the mesh data: no add-on, no mode switches, no selection.
 
-    # Store the previous selection mode and switch to vertex selection mode
-    previous_select_mode = tuple(bpy.context.tool_settings.mesh_select_mode)
-    bpy.context.tool_settings.mesh_select_mode = (True, False, False)
+# Distance under which vertices are merged and faces are degenerate
+MERGE_DISTANCE = 0.0001
 
-    bpy.ops.mesh.select_non_manifold(extend=False)
-    bm = bmesh.from_edit_mesh(object.data)
 
-    is_watertight = True
+class RepairReport:
+    """
+    What a repair pass changed, and whether the mesh came out watertight.
+    """
 
-    for v in bm.verts:
-        if v.select:
-            is_watertight = False
-            break
+    def __init__(self):
+        self.loose_removed = 0
+        self.interior_faces_removed = 0
+        self.doubles_merged = 0
+        self.degenerate_removed = 0
+        self.holes_filled = 0
+        self.non_manifold_verts_removed = 0
+        self.iterations = 0
+        self.is_watertight = False
 
-    bpy.context.view_layer.objects.active = old_active_object
-    bpy.ops.object.mode_set(mode=old_mode)
+    @property
+    def changed(self):
+        return (self.loose_removed + self.interior_faces_removed + self.doubles_merged + self.degenerate_removed
+                + self.holes_filled + self.non_manifold_verts_removed) > 0
+
+    def __repr__(self):
+        return ("RepairReport(loose_removed=%d, interior_faces_removed=%d, doubles_merged=%d, "
+                "degenerate_removed=%d, holes_filled=%d, non_manifold_verts_removed=%d, iterations=%d, "
+                "is_watertight=%s)" % (
+                    self.loose_removed, self.interior_faces_removed, self.doubles_merged,
+                    self.degenerate_removed, self.holes_filled, self.non_manifold_verts_removed,
+                    self.iterations, self.is_watertight))
+
+
+def repair_bmesh(bm, max_iterations=5, merge_distance=MERGE_DISTANCE):
+    """
+    Cleans a bmesh in place: loose and interior elements, doubles and
+    degenerate faces once, then hole filling and removal of the non-manifold
+    vertices until nothing is left to fix. Returns a RepairReport.
+    """
+    report = RepairReport()
 
-    # Restore the previous selection mode
-    bpy.context.tool_settings.mesh_select_mode = previous_select_mode
+    # Loose vertices and wire edges
+    loose_verts = [vert for vert in bm.verts if not vert.link_faces]
+    report.loose_removed += len(loose_verts)
+    bmesh.ops.delete(bm, geom=loose_verts, context='VERTS')
+    wire_edges = [edge for edge in bm.edges if not edge.link_faces]
+    report.loose_removed += len(wire_edges)
+    bmesh.ops.delete(bm, geom=wire_edges, context='EDGES')
 
-    bpy.context.view_layer.objects.active = old_active_object
-    bpy.ops.object.mode_set(mode=old_mode)
+    # Faces inside the volume, all their edges shared by more than two faces
+    interior_faces = [face for face in bm.faces if all(len(edge.link_faces) > 2 for edge in face.edges)]
+    report.interior_faces_removed = len(interior_faces)
+    bmesh.ops.delete(bm, geom=interior_faces, context='FACES')
 
-    return is_watertight
+    vert_count = len(bm.verts)
+    bmesh.ops.remove_doubles(bm, verts=bm.verts[:], dist=merge_distance)
+    report.doubles_merged = vert_count - len(bm.verts)
+    face_count = len(bm.faces)
+    bmesh.ops.dissolve_degenerate(bm, dist=merge_distance, edges=bm.edges[:])
+    report.degenerate_removed = face_count - len(bm.faces)
+
+    for iteration in range(max_iterations):
+        report.iterations = iteration + 1
+        boundary_edges = [edge for edge in bm.edges if edge.is_boundary]
+        if boundary_edges:
+            filled = bmesh.ops.holes_fill(bm, edges=boundary_edges, sides=0)
+            report.holes_filled += len(filled["faces"])
+        # Bowties, edges with more than two faces, wire edges left by the fill.
+        # Removing them opens holes, filled on the next iteration.
+        non_manifold_verts = [vert for vert in bm.verts if not vert.is_manifold]
+        if not non_manifold_verts:
+            if not any(edge.is_boundary for edge in bm.edges):
+                break
+            continue
+        report.non_manifold_verts_removed += len(non_manifold_verts)
+        bmesh.ops.delete(bm, geom=non_manifold_verts, context='VERTS')
+
+    bmesh.ops.recalc_face_normals(bm, faces=bm.faces[:])
+    return report
+
+
+def repair_object(object: bpy.types.Object, max_iterations=5, merge_distance=MERGE_DISTANCE) -> RepairReport:
+    """
+    Repairs the mesh of the object in whatever mode it is in. Does nothing
+    (but report) if it is already watertight.
+    """
+    report = RepairReport()
+    if object_diagnostics(object).is_watertight:
+        report.is_watertight = True
+        return report
+
+    if object.mode == 'EDIT':
+        bm = bmesh.from_edit_mesh(object.data)
+        report = repair_bmesh(bm, max_iterations, merge_distance)
+        bmesh.update_edit_mesh(object.data)
+        object.update_from_editmode()
+    else:
+        bm = bmesh.new()
+        bm.from_mesh(object.data)
+        report = repair_bmesh(bm, max_iterations, merge_distance)
+        bm.to_mesh(object.data)
+        bm.free()
+        object.data.update()
+    diagnostics_cache.invalidate(object.data)
+    report.is_watertight = diagnostics_cache.get(object.data).is_watertight
+    return report
+
+
+# Kept under their former names for the callers of the 3D Print Toolbox version
+def make_non_manifold(object: bpy.types.Object):
+    return repair_object(object, max_iterations=1)
 
 
-# Attempts to fix non-manifold issues, repeating the 3D Print Toolbox command
-# Multiple times until there are no more non-manifold issues.
 def make_non_manifold_iterate(object: bpy.types.Object, max_iterations):
-    for i in range(max_iterations):
-        if not is_watertight_mesh(object):
-            make_non_manifold(object)
-        else:
-            break
+    return repair_object(object, max_iterations)
 
 
 class LAZYCHIP_OT_fix_manifold(bpy.types.Operator):
@@ -94,12 +432,19 @@ class LAZYCHIP_OT_fix_manifold(bpy.types.Operator):
     def execute(self, context):
         for obj in context.selected_objects:
             if obj.type == 'MESH':
-                context.view_layer.objects.active = obj
-                make_non_manifold(obj)
+                report = repair_object(obj)
+                self.report({'INFO'} if report.is_watertight else {'WARNING'}, obj.name + ": " + repr(report))
         return {'FINISHED'}
 
 def register():
     bpy.utils.register_class(LAZYCHIP_OT_fix_manifold)
+    bpy.app.handlers.depsgraph_update_post.append(invalidate_diagnostics)
+    bpy.app.handlers.load_post.append(clear_diagnostics)
 
 def unregister():
+    if invalidate_diagnostics in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(invalidate_diagnostics)
+    if clear_diagnostics in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(clear_diagnostics)
     bpy.utils.unregister_class(LAZYCHIP_OT_fix_manifold)
+    diagnostics_cache.clear()
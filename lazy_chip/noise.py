@@ -0,0 +1,96 @@
+import random
+import numpy as np
+
+# Vectorized noise.
+# Seeded improved Perlin noise and the Clouds texture built on it, evaluated on
+# whole vertex arrays at once.
+
+NOISE_DEPTH = 4
+
+
+def permutation_table(seed):
+    """
+    Deterministic permutation of the lattice hashes for the given seed,
+    doubled to avoid wrapping the indices.
+    """
+    permutation = np.random.default_rng(seed).permutation(256)
+    return np.concatenate([permutation, permutation])
+
+
+def noise_offset(seed):
+    """
+    Random offset of the noise sampling space, same sequence as the one used
+    to move the objects around in the modifier based version.
+    """
+    generator = random.Random(seed)
+    return np.array([generator.uniform(-99.9, 99.9) for _ in range(3)])
+
+
+def _fade(t):
+    return t * t * t * (t * (t * 6.0 - 15.0) + 10.0)
+
+
+def _gradient(hashes, x, y, z):
+    h = hashes & 15
+    u = np.where(h < 8, x, y)
+    v = np.where(h < 4, y, np.where((h == 12) | (h == 14), x, z))
+    return np.where(h & 1, -u, u) + np.where(h & 2, -v, v)
+
+
+def perlin(points, table):
+    """
+    Improved Perlin noise at every point, in the [-1, 1] range.
+    """
+    cell = np.floor(points)
+    local = points - cell
+    cell = cell.astype(np.int64) & 255
+    x, y, z = local.T
+    cx, cy, cz = cell.T
+    u, v, w = _fade(x), _fade(y), _fade(z)
+
+    a = table[cx] + cy
+    aa = table[a] + cz
+    ab = table[a + 1] + cz
+    b = table[cx + 1] + cy
+    ba = table[b] + cz
+    bb = table[b + 1] + cz
+
+    x1, y1, z1 = x - 1.0, y - 1.0, z - 1.0
+    lower = (1.0 - v) * ((1.0 - u) * _gradient(table[aa], x, y, z) + u * _gradient(table[ba], x1, y, z)) \
+        + v * ((1.0 - u) * _gradient(table[ab], x, y1, z) + u * _gradient(table[bb], x1, y1, z))
+    upper = (1.0 - v) * ((1.0 - u) * _gradient(table[aa + 1], x, y, z1) + u * _gradient(table[ba + 1], x1, y, z1)) \
+        + v * ((1.0 - u) * _gradient(table[ab + 1], x, y1, z1) + u * _gradient(table[bb + 1], x1, y1, z1))
+    return (1.0 - w) * lower + w * upper
+
+
+def fbm(points, noise_size, depth=NOISE_DEPTH, seed=0):
+    """
+    Soft turbulence as in the Clouds texture: depth + 1 octaves of unsigned
+    noise, halving the amplitude at each octave, normalized to [0, 1].
+    """
+    table = permutation_table(seed)
+    points = np.asarray(points, dtype=np.float64) / max(noise_size, 1e-9)
+    values = np.zeros(len(points))
+    amplitude = 1.0
+    for _ in range(depth + 1):
+        values += amplitude * (0.5 + 0.5 * perlin(points, table))
+        points = points * 2.0
+        amplitude *= 0.5
+    return values * ((1 << depth) / ((1 << (depth + 1)) - 1))
+
+
+def clouds(points, noise_size, depth=NOISE_DEPTH, contrast=1.0, seed=0):
+    """
+    Clouds texture intensity, with the texture contrast and clamping applied.
+    """
+    values = fbm(points + noise_offset(seed), noise_size, depth, seed)
+    return np.clip((values - 0.5) * contrast + 0.5, 0.0, 1.0)
+
+
+def displacement(points, noise_size, contrast, edge_push, strength, seed=0, depth=NOISE_DEPTH):
+    """
+    Signed distance each point moves along its normal, as the Displace
+    modifier would with a mid level of 1 - edge_push.
+    """
+    intensity = clouds(points, noise_size, depth, contrast, seed)
+    return (intensity - (1.0 - edge_push)) * strength
@@ -0,0 +1,116 @@
+import bpy
+import os
+from bpy.app.handlers import persistent
+
+# Meshes moved out of memory.
+# A mesh is written as is to its own .blend file in the session temporary
+# folder, then its geometry is cleared: the datablock stays, with its name,
+# materials and ID properties, so that whatever points to it still does. It is
+# appended back and swapped in (every user remapped) when it is needed again.
+# The files are kept until Blender quits, an undo step may still refer to them.
+
+OFFLOADED_KEY = "lazychip_offloaded"
+
+
+class OffloadState:
+    def __init__(self):
+        self.clock = 0
+        self.last_used = {}
+        self.file_count = 0
+
+    def touch(self, mesh):
+        self.clock += 1
+        self.last_used[mesh.name] = self.clock
+
+
+offload_state = OffloadState()
+
+
+def is_offloaded(mesh):
+    return mesh.get(OFFLOADED_KEY) is not None
+
+
+def offload(mesh):
+    """
+    Writes the mesh to disk and frees its geometry.
+    """
+    if is_offloaded(mesh):
+        return
+    offload_state.file_count += 1
+    path = os.path.join(bpy.app.tempdir, "lazychip_offload_%06d.blend" % offload_state.file_count)
+    # Written without materials and ID properties, which stay on the
+    # datablock: the IDs they point to are not duplicated when it comes back
+    mesh_copy = mesh.copy()
+    mesh_copy.materials.clear()
+    for key in list(mesh_copy.keys()):
+        del mesh_copy[key]
+    try:
+        bpy.data.libraries.write(path, {mesh_copy}, fake_user=True)
+        written_name = mesh_copy.name
+    finally:
+        bpy.data.meshes.remove(mesh_copy)
+    mesh.clear_geometry()
+    mesh[OFFLOADED_KEY] = {"path": path, "name": written_name}
+
+
+def resident(mesh):
+    """
+    The given mesh with its geometry in memory, loading it back if needed.
+    The returned datablock replaces the given one everywhere.
+    """
+    if mesh is None:
+        return None
+    if is_offloaded(mesh):
+        offloaded = mesh[OFFLOADED_KEY]
+        with bpy.data.libraries.load(offloaded["path"]) as (data_from, data_to):
+            data_to.meshes = [offloaded["name"]]
+        loaded_mesh = data_to.meshes[0]
+        for material in mesh.materials:
+            loaded_mesh.materials.append(material)
+        for key in mesh.keys():
+            if key != OFFLOADED_KEY:
+                loaded_mesh[key] = mesh[key]
+        loaded_mesh.use_fake_user = mesh.use_fake_user
+        name = mesh.name
+        mesh.user_remap(loaded_mesh)
+        bpy.data.meshes.remove(mesh)
+        loaded_mesh.name = name
+        mesh = loaded_mesh
+    offload_state.touch(mesh)
+    return mesh
+
+
+def enforce_cap(candidates, limit):
+    """
+    Offloads the least recently used of the candidate meshes, leaving at most
+    the given number of them in memory. No limit if it is 0.
+    """
+    if limit <= 0:
+        return 0
+    in_memory = [mesh for mesh in candidates if not is_offloaded(mesh)]
+    in_memory.sort(key=lambda mesh: offload_state.last_used.get(mesh.name, 0))
+    extra = in_memory[:max(0, len(in_memory) - limit)]
+    for mesh in extra:
+        offload(mesh)
+    return len(extra)
+
+
+def load_all():
+    for mesh in list(bpy.data.meshes):
+        if is_offloaded(mesh):
+            resident(mesh)
+
+
+@persistent
+def load_before_save(*args):
+    # A saved file holds every mesh, the temporary files do not outlive the session
+    load_all()
+
+
+def register():
+    bpy.app.handlers.save_pre.append(load_before_save)
+
+def unregister():
+    if load_before_save in bpy.app.handlers.save_pre:
+        bpy.app.handlers.save_pre.remove(load_before_save)
+    load_all()
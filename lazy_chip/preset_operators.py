@@ -1,142 +1,167 @@
 import bpy
 from bpy.types import Operator
 
+# Material presets of the weathering settings, by key: (label, settings).
+# Used by the preset operators below and by the variant sweep.
+PRESETS = {
+    "woodchipping": ("Wood Chipping", {
+        "resolution_property": 64,
+        "edge_relax_property": 0.5,
+        "edge_push_property": 0.8,
+        "noise_scale_property": 40,
+        "noise_strength_property": 20,
+        "noise_contrast_property": 2,
+        "seed_property": 0,
+        "random_seed_property": True,
+        "fixed_scale_check_property": True,
+        "fixed_scale_property": 4.0,
+    }),
+    "woodsmoothing": ("Wood Smoothing", {
+        "resolution_property": 64,
+        "edge_relax_property": 1.5,
+        "edge_push_property": 0.9,
+        "noise_scale_property": 60,
+        "noise_strength_property": 8.0,
+        "noise_contrast_property": 0.5,
+        "seed_property": 0,
+        "random_seed_property": True,
+        "fixed_scale_check_property": True,
+        "fixed_scale_property": 2.0,
+    }),
+    "stonemarbling": ("Stone Marbling", {
+        "resolution_property": 64,
+        "edge_relax_property": 0.0,
+        "edge_push_property": 0.5,
+        "noise_scale_property": 100,
+        "noise_strength_property": 24,
+        "noise_contrast_property": 0.5,
+        "seed_property": 0,
+        "random_seed_property": True,
+        "fixed_scale_check_property": True,
+        "fixed_scale_property": 3.0,
+    }),
+    "stonechipping": ("Stone Chipping", {
+        "resolution_property": 64,
+        "edge_relax_property": 4.0,
+        "edge_push_property": 0.8,
+        "noise_scale_property": 40,
+        "noise_strength_property": 12.0,
+        "noise_contrast_property": 1.0,
+        "seed_property": 0,
+        "random_seed_property": True,
+        "fixed_scale_check_property": True,
+        "fixed_scale_property": 4.0,
+    }),
+    "stoneweathering": ("Stone Weathering", {
+        "resolution_property": 64,
+        "edge_relax_property": 0.0,
+        "edge_push_property": 0.9,
+        "noise_scale_property": 160,
+        "noise_strength_property": 24,
+        "noise_contrast_property": 3.5,
+        "seed_property": 0,
+        "random_seed_property": True,
+        "fixed_scale_check_property": True,
+        "fixed_scale_property": 2.0,
+    }),
+    "concretechippingsurface": ("Concrete Chipping Surface", {
+        "resolution_property": 64,
+        "edge_relax_property": .5,
+        "edge_push_property": 0.9,
+        "noise_scale_property": 40,
+        "noise_strength_property": 30.0,
+        "noise_contrast_property": 2.2,
+        "seed_property": 0,
+        "random_seed_property": True,
+        "fixed_scale_check_property": True,
+        "fixed_scale_property": 4.0,
+    }),
+    "concreteheavyweathering": ("Concrete Heavy Weathering", {
+        "resolution_property": 128,
+        "edge_relax_property": 1.0,
+        "edge_push_property": 0.65,
+        "noise_scale_property": 30,
+        "noise_strength_property": 12.0,
+        "noise_contrast_property": 1.3,
+        "seed_property": 0,
+        "random_seed_property": True,
+        "fixed_scale_check_property": True,
+        "fixed_scale_property": 4.0,
+    }),
+    "concretechippingedges": ("Concrete Chipping Edges", {
+        "resolution_property": 64,
+        "edge_relax_property": 4.0,
+        "edge_push_property": 0.98,
+        "noise_scale_property": 40,
+        "noise_strength_property": 12.0,
+        "noise_contrast_property": 1.0,
+        "seed_property": 0,
+        "random_seed_property": True,
+        "fixed_scale_check_property": True,
+        "fixed_scale_property": 4.0,
+    }),
+}
+
+
+def apply_preset(weathering_props, preset_key):
+    for property_name, value in PRESETS[preset_key][1].items():
+        setattr(weathering_props, property_name, value)
 
 
 class LAZYCHIP_OP_woodchipping(Operator):
     bl_label = "Set Wood Chipping"
     bl_idname = "lazychip.op_woodchipping"
     def execute(self, context):
-        weathering_props = context.scene.weathering_props
-        weathering_props.resolution_property = 64
-        weathering_props.edge_relax_property = 0.5
-        weathering_props.edge_push_property = 0.8
-        weathering_props.noise_scale_property = 40
-        weathering_props.noise_strength_property = 20
-        weathering_props.noise_contrast_property = 2
-        weathering_props.seed_property = 0  
-        weathering_props.random_seed_property = True
-        weathering_props.fixed_scale_check_property = True
-        weathering_props.fixed_scale_property = 4.0
+        apply_preset(context.scene.weathering_props, "woodchipping")
         return {'FINISHED'}
     
 class LAZYCHIP_OP_woodsmoothing(Operator):
     bl_label = "Set Wood Smoothing"
     bl_idname = "lazychip.op_woodsmoothing"
     def execute(self, context):
-        weathering_props = context.scene.weathering_props
-        weathering_props.resolution_property = 64
-        weathering_props.edge_relax_property = 1.5
-        weathering_props.edge_push_property = 0.9
-        weathering_props.noise_scale_property = 60
-        weathering_props.noise_strength_property = 8.0
-        weathering_props.noise_contrast_property = 0.5
-        weathering_props.seed_property = 0
-        weathering_props.random_seed_property = True
-        weathering_props.fixed_scale_check_property = True
-        weathering_props.fixed_scale_property = 2.0
+        apply_preset(context.scene.weathering_props, "woodsmoothing")
         return {'FINISHED'}
     
 class LAZYCHIP_OP_stonemarbling(Operator):
     bl_label = "Set Stone Marbling"
     bl_idname = "lazychip.op_stonemarbling"
     def execute(self, context):
-        weathering_props = context.scene.weathering_props
-        weathering_props.resolution_property = 64
-        weathering_props.edge_relax_property = 0.0
-        weathering_props.edge_push_property = 0.5
-        weathering_props.noise_scale_property = 100
-        weathering_props.noise_strength_property = 24
-        weathering_props.noise_contrast_property = 0.5
-        weathering_props.seed_property = 0  
-        weathering_props.random_seed_property = True
-        weathering_props.fixed_scale_check_property = True
-        weathering_props.fixed_scale_property = 3.0
+        apply_preset(context.scene.weathering_props, "stonemarbling")
         return {'FINISHED'}
     
 class LAZYCHIP_OP_stonechipping(Operator):
     bl_label = "Set Stone Chipping"
     bl_idname = "lazychip.op_stonechipping"
     def execute(self, context):
-        weathering_props = context.scene.weathering_props
-        weathering_props.resolution_property = 64
-        weathering_props.edge_relax_property = 4.0
-        weathering_props.edge_push_property = 0.8
-        weathering_props.noise_scale_property = 40
-        weathering_props.noise_strength_property = 12.0
-        weathering_props.noise_contrast_property = 1.0
-        weathering_props.seed_property = 0
-        weathering_props.random_seed_property = True
-        weathering_props.fixed_scale_check_property = True
-        weathering_props.fixed_scale_property = 4.0
+        apply_preset(context.scene.weathering_props, "stonechipping")
         return {'FINISHED'}
     
 class LAZYCHIP_OP_stoneweathering(Operator):
     bl_label = "Set Stone Weathering"
     bl_idname = "lazychip.op_stoneweathering"
     def execute(self, context):
-        weathering_props = context.scene.weathering_props
-        weathering_props.resolution_property = 64
-        weathering_props.edge_relax_property = 0.0
-        weathering_props.edge_push_property = 0.9
-        weathering_props.noise_scale_property = 160
-        weathering_props.noise_strength_property = 24
-        weathering_props.noise_contrast_property = 3.5
-        weathering_props.seed_property = 0  
-        weathering_props.random_seed_property = True
-        weathering_props.fixed_scale_check_property = True
-        weathering_props.fixed_scale_property = 2.0
+        apply_preset(context.scene.weathering_props, "stoneweathering")
         return {'FINISHED'}
     
 class LAZYCHIP_OP_concretechippingsurface(Operator):
     bl_label = "Set Concrete Chipping Surface"
     bl_idname = "lazychip.op_concretechippingsurface"
     def execute(self, context):
-        weathering_props = context.scene.weathering_props
-        weathering_props.resolution_property = 64
-        weathering_props.edge_relax_property = .5
-        weathering_props.edge_push_property = 0.9
-        weathering_props.noise_scale_property = 40
-        weathering_props.noise_strength_property = 30.0
-        weathering_props.noise_contrast_property = 2.2
-        weathering_props.seed_property = 0
-        weathering_props.random_seed_property = True
-        weathering_props.fixed_scale_check_property = True
-        weathering_props.fixed_scale_property = 4.0
+        apply_preset(context.scene.weathering_props, "concretechippingsurface")
         return {'FINISHED'}
     
 class LAZYCHIP_OP_concreteheavyweathering(Operator):
     bl_label = "Set Concrete Heavy Weathering"
     bl_idname = "lazychip.op_concreteheavyweathering"
     def execute(self, context):
-        weathering_props = context.scene.weathering_props
-        weathering_props.resolution_property = 128
-        weathering_props.edge_relax_property = 1.0
-        weathering_props.edge_push_property = 0.65
-        weathering_props.noise_scale_property = 30
-        weathering_props.noise_strength_property = 12.0
-        weathering_props.noise_contrast_property = 1.3
-        weathering_props.seed_property = 0
-        weathering_props.random_seed_property = True
-        weathering_props.fixed_scale_check_property = True
-        weathering_props.fixed_scale_property = 4.0
+        apply_preset(context.scene.weathering_props, "concreteheavyweathering")
         return {'FINISHED'}
     
 class LAZYCHIP_OP_concretechippingedges(Operator):
     bl_label = "Set Concrete Chipping Edges"
     bl_idname = "lazychip.op_concretechippingedges"
     def execute(self, context):
-        weathering_props = context.scene.weathering_props
-        weathering_props.resolution_property = 64
-        weathering_props.edge_relax_property = 4.0
-        weathering_props.edge_push_property = 0.98
-        weathering_props.noise_scale_property = 40
-        weathering_props.noise_strength_property = 12.0
-        weathering_props.noise_contrast_property = 1.0
-        weathering_props.seed_property = 0
-        weathering_props.random_seed_property = True
-        weathering_props.fixed_scale_check_property = True
-        weathering_props.fixed_scale_property = 4.0
+        apply_preset(context.scene.weathering_props, "concretechippingedges")
         return {'FINISHED'}
 
 class LAZYCHIP_OP_setdefaultsettings(Operator):
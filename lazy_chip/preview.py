@@ -0,0 +1,171 @@
+import bpy
+import time
+from .engine import DamageParameters, damage_mesh, band_group_weights, mesh_to_arrays, arrays_to_mesh, transform_vertices
+from .cache import base_mesh_cache
+from .workers import WorkerPool
+from .budget import plan_job
+from .stash import original_mesh_of, swap_in_chipped, restore_original
+
+# Live preview of the damage on the active object.
+# A setting change re-chips the object at the preview resolution right away;
+# once the sliders are idle, the higher resolutions are computed on a
+# background worker and shown as they arrive, up to the final resolution.
+
+DEBOUNCE_INTERVAL = 0.05
+TICK_INTERVAL = 0.1
+
+
+class PreviewState:
+    def __init__(self):
+        self.object_name = None
+        self.changed_at = 0.0
+        self.low_resolution_done = True
+        self.pool = None
+        self.results = None
+        self.shown_signature = None
+
+    def cancel(self):
+        """
+        Stops the refinement in flight, if any.
+        """
+        if self.pool is not None:
+            self.pool.close()
+        self.pool = None
+        self.results = None
+
+
+preview_state = PreviewState()
+
+
+def preview_resolutions(final_resolution, preview_resolution):
+    """
+    Resolutions shown one after the other, doubling up to the final one.
+    """
+    levels = []
+    resolution = preview_resolution
+    while resolution < final_resolution:
+        levels.append(resolution)
+        resolution *= 2
+    levels.append(final_resolution)
+    return levels
+
+
+def preview_signature(i_selected_object, params):
+    return i_selected_object.name, tuple(sorted(params.to_dict().items()))
+
+
+def take_preview_result(i_selected_object, params):
+    """
+    True if the object already shows the full resolution result for these
+    settings, so that applying the damage can keep it. The result can only
+    be taken once, a retry computes a new one.
+    """
+    if preview_state.shown_signature != preview_signature(i_selected_object, params):
+        return False
+    preview_state.shown_signature = None
+    return True
+
+
+def show_result(context, i_selected_object, chipped_mesh):
+    restore_original(i_selected_object)
+    chipped_mesh.name = i_selected_object.data.name + '_chipped'
+    swap_in_chipped(context, i_selected_object, chipped_mesh,
+                    intersect=context.scene.weathering_props.intersect_mode_property == 'BOOLEAN')
+
+
+def settings_changed(weathering_props, context):
+    """
+    Update callback of the weathering settings.
+    """
+    preview_state.cancel()
+    if not weathering_props.live_preview_property:
+        return
+
+    active_object = context.view_layer.objects.active
+    if active_object is None or active_object.type != 'MESH':
+        return
+    preview_state.object_name = active_object.name
+    preview_state.changed_at = time.time()
+    preview_state.low_resolution_done = False
+    if not bpy.app.timers.is_registered(preview_tick):
+        bpy.app.timers.register(preview_tick, first_interval=DEBOUNCE_INTERVAL)
+
+
+def start_refinement(i_selected_object, params, levels, weathering_props):
+    source_mesh = original_mesh_of(i_selected_object.data) or i_selected_object.data
+    verts, tris = mesh_to_arrays(source_mesh, i_selected_object.matrix_basis)
+    preview_state.pool = WorkerPool(1)
+    for resolution in levels:
+        level_params = DamageParameters.from_dict(params.to_dict())
+        level_params.resolution = resolution
+        level_params = plan_job(i_selected_object.dimensions, level_params, weathering_props)[0]
+        preview_state.pool.submit(resolution, verts, tris, level_params,
+                                  weights=band_group_weights(i_selected_object, weathering_props))
+    preview_state.results = preview_state.pool.results(timeout=0)
+
+
+def preview_tick():
+    context = bpy.context
+    weathering_props = context.scene.weathering_props
+    i_selected_object = bpy.data.objects.get(preview_state.object_name or "")
+    if i_selected_object is None or not weathering_props.live_preview_property:
+        preview_state.cancel()
+        return None
+
+    params = DamageParameters.from_props(weathering_props)
+    levels = preview_resolutions(params.resolution, weathering_props.preview_resolution_property)
+    idle_time = time.time() - preview_state.changed_at
+
+    # Quick, low resolution pass in this process
+    if not preview_state.low_resolution_done:
+        if idle_time < DEBOUNCE_INTERVAL:
+            return TICK_INTERVAL
+        level_params = DamageParameters.from_dict(params.to_dict())
+        level_params.resolution = levels[0]
+        preview_state.shown_signature = None
+        source_mesh = restore_original(i_selected_object)
+        level_params = plan_job(i_selected_object.dimensions, level_params, weathering_props)[0]
+        base_mesh_cache.resize(weathering_props.cache_size_property * 1024 * 1024)
+        chipped_mesh = damage_mesh(source_mesh, i_selected_object.matrix_basis, level_params,
+                                   source_mesh.name + '_chipped', cache=base_mesh_cache,
+                                   weights=band_group_weights(i_selected_object, weathering_props))
+        show_result(context, i_selected_object, chipped_mesh)
+        preview_state.low_resolution_done = True
+        if len(levels) == 1:
+            preview_state.shown_signature = preview_signature(i_selected_object, params)
+            return None
+        return TICK_INTERVAL
+
+    # Refining on a worker once the sliders are left alone
+    if preview_state.results is None:
+        if idle_time < weathering_props.preview_idle_property:
+            return TICK_INTERVAL
+        start_refinement(i_selected_object, params, levels[1:], weathering_props)
+        return TICK_INTERVAL
+
+    result = next(preview_state.results, False)
+    if result is False:
+        preview_state.cancel()
+        return None
+    if result is not None and result[1] is not None:
+        resolution, verts, faces = result
+        source_mesh = restore_original(i_selected_object)
+        verts = transform_vertices(verts, i_selected_object.matrix_basis.inverted())
+        show_result(context, i_selected_object, arrays_to_mesh(
+            source_mesh.name + '_chipped', verts, faces, source_mesh.materials))
+        if resolution == params.resolution:
+            preview_state.shown_signature = preview_signature(i_selected_object, params)
+    return TICK_INTERVAL
+
+
+def register():
+    # A reloaded add-on starts with no preview shown
+    preview_state.cancel()
+    preview_state.object_name = None
+    preview_state.shown_signature = None
+
+
+def unregister():
+    preview_state.cancel()
+    if bpy.app.timers.is_registered(preview_tick):
+        bpy.app.timers.unregister(preview_tick)
@@ -0,0 +1,189 @@
+import bpy
+import os
+import json
+import time
+import numpy as np
+from contextlib import contextmanager
+from bpy.types import Operator
+from bpy.props import StringProperty
+
+# Stage timing of the chipping pipeline.
+# Named spans can be nested; each one is recorded with the object it belongs
+# to, so that totals and percentiles can be aggregated over a whole batch and
+# exported as a Chrome trace (chrome://tracing, Perfetto).
+
+
+# Past this many events the oldest half is dropped, so that a long session
+# doesn't keep growing the profile.
+MAX_EVENTS = 200000
+
+
+class Profiler:
+    def __init__(self):
+        self.events = []
+        self.stack = []
+        self._statistics = None
+
+    @contextmanager
+    def span(self, name, object_name=None):
+        """
+        Times the enclosed block. The object name is inherited from the
+        enclosing span if not given.
+        """
+        if object_name is None and self.stack:
+            object_name = self.stack[-1]
+        self.stack.append(object_name)
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.stack.pop()
+            self.record(name, object_name, start, time.time() - start)
+
+    @contextmanager
+    def resume(self, object_name):
+        """
+        Nests the spans of the enclosed block in a span recorded later with
+        record, for work split over several calls (the steps of a modal
+        operator).
+        """
+        self.stack.append(object_name)
+        try:
+            yield
+        finally:
+            self.stack.pop()
+
+    @contextmanager
+    def isolated(self):
+        """
+        Records the enclosed block on its own, then puts back the events
+        recorded before it.
+        """
+        events, stack = self.events, self.stack
+        self.events, self.stack, self._statistics = [], [], None
+        try:
+            yield
+        finally:
+            self.events, self.stack, self._statistics = events, stack, None
+
+    def record(self, name, object_name, start, duration):
+        """
+        Adds a span timed by the caller.
+        """
+        self._add([{
+            "name": name,
+            "object": object_name,
+            "start": start,
+            "duration": duration,
+            "depth": len(self.stack),
+            "pid": os.getpid(),
+        }])
+
+    def merge(self, events):
+        """
+        Adds events recorded by another process (a background worker).
+        """
+        for event in events:
+            event["depth"] += len(self.stack)
+            if event["object"] is None and self.stack:
+                event["object"] = self.stack[-1]
+        self._add(events)
+
+    def _add(self, events):
+        self.events.extend(events)
+        if len(self.events) > MAX_EVENTS:
+            del self.events[:len(self.events) - MAX_EVENTS // 2]
+        self._statistics = None
+
+    @property
+    def statistics(self):
+        """
+        Stage statistics, computed when first read after the events changed.
+        """
+        if self._statistics is None:
+            self._statistics = self.stage_statistics()
+        return self._statistics
+
+    def stage_statistics(self):
+        """
+        Total, count and percentiles of the duration of each stage.
+        """
+        durations = {}
+        for event in self.events:
+            durations.setdefault(event["name"], []).append(event["duration"])
+        statistics = {}
+        for name, values in durations.items():
+            values = np.array(values)
+            statistics[name] = {
+                "total": float(values.sum()),
+                "count": len(values),
+                "p50": float(np.percentile(values, 50)),
+                "p90": float(np.percentile(values, 90)),
+                "p99": float(np.percentile(values, 99)),
+            }
+        return statistics
+
+    def chrome_trace(self):
+        trace_events = []
+        for event in sorted(self.events, key=lambda event: event["start"]):
+            trace_events.append({
+                "name": event["name"],
+                "cat": "lazychip",
+                "ph": "X",
+                "ts": event["start"] * 1e6,
+                "dur": event["duration"] * 1e6,
+                "pid": event["pid"],
+                "tid": event["pid"],
+                "args": {"object": event["object"]},
+            })
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, filepath):
+        with open(filepath, "w") as trace_file:
+            json.dump(self.chrome_trace(), trace_file)
+
+    def clear(self):
+        self.events = []
+        self._statistics = None
+
+
+profiler = Profiler()
+
+
+class LAZYCHIP_OP_exporttrace(Operator):
+    bl_label = "Export Trace"
+    bl_idname = "lazychip.op_exporttrace"
+    bl_description = "Exports the recorded stage timings as Chrome trace JSON"
+
+    filepath: StringProperty(subtype='FILE_PATH')
+    filter_glob: StringProperty(default="*.json", options={'HIDDEN'})
+
+    def invoke(self, context, event):
+        if not self.filepath:
+            self.filepath = "lazychip_trace.json"
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+        profiler.export_chrome_trace(bpy.path.abspath(self.filepath))
+        self.report({'INFO'}, "Exported " + str(len(profiler.events)) + " spans to " + self.filepath)
+        return {'FINISHED'}
+
+
+class LAZYCHIP_OP_cleartimings(Operator):
+    bl_label = "Clear Timings"
+    bl_idname = "lazychip.op_cleartimings"
+    bl_description = "Forgets the recorded stage timings"
+
+    def execute(self, context):
+        profiler.clear()
+        return {'FINISHED'}
+
+
+def register():
+    bpy.utils.register_class(LAZYCHIP_OP_exporttrace)
+    bpy.utils.register_class(LAZYCHIP_OP_cleartimings)
+
+def unregister():
+    bpy.utils.unregister_class(LAZYCHIP_OP_exporttrace)
+    bpy.utils.unregister_class(LAZYCHIP_OP_cleartimings)
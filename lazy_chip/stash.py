@@ -0,0 +1,298 @@
+import bpy
+from bpy.app.handlers import persistent
+from bpy.types import Operator
+from .engine import intersect_in_memory
+from .offload import resident
+
+# Stash of the original meshes of the damaged objects.
+# Each damaged mesh points to its original through an ID property, and the
+# original is flagged and kept alive with a fake user. A reverse index
+# (original -> damaged meshes, by session_uid) is built in one pass over the
+# file when needed, and dropped whenever the file or the undo history changes
+# it.
+# Meshes flagged as held belong to the undo journal and are never removed here.
+
+ORIGINAL_KEY = "lazychip_original"
+STASHED_KEY = "lazychip_stashed"
+HELD_KEY = "lazychip_held"
+
+
+class StashRegistry:
+    def __init__(self):
+        self.reverse = None
+
+    def invalidate(self):
+        self.reverse = None
+
+    def reverse_index(self):
+        """
+        Damaged meshes of each stashed original, keyed by session_uid so
+        that renaming either mesh keeps them paired.
+        """
+        if self.reverse is None:
+            self.reverse = {}
+            for mesh in bpy.data.meshes:
+                original_mesh = mesh.get(ORIGINAL_KEY)
+                if original_mesh is None and '_chipped' in mesh.name:
+                    original_mesh = legacy_original_of(mesh)
+                    if original_mesh is not None:
+                        pair(mesh, original_mesh, index=False)
+                if original_mesh is not None:
+                    self.reverse.setdefault(original_mesh.session_uid, {})[mesh.session_uid] = mesh
+        return self.reverse
+
+    def add(self, chipped_mesh, original_mesh):
+        if self.reverse is not None:
+            self.reverse.setdefault(original_mesh.session_uid, {})[chipped_mesh.session_uid] = chipped_mesh
+
+    def discard(self, chipped_mesh, original_mesh):
+        if self.reverse is not None:
+            chipped_meshes = self.reverse.get(original_mesh.session_uid, {})
+            chipped_meshes.pop(chipped_mesh.session_uid, None)
+            if not chipped_meshes:
+                self.reverse.pop(original_mesh.session_uid, None)
+
+    def chipped_meshes_of(self, original_mesh):
+        chipped_meshes = list(self.reverse_index().get(original_mesh.session_uid, {}).values())
+        if not all(is_paired(chipped_mesh, original_mesh) for chipped_mesh in chipped_meshes):
+            # A mesh was deleted or unpaired behind our back
+            self.invalidate()
+            chipped_meshes = list(self.reverse_index().get(original_mesh.session_uid, {}).values())
+        return chipped_meshes
+
+
+def is_paired(chipped_mesh, original_mesh):
+    """
+    True if the chipped mesh still exists and points to the original.
+    """
+    try:
+        return chipped_mesh.get(ORIGINAL_KEY) == original_mesh
+    except ReferenceError:
+        return False
+
+
+stash_registry = StashRegistry()
+
+
+def legacy_original_of(chipped_mesh):
+    """
+    Original of a mesh damaged before the registry existed, found by name.
+    """
+    original_name = chipped_mesh.name.split('_chipped', 1)[0]
+    for candidate_name in (original_name, original_name.rsplit('.', 1)[0]):
+        original_mesh = bpy.data.meshes.get(candidate_name)
+        if original_mesh is not None and original_mesh != chipped_mesh:
+            return original_mesh
+    return None
+
+
+def pair(chipped_mesh, original_mesh, index=True):
+    """
+    Records the chipped mesh as damaged from the original, stashing it.
+    """
+    chipped_mesh.pop(STASHED_KEY, None)
+    chipped_mesh[ORIGINAL_KEY] = original_mesh
+    chipped_mesh.use_fake_user = True
+    original_mesh[STASHED_KEY] = True
+    original_mesh.use_fake_user = True
+    if index:
+        stash_registry.add(chipped_mesh, original_mesh)
+
+
+def unpair(chipped_mesh):
+    """
+    Forgets the pairing of a chipped mesh, releasing its original if no other
+    damaged mesh needs it. Returns the original, if it is still there.
+    """
+    original_mesh = chipped_mesh.get(ORIGINAL_KEY)
+    if original_mesh is None:
+        return None
+    del chipped_mesh[ORIGINAL_KEY]
+    stash_registry.discard(chipped_mesh, original_mesh)
+    if not stash_registry.chipped_meshes_of(original_mesh):
+        release(original_mesh)
+    return original_mesh
+
+
+def release(original_mesh):
+    original_mesh.pop(STASHED_KEY, None)
+    # A mesh held by the undo journal keeps its fake user
+    original_mesh.use_fake_user = bool(original_mesh.get(HELD_KEY))
+
+
+def original_mesh_of(chipped_mesh):
+    """
+    Finds the stashed original of a chipped mesh, None if there is none.
+    The original is loaded back if it was offloaded.
+    """
+    original_mesh = chipped_mesh.get(ORIGINAL_KEY)
+    if original_mesh is None and '_chipped' in chipped_mesh.name:
+        original_mesh = legacy_original_of(chipped_mesh)
+        if original_mesh is not None:
+            pair(chipped_mesh, original_mesh)
+    return resident(original_mesh)
+
+
+def swap_in_chipped(context, i_selected_object, chipped_mesh, intersect=True):
+    """
+    Intersects the chipped mesh with the original and swaps it in, stashing
+    the original. Without intersect the chipped mesh is taken as it is (it
+    was clamped to the original by the engine).
+    """
+    if intersect:
+        chipped_mesh = intersect_in_memory(context, i_selected_object, chipped_mesh)
+    pair(chipped_mesh, i_selected_object.data)
+    i_selected_object.data = chipped_mesh
+
+
+def restore_original(i_selected_object):
+    """
+    Puts the original mesh back on the object, removing the damaged one.
+    """
+    chipped_mesh = i_selected_object.data
+    original_mesh = original_mesh_of(chipped_mesh)
+    if original_mesh is None:
+        return i_selected_object.data
+    i_selected_object.data = original_mesh
+    if chipped_mesh.users - chipped_mesh.use_fake_user == 0 and not chipped_mesh.get(HELD_KEY):
+        stash_registry.discard(chipped_mesh, original_mesh)
+        bpy.data.meshes.remove(chipped_mesh, do_unlink=True)
+    if not stash_registry.chipped_meshes_of(original_mesh):
+        release(original_mesh)
+    return original_mesh
+
+
+def keep_damage(i_selected_object):
+    """
+    Makes the damage of the object permanent, dropping its stashed original
+    unless other damaged meshes still need it.
+    """
+    chipped_mesh = i_selected_object.data
+    original_mesh = original_mesh_of(chipped_mesh)
+    if original_mesh is None:
+        return
+    unpair(chipped_mesh)
+    chipped_mesh.name = original_mesh.name + "_applied"
+    chipped_mesh.use_fake_user = False
+    if original_mesh.users == 0 and not original_mesh.get(HELD_KEY):
+        bpy.data.meshes.remove(original_mesh)
+
+
+def restore_all(objects):
+    """
+    Restores the originals of all the given objects in one pass.
+    """
+    restored = 0
+    for current_object in objects:
+        if current_object.type == 'MESH' and original_mesh_of(current_object.data) is not None:
+            restore_original(current_object)
+            restored += 1
+    return restored
+
+
+def keep_all(objects):
+    """
+    Makes the damage of all the given objects permanent in one pass.
+    """
+    kept = 0
+    for current_object in objects:
+        if current_object.type == 'MESH' and original_mesh_of(current_object.data) is not None:
+            keep_damage(current_object)
+            kept += 1
+    return kept
+
+
+def collect_orphans():
+    """
+    Removes the damaged meshes no object uses anymore, and the stashed
+    originals no damaged mesh and no object refers to.
+    """
+    removed = 0
+    # Rebuilt from the ID properties, so that every entry is a live pairing
+    stash_registry.invalidate()
+    reverse = stash_registry.reverse_index()
+    for original_uid, chipped_meshes in list(reverse.items()):
+        for chipped_uid, chipped_mesh in list(chipped_meshes.items()):
+            if chipped_mesh.users - chipped_mesh.use_fake_user == 0 and not chipped_mesh.get(HELD_KEY):
+                bpy.data.meshes.remove(chipped_mesh)
+                removed += 1
+                del chipped_meshes[chipped_uid]
+        if not chipped_meshes:
+            del reverse[original_uid]
+
+    for mesh in list(bpy.data.meshes):
+        if mesh.get(STASHED_KEY) and mesh.session_uid not in reverse:
+            release(mesh)
+            if mesh.users == 0:
+                bpy.data.meshes.remove(mesh)
+                removed += 1
+    return removed
+
+
+def kept_meshes():
+    """
+    Stashed originals and held meshes that no object shows.
+    """
+    shown = {current_object.data for current_object in bpy.data.objects if current_object.type == 'MESH'}
+    return [mesh for mesh in bpy.data.meshes
+            if (mesh.get(STASHED_KEY) or mesh.get(HELD_KEY)) and mesh not in shown]
+
+
+@persistent
+def invalidate_registry(*args):
+    stash_registry.invalidate()
+
+
+class LAZYCHIP_OP_restoreall(Operator):
+    bl_label = "Restore All"
+    bl_idname = "lazychip.op_restoreall"
+    bl_description = "Removes the damage of every object in the file"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context):
+        bpy.ops.object.mode_set(mode='OBJECT')
+        restored = restore_all(bpy.data.objects)
+        self.report({'INFO'}, "Restored " + str(restored) + " objects")
+        return {'FINISHED'}
+
+
+class LAZYCHIP_OP_clearallstash(Operator):
+    bl_label = "Clear All Stash"
+    bl_idname = "lazychip.op_clearallstash"
+    bl_description = "Makes the damage of every object in the file permanent and frees the stashed originals"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context):
+        bpy.ops.object.mode_set(mode='OBJECT')
+        kept = keep_all(bpy.data.objects)
+        self.report({'INFO'}, "Applied the damage of " + str(kept) + " objects")
+        return {'FINISHED'}
+
+
+class LAZYCHIP_OP_collectorphans(Operator):
+    bl_label = "Collect Orphans"
+    bl_idname = "lazychip.op_collectorphans"
+    bl_description = "Removes the stashed and damaged meshes no object uses anymore"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context):
+        removed = collect_orphans()
+        self.report({'INFO'}, "Removed " + str(removed) + " meshes")
+        return {'FINISHED'}
+
+
+def register():
+    bpy.utils.register_class(LAZYCHIP_OP_restoreall)
+    bpy.utils.register_class(LAZYCHIP_OP_clearallstash)
+    bpy.utils.register_class(LAZYCHIP_OP_collectorphans)
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        handlers.append(invalidate_registry)
+
+def unregister():
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if invalidate_registry in handlers:
+            handlers.remove(invalidate_registry)
+    bpy.utils.unregister_class(LAZYCHIP_OP_restoreall)
+    bpy.utils.unregister_class(LAZYCHIP_OP_clearallstash)
+    bpy.utils.unregister_class(LAZYCHIP_OP_collectorphans)
+    stash_registry.invalidate()
@@ -1,21 +1,82 @@
 import bpy
 from bpy.types import Panel, PropertyGroup
 from bpy.props import IntProperty, FloatProperty, PointerProperty
+from .preview import settings_changed
+from .profiling import profiler
+from .preset_operators import PRESETS
 
 class WeatheringProps(PropertyGroup):
-    resolution_property: IntProperty(name="Resolution", default=64, min=16, max=4096)
-    edge_relax_property: FloatProperty(name="Edge Relax", default=3.0, min=0, max=2048)
-    edge_push_property: FloatProperty(name="Edge Push", default=0.7, min=0.0, max=1.0)
-    noise_scale_property: FloatProperty(name="Noise Scale", default=40, min=0, max=8192)
-    noise_strength_property: FloatProperty(name="Noise Strength", default=8.0, min=0, max=8192)
-    noise_contrast_property: FloatProperty(name="Noise Contrast", default=1.0, min=0, max=1024)
-    seed_property: IntProperty(name="Seed", default=0, min=0, max=999999)
+    resolution_property: IntProperty(name="Resolution", default=64, min=16, max=4096, update=settings_changed)
+    edge_relax_property: FloatProperty(name="Edge Relax", default=3.0, min=0, max=2048, update=settings_changed)
+    edge_push_property: FloatProperty(name="Edge Push", default=0.7, min=0.0, max=1.0, update=settings_changed)
+    noise_scale_property: FloatProperty(name="Noise Scale", default=40, min=0, max=8192, update=settings_changed)
+    noise_strength_property: FloatProperty(name="Noise Strength", default=8.0, min=0, max=8192, update=settings_changed)
+    noise_contrast_property: FloatProperty(name="Noise Contrast", default=1.0, min=0, max=1024, update=settings_changed)
+    seed_property: IntProperty(name="Seed", default=0, min=0, max=999999, update=settings_changed)
     random_seed_property: bpy.props.BoolProperty(name="Random Seed", default=True)
-    fixed_scale_check_property: bpy.props.BoolProperty(name="Use Fixed Scale", default=False)
-    fixed_scale_property: FloatProperty(name="Noise Scale", default=1, min=0, max=20)
+    fixed_scale_check_property: bpy.props.BoolProperty(name="Use Fixed Scale", default=False, update=settings_changed)
+    fixed_scale_property: FloatProperty(name="Noise Scale", default=1, min=0, max=20, update=settings_changed)
     attempts_property: IntProperty(name="Attempts", default=5, min=1, max=100, description="Number of times the script attempts to apply its logic before giving up")
     fix_between_steps_property: bpy.props.BoolProperty(name="Fix Between Steps", default=True)
-    simplify_damage_ratio_property: FloatProperty(name="Simplify Damage Ratio",default=0.5,min=0.05,max=1.0,description="Ratio for mesh decimation to simplify damage (1 = no decimation)")
+    simplify_damage_ratio_property: FloatProperty(name="Simplify Damage Ratio",default=0.5,min=0.05,max=1.0,description="Ratio for mesh decimation to simplify damage (1 = no decimation)", update=settings_changed)
+    use_engine_property: bpy.props.BoolProperty(name="In-Memory Engine", default=True, description="Damage the meshes in memory instead of through modifiers and operators")
+    use_workers_property: bpy.props.BoolProperty(name="Background Workers", default=False, description="Damage the selected objects in parallel on background Blender processes (In-Memory Engine only)")
+    worker_count_property: IntProperty(name="Workers", default=4, min=1, max=64, description="Number of background Blender processes")
+    speculative_seeds_property: IntProperty(name="Speculative Seeds", default=1, min=1, max=64, description="Seeds run at once on the workers for each object, keeping the first watertight result (1 tries one seed at a time)")
+    live_preview_property: bpy.props.BoolProperty(name="Live Preview", default=False, update=settings_changed, description="Re-chip the active object while the settings change, refining to the final resolution when idle")
+    preview_resolution_property: IntProperty(name="Preview Resolution", default=32, min=8, max=4096, description="Resolution of the first, quick preview pass")
+    preview_idle_property: FloatProperty(name="Refine After (s)", default=1.0, min=0.0, max=60.0, description="Idle time before the preview is refined to the final resolution")
+    band_mode_property: bpy.props.EnumProperty(
+        name="Chip Only",
+        items=[
+            ('NONE', "Whole Surface", "Chip the whole surface"),
+            ('ANGLE', "Sharp Edges", "Chip a band around the edges sharper than the band angle"),
+            ('GROUP', "Vertex Group", "Chip a band around the vertices of a vertex group"),
+        ],
+        default='NONE',
+        update=settings_changed,
+        description="Limits the chipping to a band, flat faces away from it are kept as they are (In-Memory Engine only)")
+    band_angle_property: FloatProperty(name="Band Angle", default=0.5236, min=0.0, max=3.1416, subtype='ANGLE', update=settings_changed, description="Edges whose faces meet at more than this angle are chipped")
+    band_width_property: FloatProperty(name="Band Width", default=0.1, min=0.01, max=10.0, update=settings_changed, description="Width of the chipped band, relative to the object size")
+    band_group_property: bpy.props.StringProperty(name="Band Group", default="", update=settings_changed, description="Vertex group the chipped band is built around")
+    variant_count_property: IntProperty(name="Variants", default=10, min=1, max=100, description="Number of differently seeded variants made for each object (and preset)")
+    variant_presets_property: bpy.props.EnumProperty(
+        name="Variant Presets",
+        items=[(preset_key, label, "Make variants with the " + label + " preset") for preset_key, (label, settings) in PRESETS.items()],
+        options={'ENUM_FLAG'},
+        description="Presets to make variants with, the current settings if none")
+    variant_objects_property: bpy.props.BoolProperty(name="Variant Objects", default=True, description="Also lay the variants out as objects in a new collection")
+    voxel_budget_property: IntProperty(name="Voxel Budget (M)", default=256, min=1, max=65536, description="Millions of remesh voxels a single object may use")
+    memory_budget_property: IntProperty(name="Memory Budget (MB)", default=4096, min=64, max=1048576, description="Estimated peak memory a single object may use")
+    over_budget_property: bpy.props.EnumProperty(
+        name="Over Budget",
+        items=[
+            ('TILE', "Tile", "Damage the object in tiles of bounded size (In-Memory Engine only, lowers the resolution otherwise)"),
+            ('CLAMP', "Lower Resolution", "Lower the resolution until the object fits the budget"),
+            ('WARN', "Warn", "Only report it, and damage the object anyway"),
+        ],
+        default='TILE',
+        description="What to do with objects whose damage would exceed the budget")
+    intersect_mode_property: bpy.props.EnumProperty(
+        name="Intersect",
+        items=[
+            ('BOOLEAN', "Boolean", "Intersect the damaged mesh with the original through a boolean"),
+            ('CLAMP', "Clamp", "Move the damaged vertices outside of the original onto its surface, always manifold (In-Memory Engine only). The inside test is on arrays, then each vertex outside costs a nearest point query: cheap when the damage pushes inwards, slower than the boolean when most of it pushes out"),
+        ],
+        default='BOOLEAN',
+        update=settings_changed,
+        description="How the damaged surface is kept inside the original volume")
+    cache_size_property: IntProperty(name="Cache Size (MB)", default=512, min=0, max=65536, description="Memory kept for remeshed and smoothed meshes, reused when only seed, noise or decimation change")
+    undo_mode_property: bpy.props.EnumProperty(
+        name="Undo",
+        items=[
+            ('FULL', "Blender Undo", "Every batch is a Blender undo step, holding a copy of the meshes it changed"),
+            ('JOURNAL', "Journal", "Batches only record their mesh swaps, undone with Undo Damage Batch"),
+        ],
+        default='FULL',
+        description="How the Apply Damage, Remove Damage and Clear Stash batches are undone")
+    journal_batches_property: IntProperty(name="Journal Batches", default=10, min=1, max=100, description="Number of batches the journal can undo")
+    resident_stash_property: IntProperty(name="Resident Stash", default=0, min=0, max=100000, description="Stashed and held meshes kept in memory, the least recently used of the others are moved to disk (0 keeps them all)")
 
 
 class WeatheringPanel(Panel):
@@ -53,6 +114,13 @@ class WeatheringPanel(Panel):
         curr_column.prop(scene_pointer, "fixed_scale_check_property")
         curr_column.prop(scene_pointer, "fixed_scale_property")
 
+        # Live Preview
+        curr_column.separator()
+        curr_column.prop(scene_pointer, "live_preview_property")
+        if scene_pointer.live_preview_property:
+            curr_column.prop(scene_pointer, "preview_resolution_property")
+            curr_column.prop(scene_pointer, "preview_idle_property")
+
         # Attempts and Simplify Damage Ratio
         curr_column.separator()
         curr_column.prop(scene_pointer, "attempts_property")
@@ -62,17 +130,72 @@ class WeatheringPanel(Panel):
         curr_column.separator()
         curr_column.prop(scene_pointer, "fix_between_steps_property")
 
+        # Edge band
+        curr_column.separator()
+        curr_column.prop(scene_pointer, "band_mode_property")
+        if scene_pointer.band_mode_property == 'ANGLE':
+            curr_column.prop(scene_pointer, "band_angle_property")
+        elif scene_pointer.band_mode_property == 'GROUP' and context.active_object is not None:
+            curr_column.prop_search(scene_pointer, "band_group_property", context.active_object, "vertex_groups")
+        if scene_pointer.band_mode_property != 'NONE':
+            curr_column.prop(scene_pointer, "band_width_property")
+        curr_column.prop(scene_pointer, "use_engine_property")
+        curr_column.prop(scene_pointer, "intersect_mode_property")
+        curr_column.prop(scene_pointer, "use_workers_property")
+        curr_column.prop(scene_pointer, "worker_count_property")
+        curr_column.prop(scene_pointer, "speculative_seeds_property")
+        curr_column.prop(scene_pointer, "cache_size_property")
+        curr_column.prop(scene_pointer, "voxel_budget_property")
+        curr_column.prop(scene_pointer, "memory_budget_property")
+        curr_column.prop(scene_pointer, "over_budget_property")
+        curr_column.operator("lazychip.op_clearcache")
+
         # Operators with increased scale
         curr_column.separator()
         operator_column = layout.column(align=True)
         operator_column.scale_y = 1.5
-        operator_column.operator("lazychip.op_removedamage")
-        operator_column.operator("lazychip.op_applydamage")
-        operator_column.operator("lazychip.op_clearstash")
+        # Journal undo mode has its own versions, without the undo step
+        suffix = "_journal" if scene_pointer.undo_mode_property == 'JOURNAL' else ""
+        operator_column.operator("lazychip.op_removedamage" + suffix)
+        operator_column.operator("lazychip.op_applydamage" + suffix)
+        operator_column.operator("lazychip.op_clearstash" + suffix)
+
+        # Undo and stash memory
+        undo_column = layout.column(align=True)
+        undo_column.prop(scene_pointer, "undo_mode_property")
+        if scene_pointer.undo_mode_property == 'JOURNAL':
+            undo_column.prop(scene_pointer, "journal_batches_property")
+            undo_column.operator("lazychip.op_undobatch")
+        undo_column.prop(scene_pointer, "resident_stash_property")
+
+        # Variant sweep
+        variant_column = layout.column(align=True)
+        variant_column.prop(scene_pointer, "variant_count_property")
+        variant_column.prop(scene_pointer, "variant_presets_property")
+        variant_column.prop(scene_pointer, "variant_objects_property")
+        variant_column.operator("lazychip.op_variants")
+
+        # Whole file stash operations
+        stash_column = layout.column(align=True)
+        stash_column.label(text="All objects in the file:")
+        stash_row = stash_column.row(align=True)
+        stash_row.operator("lazychip.op_restoreall")
+        stash_row.operator("lazychip.op_clearallstash")
+        stash_column.operator("lazychip.op_collectorphans")
 
         curr_column.separator()
         curr_column.operator("lazychip.op_fixmanifold")
 
+        # Stage timings of the runs so far
+        curr_column.separator()
+        curr_column.label(text="Timings (total / count / p50 / p90 / p99):")
+        for stage_name, stage in profiler.statistics.items():
+            curr_column.label(text="%s: %.2fs / %d / %.3f / %.3f / %.3f" % (
+                stage_name, stage["total"], stage["count"], stage["p50"], stage["p90"], stage["p99"]))
+        timing_row = curr_column.row(align=True)
+        timing_row.operator("lazychip.op_exporttrace")
+        timing_row.operator("lazychip.op_cleartimings")
+
         # Selected Objects
         curr_column.separator()
         curr_column.label(text="Selected objects: " + str(
@@ -0,0 +1,126 @@
+import bpy
+import random
+from bpy.types import Operator
+from .engine import DamageParameters, damage_mesh, intersect_in_memory, band_group_weights
+from .cache import BaseMeshCache
+from .budget import plan_job
+from .stash import original_mesh_of
+from .mesh_operators import manifold_report
+from .preset_operators import PRESETS
+from .profiling import profiler
+
+# Variant sweep: many differently seeded damages of the same meshes.
+# Remesh and smooth do not depend on the seed, so they are computed once per
+# object and settings (through a cache private to the sweep), and only the
+# displacement, decimation and boolean run for every variant.
+
+# Room for the base meshes of one sweep, freed when it ends
+SWEEP_CACHE_BYTES = 4 * 1024 * 1024 * 1024
+
+
+def preset_params(weathering_props, preset_key=None):
+    """
+    Damage settings of the scene (the defaults without one), with the values
+    of the preset if given.
+    """
+    params = DamageParameters() if weathering_props is None else DamageParameters.from_props(weathering_props)
+    if preset_key is not None:
+        for property_name, value in PRESETS[preset_key][1].items():
+            attribute = property_name[:-len("_property")]
+            if hasattr(params, attribute):
+                setattr(params, attribute, value)
+    return params
+
+
+def damage_until_watertight(context, current_object, params, name, cache, weights, attempts):
+    """
+    Damaged and intersected copy of the object mesh, re-seeded until it is
+    watertight or out of attempts. Returns the mesh and the attempts used.
+    """
+    for attempt in range(attempts):
+        chipped_mesh = damage_mesh(current_object.data, current_object.matrix_basis, params, name,
+                                   cache=cache, weights=weights)
+        if params.intersect_mode == 'BOOLEAN':
+            chipped_mesh = intersect_in_memory(context, current_object, chipped_mesh)
+        if manifold_report(chipped_mesh).is_watertight or attempt == attempts - 1:
+            return chipped_mesh, attempt + 1
+        bpy.data.meshes.remove(chipped_mesh)
+        params.seed = random.randint(0, 999999)
+
+
+def variant_seeds(weathering_props, count):
+    if weathering_props.random_seed_property:
+        return [random.randint(0, 999999) for _ in range(count)]
+    return [(weathering_props.seed_property + index) % 1000000 for index in range(count)]
+
+
+class LAZYCHIP_OP_variants(Operator):
+    bl_label = "Make Variants"
+    bl_idname = "lazychip.op_variants"
+    bl_description = "Makes a number of differently seeded damaged copies of each selected object, as separate meshes"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def make_collection(self, context, current_object):
+        collection = bpy.data.collections.new(current_object.name + " Variants")
+        context.scene.collection.children.link(collection)
+        return collection
+
+    def execute(self, context):
+        bpy.ops.object.mode_set(mode='OBJECT')
+        weathering_props = context.scene.weathering_props
+        if weathering_props.live_preview_property:
+            weathering_props.live_preview_property = False
+
+        all_meshes = [
+            curr_object for curr_object in context.selected_objects if curr_object.type == 'MESH']
+        preset_keys = sorted(weathering_props.variant_presets_property, key=list(PRESETS).index) or [None]
+        count = weathering_props.variant_count_property
+        cache = BaseMeshCache(SWEEP_CACHE_BYTES)
+        window_manager = context.window_manager
+        window_manager.progress_begin(0, len(all_meshes) * len(preset_keys) * count)
+        done = 0
+
+        for current_object in all_meshes:
+            # Damaging the original, even if the object shows a damaged mesh
+            shown_mesh = current_object.data
+            current_object.data = original_mesh_of(shown_mesh) or shown_mesh
+            collection = self.make_collection(context, current_object) if weathering_props.variant_objects_property else None
+            weights = band_group_weights(current_object, weathering_props)
+            try:
+                for row, preset_key in enumerate(preset_keys):
+                    params, message = plan_job(current_object.dimensions, preset_params(weathering_props, preset_key),
+                                               weathering_props)
+                    if message is not None:
+                        self.report({'WARNING'}, current_object.name + " " + message)
+                    suffix = "_" + preset_key if preset_key is not None else ""
+                    for index, seed in enumerate(variant_seeds(weathering_props, count)):
+                        params.seed = seed
+                        name = "%s%s_variant_%02d" % (current_object.data.name, suffix, index + 1)
+                        with profiler.span("variant", current_object.name):
+                            variant_mesh, attempts = damage_until_watertight(
+                                context, current_object, params, name, cache, weights,
+                                weathering_props.attempts_property)
+                        variant_mesh.use_fake_user = True
+                        if collection is not None:
+                            variant_object = bpy.data.objects.new(variant_mesh.name, variant_mesh)
+                            # Laid out in a grid next to the object, one row per preset
+                            variant_object.matrix_world = current_object.matrix_world
+                            variant_object.location.x += current_object.dimensions.x * 1.2 * (index + 1)
+                            variant_object.location.y += current_object.dimensions.y * 1.2 * row
+                            collection.objects.link(variant_object)
+                        done += 1
+                        window_manager.progress_update(done)
+            finally:
+                current_object.data = shown_mesh
+
+        window_manager.progress_end()
+        cache.clear()
+        self.report({'INFO'}, "Made " + str(done) + " variants")
+        return {'FINISHED'}
+
+
+def register():
+    bpy.utils.register_class(LAZYCHIP_OP_variants)
+
+def unregister():
+    bpy.utils.unregister_class(LAZYCHIP_OP_variants)
@@ -0,0 +1,79 @@
+# Lazy Chip background worker.
+# Started by WorkerPool as "blender -b -P worker.py": reads job file paths from
+# stdin, damages the arrays stored in each of them with the in-memory engine
+# and writes the result next to the job.
+
+import os
+import sys
+import json
+import importlib
+import traceback
+import numpy as np
+import bpy
+
+# Importing the engine through the add-on package, whatever its folder name
+package_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(package_dir))
+engine = importlib.import_module(os.path.basename(package_dir) + ".engine")
+profiling = importlib.import_module(os.path.basename(package_dir) + ".profiling")
+mesh_operators = importlib.import_module(os.path.basename(package_dir) + ".mesh_operators")
+
+
+def watertight_after_boolean(source_verts, source_tris, verts, faces, params):
+    """
+    Runs the intersection the add-on will run on the result, on a throwaway
+    copy of the source, and checks that it is watertight.
+    """
+    if params.intersect_mode == 'CLAMP':
+        # Already clamped, the add-on takes the result as it is
+        chipped_mesh = engine.arrays_to_mesh("LazyChip_chipped", verts, faces)
+        with profiling.profiler.span("watertight check"):
+            watertight = mesh_operators.manifold_report(chipped_mesh).is_watertight
+        bpy.data.meshes.remove(chipped_mesh)
+        return watertight
+    source_mesh = engine.arrays_to_mesh("LazyChip_source", source_verts, source_tris)
+    source_object = bpy.data.objects.new("LazyChip_source", source_mesh)
+    bpy.context.scene.collection.objects.link(source_object)
+    try:
+        with profiling.profiler.span("watertight check"):
+            result_mesh = engine.intersect_in_memory(
+                bpy.context, source_object, engine.arrays_to_mesh("LazyChip_chipped", verts, faces))
+            watertight = mesh_operators.manifold_report(result_mesh).is_watertight
+        bpy.data.meshes.remove(result_mesh)
+    finally:
+        bpy.data.objects.remove(source_object, do_unlink=True)
+        bpy.data.meshes.remove(source_mesh)
+    return watertight
+
+
+def run_job(job_path):
+    with np.load(job_path) as job:
+        source_verts = job["verts"]
+        source_tris = job["tris"]
+        params = engine.DamageParameters.from_dict(json.loads(str(job["params"])))
+        weights = job["weights"] if "weights" in job else None
+        check = "check" in job
+    profiling.profiler.clear()
+    arrays = {}
+    with profiling.profiler.span("worker job"):
+        verts, faces = engine.damage_arrays(source_verts, source_tris, params, weights=weights)
+        if check:
+            arrays["watertight"] = watertight_after_boolean(source_verts, source_tris, verts, faces, params)
+    np.savez(job_path.replace(".npz", "_result.npz"), verts=verts, faces=faces,
+             events=json.dumps(profiling.profiler.events), **arrays)
+
+
+def main():
+    for line in sys.stdin:
+        job_path = line.strip()
+        if not job_path:
+            break
+        try:
+            run_job(job_path)
+            print("LAZYCHIP DONE", job_path, flush=True)
+        except Exception:
+            traceback.print_exc()
+            print("LAZYCHIP FAILED", job_path, flush=True)
+
+
+main()
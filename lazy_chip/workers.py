@@ -0,0 +1,248 @@
+import bpy
+import os
+import json
+import queue
+import shutil
+import tempfile
+import threading
+import random
+import subprocess
+import numpy as np
+from .profiling import profiler
+
+# Pool of background Blender processes running the in-memory engine.
+# Each worker is a "blender -b" process reading job files from its stdin and
+# answering on its stdout, so that one startup serves many objects.
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "worker.py")
+MESSAGE_PREFIX = "LAZYCHIP"
+
+
+class WorkerPool:
+    """
+    Runs damage jobs on a number of headless Blender processes.
+    Jobs are submitted with a key, results come back as (key, verts, faces),
+    with verts and faces set to None if the job failed.
+    """
+
+    def __init__(self, worker_count):
+        self.worker_count = max(1, worker_count)
+        self.job_dir = tempfile.mkdtemp(prefix="lazychip_jobs_")
+        self.pending = []
+        self.running = {}
+        self.workers = []
+        self.idle_workers = []
+        self.messages = queue.Queue()
+        self.job_count = 0
+        self.labels = {}
+        self.checked = {}
+
+    def submit(self, key, verts, tris, params, label=None, weights=None, check=False):
+        """
+        Stores the job on disk and queues it. The label names the job in the
+        stage timings, the weights are the band vertex group if any. With
+        check, the worker also tells whether the result is watertight once
+        intersected with the source (see passed_check).
+        """
+        self.job_count += 1
+        job_path = os.path.join(self.job_dir, "job_%06d.npz" % self.job_count)
+        arrays = {} if weights is None else {"weights": weights}
+        if check:
+            arrays["check"] = True
+        np.savez(job_path, verts=verts, tris=tris, params=json.dumps(params.to_dict()), **arrays)
+        self.labels[job_path] = label
+        self.pending.append((key, job_path))
+
+    def _start_worker(self):
+        command = [bpy.app.binary_path, "-b", "--factory-startup", "-noaudio",
+                   "--python-exit-code", "1", "-P", WORKER_SCRIPT]
+        log_path = os.path.join(self.job_dir, "worker_%02d.log" % len(self.workers))
+        with open(log_path, "a") as log_file:
+            process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                       stderr=log_file, text=True, bufsize=1)
+        self.workers.append(process)
+        self.idle_workers.append(process)
+        threading.Thread(target=self._read_messages, args=(process,), daemon=True).start()
+
+    def _read_messages(self, process):
+        for line in process.stdout:
+            if line.startswith(MESSAGE_PREFIX):
+                self.messages.put((process, line.split()[1:]))
+        self.messages.put((process, ["EXIT"]))
+
+    def _dispatch(self):
+        while len(self.pending) > len(self.idle_workers) and len(self.workers) < self.worker_count:
+            self._start_worker()
+        while self.pending and self.idle_workers:
+            process = self.idle_workers.pop()
+            key, job_path = self.pending.pop(0)
+            self.running[process] = (key, job_path)
+            process.stdin.write(job_path + "\n")
+            process.stdin.flush()
+
+    def _collect(self, key, job_path, succeeded):
+        if not succeeded:
+            return None, None
+        with np.load(job_path.replace(".npz", "_result.npz")) as result:
+            events = json.loads(str(result["events"]))
+            for event in events:
+                event["object"] = event["object"] or self.labels.get(job_path)
+            profiler.merge(events)
+            if "watertight" in result:
+                self.checked[key] = bool(result["watertight"])
+            return result["verts"], result["faces"]
+
+    def passed_check(self, key):
+        """
+        True if the checked job came back watertight, forgetting the answer.
+        """
+        return self.checked.pop(key, False)
+
+    def labels_in_flight(self):
+        return [self.labels.get(job_path) for key, job_path in list(self.running.values()) + self.pending]
+
+    def _forget(self, process):
+        if process in self.workers:
+            self.workers.remove(process)
+        if process in self.idle_workers:
+            self.idle_workers.remove(process)
+
+    def results(self, timeout=None):
+        """
+        Yields (key, verts, faces) as the jobs finish, in completion order.
+        If a timeout is given, None is yielded every time it expires, so that
+        the caller can report progress while waiting.
+        """
+        self._dispatch()
+        while self.running:
+            try:
+                process, message = self.messages.get(timeout=timeout)
+            except queue.Empty:
+                yield None
+                continue
+            if message[0] == "EXIT":
+                # The worker died, replacing it if there is more work
+                self._forget(process)
+                if process in self.running:
+                    key, job_path = self.running.pop(process)
+                    yield (key,) + self._collect(key, job_path, False)
+            elif process in self.running:
+                key, job_path = self.running.pop(process)
+                self.idle_workers.append(process)
+                yield (key,) + self._collect(key, job_path, message[0] == "DONE")
+            self._dispatch()
+
+    def cancel(self, keys=None):
+        """
+        Drops the given jobs (all of them if no keys are given), killing the
+        workers currently running them.
+        """
+        self.pending = [job for job in self.pending if keys is not None and job[0] not in keys]
+        for process, (key, job_path) in list(self.running.items()):
+            if keys is None or key in keys:
+                del self.running[process]
+                process.kill()
+                self._forget(process)
+
+    def close(self):
+        self.cancel()
+        for process in self.workers:
+            try:
+                process.stdin.close()
+                process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                process.kill()
+        self.workers = []
+        self.idle_workers = []
+        shutil.rmtree(self.job_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class SeedAttempts:
+    """
+    The seeds of one job raced by a SeedRace.
+    """
+
+    def __init__(self, verts, tris, params, label, weights):
+        self.verts = verts
+        self.tris = tris
+        self.params = params
+        self.label = label
+        self.weights = weights
+        self.launched = 0
+        self.running = set()
+        self.fallback = None
+
+
+class SeedRace:
+    """
+    Runs every job with several seeds at once on a worker pool and keeps the
+    first result that is watertight once intersected, cancelling the other
+    seeds of the job. Up to width seeds run at the same time, a new one
+    replacing each failed one until the attempts are used up; if none passes,
+    the last result is returned. Same interface as the pool.
+    """
+
+    def __init__(self, pool, width, attempts):
+        self.pool = pool
+        self.width = max(1, width)
+        self.attempts = max(1, attempts)
+        self.races = {}
+
+    def submit(self, key, verts, tris, params, label=None, weights=None):
+        self.races[key] = SeedAttempts(verts, tris, params, label, weights)
+        self._launch(key)
+
+    def _launch(self, key):
+        race = self.races[key]
+        while len(race.running) < self.width and race.launched < self.attempts:
+            params = type(race.params).from_dict(race.params.to_dict())
+            if race.launched:
+                params.seed = random.randint(0, 999999)
+            seed_key = (key, race.launched)
+            self.pool.submit(seed_key, race.verts, race.tris, params, label=race.label,
+                             weights=race.weights, check=True)
+            race.running.add(seed_key)
+            race.launched += 1
+
+    def results(self, timeout=None):
+        """
+        Yields (key, verts, faces) once per job, as the pool does.
+        """
+        for result in self.pool.results(timeout):
+            if result is None:
+                yield None
+                continue
+            seed_key, verts, faces = result
+            key = seed_key[0]
+            race = self.races.get(key)
+            if race is None or seed_key not in race.running:
+                continue
+            race.running.discard(seed_key)
+            watertight = self.pool.passed_check(seed_key)
+            if verts is not None:
+                race.fallback = (verts, faces)
+            if watertight or (not race.running and race.launched >= self.attempts):
+                self.pool.cancel(race.running)
+                del self.races[key]
+                yield (key,) + (race.fallback or (None, None))
+            else:
+                self._launch(key)
+
+    def labels_in_flight(self):
+        return [race.label for race in self.races.values()]
+
+    def close(self):
+        self.races = {}
+        self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
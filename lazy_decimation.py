@@ -1,10 +1,16 @@
 import bpy
 from bpy.types import Operator, Panel, PropertyGroup
-from bpy.props import IntProperty, FloatProperty, PointerProperty, BoolProperty
+from bpy.props import IntProperty, FloatProperty, PointerProperty, BoolProperty, EnumProperty
 import math
 import bmesh
+import numpy as np
 from mathutils.bvhtree import BVHTree
-from mathutils import Vector
+
+try:
+    # Cached manifold diagnostics of Lazy Chip, used when that add-on is installed
+    from lazy_chip.mesh_operators import object_diagnostics
+except ImportError:
+    object_diagnostics = None
 
 bl_info = {
     "name": "Smart Decimation",
@@ -19,59 +25,595 @@ bl_info = {
 }
 
 
+# Triangle pairs tested at once by the exact intersection test
+INTERSECTION_BATCH = 1 << 15
+
+
+# Reads the vertex positions and the triangulation of the mesh (object mode data),
+# with the face each triangle comes from.
+def mesh_triangles(mesh):
+    mesh.calc_loop_triangles()
+    verts = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", verts)
+    tris = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int64)
+    mesh.loop_triangles.foreach_get("vertices", tris)
+    tri_faces = np.empty(len(mesh.loop_triangles), dtype=np.int64)
+    mesh.loop_triangles.foreach_get("polygon_index", tri_faces)
+    return verts.reshape(-1, 3).astype(np.float64), tris.reshape(-1, 3), tri_faces
+
+
+# Exact intersection test of triangle pairs, given as two (N, 3, 3) arrays.
+# Separating axes: the two normals, the nine edge-edge cross products and the
+# in-plane edge normals of both triangles (needed for coplanar pairs).
+# Triangles only touching within the tolerance are not intersecting, coplanar
+# triangles are if they overlap.
+def triangles_intersect(a, b, tolerance):
+    edges_a = np.roll(a, -1, axis=1) - a
+    edges_b = np.roll(b, -1, axis=1) - b
+    normal_a = np.cross(edges_a[:, 0], edges_a[:, 1])
+    normal_b = np.cross(edges_b[:, 0], edges_b[:, 1])
+    axes = np.concatenate([
+        normal_a[:, None],
+        normal_b[:, None],
+        np.cross(edges_a[:, :, None], edges_b[:, None, :]).reshape(-1, 9, 3),
+        np.cross(normal_a[:, None], edges_a),
+        np.cross(normal_b[:, None], edges_b),
+    ], axis=1)
+    projected_a = np.einsum("nkd,nvd->nkv", axes, a)
+    projected_b = np.einsum("nkd,nvd->nkv", axes, b)
+    lengths = np.linalg.norm(axes, axis=2)
+    gap = tolerance * lengths
+    separated = ((projected_a.max(axis=2) <= projected_b.min(axis=2) + gap)
+                 | (projected_b.max(axis=2) <= projected_a.min(axis=2) + gap))
+    coplanar = np.ptp(np.concatenate([projected_a[:, 0], projected_b[:, 0]], axis=1), axis=1) <= gap[:, 0]
+    # Coplanar pairs only have the in-plane axes, the others are all along the normal
+    separated[:, :11] &= ~coplanar[:, None]
+    # Parallel edges and degenerate triangles give no axis
+    separated &= lengths > tolerance * tolerance
+    return ~separated.any(axis=1)
+
+
+# Finds the faces that really cross another part of the mesh.
+# The BVH gives the candidate triangle pairs, the pairs of triangles sharing a
+# vertex (same face or neighbours) are dropped and the rest go through the
+# exact test in batches. Returns the sorted face indices.
+def self_intersecting_faces(mesh, tolerance=1e-6):
+    verts, tris, tri_faces = mesh_triangles(mesh)
+    if len(tris) == 0:
+        return np.empty(0, dtype=np.int64)
+    bvh = BVHTree.FromPolygons(verts.tolist(), tris.tolist(), all_triangles=True)
+    pairs = np.array(bvh.overlap(bvh), dtype=np.int64).reshape(-1, 2)
+    pairs = pairs[pairs[:, 0] < pairs[:, 1]]
+    shared = (tris[pairs[:, 0], :, None] == tris[pairs[:, 1], None, :]).any(axis=(1, 2))
+    pairs = pairs[~shared]
+
+    # The tolerance is relative to the size of the mesh
+    tolerance *= float(np.linalg.norm(verts.max(axis=0) - verts.min(axis=0)))
+    hits = []
+    for start in range(0, len(pairs), INTERSECTION_BATCH):
+        batch = pairs[start:start + INTERSECTION_BATCH]
+        crossing = triangles_intersect(verts[tris[batch[:, 0]]], verts[tris[batch[:, 1]]], tolerance)
+        hits.append(batch[crossing])
+    if not hits:
+        return np.empty(0, dtype=np.int64)
+    return np.unique(tri_faces[np.concatenate(hits)])
+
+
+# Quadric error decimation.
+# Edge collapses ordered by the quadric error (Garland and Heckbert), done in
+# rounds on the mesh arrays: every round collapses together the edges that are
+# the cheapest of their neighbourhood, so that no two collapses share a
+# triangle. Collapses that would make the mesh non-manifold or flip a face are
+# refused, and the vertices of boundary or non-manifold edges never move: a
+# watertight mesh stays watertight.
+
+# Lowest cosine between the normal of a face before and after a collapse
+MIN_NORMAL_DOT = 0.2
+# Passes looking for more independent edges in each round
+INDEPENDENT_PASSES = 4
+
+
+# Unique edges of a triangle array, with their keys and number of faces.
+def triangle_edges(tris, vertex_count):
+    pairs = np.sort(tris[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    keys, face_counts = np.unique(pairs[:, 0] * vertex_count + pairs[:, 1], return_counts=True)
+    return np.stack([keys // vertex_count, keys % vertex_count], axis=1), keys, face_counts
+
+
+# Neighbours of every vertex in compressed rows: those of vertex v are
+# neighbours[starts[v]:starts[v + 1]], edge_of gives the edge of each entry.
+def neighbour_lists(edges, vertex_count):
+    sources = np.concatenate([edges[:, 0], edges[:, 1]])
+    targets = np.concatenate([edges[:, 1], edges[:, 0]])
+    order = np.argsort(sources, kind="stable")
+    starts = np.zeros(vertex_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=vertex_count), out=starts[1:])
+    return starts, targets[order], order % len(edges)
+
+
+# Neighbours of the given vertices, as (index in vertices, neighbour) pairs.
+def gather_neighbours(starts, neighbours, vertices):
+    counts = starts[vertices + 1] - starts[vertices]
+    segments = np.repeat(np.arange(len(vertices)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return segments, neighbours[np.repeat(starts[vertices], counts) + offsets]
+
+
+# Minimum per vertex of values given per neighbour entry.
+def vertex_minimum(starts, values, fill):
+    result = np.full(len(starts) - 1, fill, dtype=values.dtype)
+    nonempty = starts[1:] > starts[:-1]
+    if nonempty.any():
+        result[nonempty] = np.minimum.reduceat(values, starts[:-1][nonempty])
+    return result
+
+
+# Sum of the squared distance quadrics of the faces around each vertex.
+def vertex_quadrics(verts, tris):
+    normals = np.cross(verts[tris[:, 1]] - verts[tris[:, 0]], verts[tris[:, 2]] - verts[tris[:, 0]])
+    normals /= np.maximum(np.linalg.norm(normals, axis=1), 1e-30)[:, None]
+    planes = np.concatenate([normals, -(normals * verts[tris[:, 0]]).sum(axis=1)[:, None]], axis=1)
+    face_quadrics = (planes[:, :, None] * planes[:, None, :]).reshape(-1, 16)
+    corners = tris.ravel()
+    quadrics = np.empty((len(verts), 16))
+    for entry in range(16):
+        quadrics[:, entry] = np.bincount(corners, weights=np.repeat(face_quadrics[:, entry], 3), minlength=len(verts))
+    return quadrics.reshape(-1, 4, 4)
+
+
+def quadric_cost(quadrics, points):
+    homogeneous = np.concatenate([points, np.ones((len(points), 1))], axis=1)
+    return np.einsum("ni,nij,nj->n", homogeneous, quadrics, homogeneous)
+
+
+# Where each edge would collapse to and at what cost: the optimum of the summed
+# quadric if it is well defined and near the edge, else the best of the two
+# ends and the midpoint.
+def collapse_targets(quadrics, verts, edges):
+    edge_quadrics = quadrics[edges[:, 0]] + quadrics[edges[:, 1]]
+    start, end = verts[edges[:, 0]], verts[edges[:, 1]]
+    middle = (start + end) / 2
+    optimal = middle.copy()
+    solvable = np.abs(np.linalg.det(edge_quadrics[:, :3, :3])) > 1e-10
+    if solvable.any():
+        optimal[solvable] = np.linalg.solve(edge_quadrics[solvable, :3, :3], -edge_quadrics[solvable, :3, 3:])[:, :, 0]
+    far = np.linalg.norm(optimal - middle, axis=1) > np.linalg.norm(end - start, axis=1)
+    optimal[far] = middle[far]
+
+    candidates = np.stack([optimal, start, end, middle], axis=1)
+    costs = np.stack([quadric_cost(edge_quadrics, candidates[:, index]) for index in range(4)], axis=1)
+    best = costs.argmin(axis=1)
+    rows = np.arange(len(edges))
+    return candidates[rows, best], np.maximum(costs[rows, best], 0.0)
+
+
+# Candidate edges that are the cheapest within the one-ring of both their
+# ends: no two of them are closer than an edge apart. Each pass drops the
+# candidates near the edges already taken and takes the new local minima, so
+# that a round collapses more than the first minima only.
+def independent_edges(edges, costs, candidate, starts, neighbours, edge_of):
+    order = np.lexsort((costs, ~candidate))
+    ranks = np.empty(len(edges), dtype=np.int64)
+    ranks[order] = np.arange(len(edges))
+    ranks[~candidate] = len(edges)
+    candidate = candidate.copy()
+    selected = []
+    for independent_pass in range(INDEPENDENT_PASSES):
+        lowest = vertex_minimum(starts, ranks[edge_of], len(edges))
+        ring = np.minimum(lowest, vertex_minimum(starts, lowest[neighbours], len(edges)))
+        taken = np.flatnonzero(candidate & (ranks == ring[edges[:, 0]]) & (ranks == ring[edges[:, 1]]))
+        if len(taken) == 0:
+            break
+        selected.append(taken)
+        near = np.zeros(len(starts) - 1, dtype=bool)
+        near[edges[taken].ravel()] = True
+        near[gather_neighbours(starts, neighbours, edges[taken].ravel())[1]] = True
+        candidate &= ~near[edges].any(axis=1)
+        ranks[~candidate] = len(edges)
+    return np.concatenate(selected) if selected else np.empty(0, dtype=np.int64)
+
+
+# Link condition: the ends of each edge share exactly the two opposite
+# vertices, and those keep at least three neighbours after the collapse.
+def collapses_keep_manifold(pairs, starts, neighbours, vertex_count):
+    segments_a, around_a = gather_neighbours(starts, neighbours, pairs[:, 0])
+    segments_b, around_b = gather_neighbours(starts, neighbours, pairs[:, 1])
+    keys = np.sort(np.concatenate([segments_a * vertex_count + around_a, segments_b * vertex_count + around_b]))
+    shared = keys[1:][keys[1:] == keys[:-1]]
+    segments = shared // vertex_count
+    degrees = np.diff(starts)
+    shared_counts = np.bincount(segments, minlength=len(pairs))
+    thin = np.bincount(segments, weights=degrees[shared % vertex_count] <= 3, minlength=len(pairs))
+    return (shared_counts == 2) & (thin == 0)
+
+
+# No face around the collapsed edges turns over or becomes degenerate.
+def collapses_keep_normals(verts, tris, pairs, positions):
+    owners = np.full(len(verts), -1, dtype=np.int64)
+    owners[pairs[:, 0]] = np.arange(len(pairs))
+    owners[pairs[:, 1]] = np.arange(len(pairs))
+    tri_owners = owners[tris]
+    touched = (tri_owners >= 0).any(axis=1)
+    tri_owners = tri_owners[touched]
+    old = verts[tris[touched]]
+    new = old.copy()
+    moved = tri_owners >= 0
+    new[moved] = positions[tri_owners[moved]]
+
+    old_normals = np.cross(old[:, 1] - old[:, 0], old[:, 2] - old[:, 0])
+    new_normals = np.cross(new[:, 1] - new[:, 0], new[:, 2] - new[:, 0])
+    kept = ((old_normals * new_normals).sum(axis=1)
+            > MIN_NORMAL_DOT * np.linalg.norm(old_normals, axis=1) * np.linalg.norm(new_normals, axis=1))
+    # The two faces of the edge itself disappear
+    kept |= moved.sum(axis=1) == 2
+    return np.bincount(tri_owners.max(axis=1)[~kept], minlength=len(pairs)) == 0
+
+
+# Decimates a triangle mesh given as arrays in a single pass through a list of
+# decreasing face counts, yielding the vertices, triangles and tri_data as
+# each is reached. Collapses moving the surface more than max_error are not
+# done: when none is left, the pass ends early. tri_data (one row per
+# triangle, e.g. the material index) follows the kept triangles.
+# The edges, their collapse targets and the refused ones are kept from round
+# to round and only updated around the collapses. The vertices of boundary and
+# non-manifold edges are found once: they never move, and the collapses keep
+# the rest of the mesh manifold.
+def quadric_levels(verts, tris, targets, max_error=None, tri_data=None):
+    verts = np.array(verts, dtype=np.float64)
+    tris = np.array(tris, dtype=np.int64).reshape(-1, 3)
+    vertex_count = len(verts)
+    quadrics = vertex_quadrics(verts, tris)
+    max_cost = np.inf if max_error is None else max_error * max_error
+    edges, keys, face_counts = triangle_edges(tris, vertex_count)
+    locked = np.zeros(vertex_count, dtype=bool)
+    locked[edges[face_counts != 2].ravel()] = True
+    positions, costs = collapse_targets(quadrics, verts, edges)
+    blocked = np.zeros(len(edges), dtype=bool)
+    exhausted = False
+
+    for target_faces in targets:
+        while len(tris) > max(target_faces, 4):
+            candidate = ~locked[edges].any(axis=1) & (costs <= max_cost) & ~blocked
+            if not candidate.any():
+                exhausted = True
+                break
+
+            starts, neighbours, edge_of = neighbour_lists(edges, vertex_count)
+            selected = independent_edges(edges, costs, candidate, starts, neighbours, edge_of)
+            # Two faces less per collapse, no further than the target
+            selected = selected[np.argsort(costs[selected], kind="stable")][:max(1, (len(tris) - target_faces) // 2)]
+            valid = (collapses_keep_manifold(edges[selected], starts, neighbours, vertex_count)
+                     & collapses_keep_normals(verts, tris, edges[selected], positions[selected]))
+            blocked[selected[~valid]] = True
+            selected = selected[valid]
+            if len(selected) == 0:
+                continue
+
+            kept, removed = edges[selected, 0], edges[selected, 1]
+            verts[kept] = positions[selected]
+            quadrics[kept] += quadrics[removed]
+            remap = np.arange(vertex_count)
+            remap[removed] = kept
+            tris = remap[tris]
+            alive = (tris[:, 0] != tris[:, 1]) & (tris[:, 1] != tris[:, 2]) & (tris[:, 2] != tris[:, 0])
+            tris = tris[alive]
+            if tri_data is not None:
+                tri_data = tri_data[alive]
+
+            # Refused edges around the collapses may be fine now
+            changed = np.zeros(vertex_count, dtype=bool)
+            changed[kept] = True
+            changed[gather_neighbours(starts, neighbours, np.concatenate([kept, removed]))[1]] = True
+            blocked &= ~changed[edges].any(axis=1)
+
+            # The edges of the removed vertices go to the kept ones: the
+            # collapsed edges and the duplicates this makes are dropped, and
+            # the targets of all the edges of the kept vertices change
+            edges = remap[edges]
+            touched = np.zeros(vertex_count, dtype=bool)
+            touched[kept] = True
+            touched = touched[edges].any(axis=1)
+            new_edges = np.sort(edges[touched], axis=1)
+            new_edges = new_edges[new_edges[:, 0] != new_edges[:, 1]]
+            new_edges = new_edges[np.unique(new_edges[:, 0] * vertex_count + new_edges[:, 1], return_index=True)[1]]
+            new_positions, new_costs = collapse_targets(quadrics, verts, new_edges)
+            edges = np.concatenate([edges[~touched], new_edges])
+            positions = np.concatenate([positions[~touched], new_positions])
+            costs = np.concatenate([costs[~touched], new_costs])
+            blocked = np.concatenate([blocked[~touched], np.zeros(len(new_edges), dtype=bool)])
+
+        used = np.zeros(vertex_count, dtype=bool)
+        used[tris.ravel()] = True
+        new_indices = np.cumsum(used) - 1
+        yield verts[used], new_indices[tris], tri_data
+        if exhausted:
+            return
+
+
+# Decimates a triangle mesh given as arrays down to target_faces triangles,
+# stopping earlier if a collapse would move the surface more than max_error.
+# Returns the new vertices, triangles and tri_data.
+def quadric_decimate(verts, tris, target_faces=0, max_error=None, tri_data=None):
+    return next(quadric_levels(verts, tris, [target_faces], max_error, tri_data))
+
+
+# Replaces the geometry of the mesh with the given triangles.
+def write_triangles(mesh, verts, tris, materials, smooth):
+    mesh.clear_geometry()
+    mesh.vertices.add(len(verts))
+    mesh.loops.add(len(tris) * 3)
+    mesh.polygons.add(len(tris))
+    mesh.vertices.foreach_set("co", verts.astype(np.float32).ravel())
+    mesh.loops.foreach_set("vertex_index", tris.astype(np.int32).ravel())
+    mesh.polygons.foreach_set("loop_start", np.arange(0, len(tris) * 3, 3, dtype=np.int32))
+    mesh.polygons.foreach_set("material_index", materials.astype(np.int32))
+    mesh.polygons.foreach_set("use_smooth", smooth.astype(bool))
+    mesh.update(calc_edges=True)
+
+
+# Triangles of a mesh with the material index and smooth flag of each.
+def mesh_triangle_data(mesh):
+    verts, tris, tri_faces = mesh_triangles(mesh)
+    materials = np.empty(len(mesh.polygons), dtype=np.int64)
+    mesh.polygons.foreach_get("material_index", materials)
+    smooth = np.empty(len(mesh.polygons), dtype=bool)
+    mesh.polygons.foreach_get("use_smooth", smooth)
+    return verts, tris, np.stack([materials[tri_faces], smooth[tri_faces]], axis=1)
+
+
+# Quadric decimation of an object's mesh (object mode), to a ratio of its
+# triangles, a face count or an error budget. Materials and smooth shading
+# are kept, UVs and other attributes are not.
+def quadric_decimate_object(obj, ratio=None, face_count=None, max_error=None):
+    verts, tris, tri_data = mesh_triangle_data(obj.data)
+    target_faces = 0
+    if ratio is not None:
+        target_faces = int(round(len(tris) * ratio))
+    if face_count is not None:
+        target_faces = max(target_faces, face_count)
+    verts, tris, tri_data = quadric_decimate(verts, tris, target_faces, max_error, tri_data)
+    write_triangles(obj.data, verts, tris, tri_data[:, 0], tri_data[:, 1])
+
+
+# LOD chain of an object (object mode): one new mesh per level, each with
+# level_ratio times the triangles of the previous one, all from a single
+# decimation pass. Returns the meshes, fewer than levels if the mesh could
+# not be decimated that far.
+def quadric_lod_meshes(obj, levels=3, level_ratio=0.5):
+    verts, tris, tri_data = mesh_triangle_data(obj.data)
+    targets = [int(round(len(tris) * level_ratio ** level)) for level in range(1, levels + 1)]
+    meshes = []
+    previous_count = len(tris)
+    for level, (level_verts, level_tris, level_data) in enumerate(quadric_levels(verts, tris, targets, tri_data=tri_data), start=1):
+        # A level no smaller than the previous one is where the pass stopped
+        if len(level_tris) >= previous_count:
+            break
+        previous_count = len(level_tris)
+        mesh = bpy.data.meshes.new(f"{obj.data.name}_LOD{level}")
+        write_triangles(mesh, level_verts, level_tris, level_data[:, 0], level_data[:, 1])
+        for material in obj.data.materials:
+            mesh.materials.append(material)
+        meshes.append(mesh)
+    return meshes
+
+
+# Blender's Decimate only takes a ratio: the ratio meeting a face count or a
+# deviation budget is found by bisection. Every probe is kept, and the next one
+# decimates the nearest finer probe instead of the full mesh.
+
+BISECTION_STEPS = 10
+# Probes closer than this in ratio end the bisection
+RATIO_TOLERANCE = 0.001
+# Source vertices measured by max_deviation, at most: each is a nearest point
+# query, and every bisection probe measures them all
+DEVIATION_SAMPLES = 2000
+
+
+class DecimationProbes:
+    """
+    Decimated versions of the mesh of an object, by ratio of its faces, made
+    through a Decimate modifier on a temporary object.
+    """
+
+    def __init__(self, context, obj):
+        self.context = context
+        self.meshes = {1.0: obj.data}
+        self.probe_object = bpy.data.objects.new(obj.name + "_probe", obj.data)
+        context.scene.collection.objects.link(self.probe_object)
+        self.modifier = self.probe_object.modifiers.new("Decimate", 'DECIMATE')
+
+    def decimated(self, ratio):
+        if ratio not in self.meshes:
+            finer = min(cached for cached in self.meshes if cached >= ratio)
+            self.probe_object.data = self.meshes[finer]
+            self.modifier.ratio = ratio / finer
+            depsgraph = self.context.evaluated_depsgraph_get()
+            self.meshes[ratio] = bpy.data.meshes.new_from_object(self.probe_object.evaluated_get(depsgraph))
+        return self.meshes[ratio]
+
+    def close(self):
+        bpy.data.objects.remove(self.probe_object, do_unlink=True)
+        for ratio, mesh in self.meshes.items():
+            if ratio != 1.0:
+                bpy.data.meshes.remove(mesh)
+        self.meshes = {}
+
+
+def triangle_count(mesh):
+    loop_totals = np.empty(len(mesh.polygons), dtype=np.int64)
+    mesh.polygons.foreach_get("loop_total", loop_totals)
+    return int((loop_totals - 2).sum())
+
+
+# Largest distance from the source vertices (a sample of them) to the surface
+# of the decimated mesh, in the object's local units.
+def max_deviation(source_verts, mesh):
+    verts, tris, tri_faces = mesh_triangles(mesh)
+    if len(tris) == 0:
+        return math.inf
+    bvh = BVHTree.FromPolygons(verts.tolist(), tris.tolist(), all_triangles=True)
+    step = max(1, len(source_verts) // DEVIATION_SAMPLES)
+    return max(bvh.find_nearest(point)[3] for point in source_verts[::step].tolist())
+
+
+# Bisection of the decimation ratio. accept tells if a decimated mesh is good
+# enough. With keep_finest the low ratios are accepted and the highest one is
+# looked for (face count), else the high ones are and the lowest one is looked
+# for (deviation). Starts from the guess, returns the best accepted ratio.
+def bisect_ratio(probes, accept, guess, keep_finest):
+    accepted, refused = (0.0, 1.0) if keep_finest else (1.0, 0.0)
+    ratio = guess
+    for _ in range(BISECTION_STEPS):
+        if not min(accepted, refused) < ratio < max(accepted, refused):
+            ratio = (accepted + refused) / 2
+        if accept(probes.decimated(ratio)):
+            accepted = ratio
+        else:
+            refused = ratio
+        if abs(accepted - refused) < RATIO_TOLERANCE:
+            break
+        ratio = (accepted + refused) / 2
+    return accepted
+
+
+# Decimates the object (object mode) with Blender's Decimate down to the face
+# count or the deviation of the settings. Returns the number of triangles left.
+def decimate_to_target(context, obj, settings):
+    mesh = obj.data
+    if settings.decimate_target == 'FACES':
+        def accept(decimated):
+            return triangle_count(decimated) <= settings.target_face_count
+        guess = settings.target_face_count / max(triangle_count(mesh), 1)
+        keep_finest = True
+        if accept(mesh):
+            return triangle_count(mesh)
+    else:
+        source_verts = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+        mesh.vertices.foreach_get("co", source_verts)
+        source_verts = source_verts.reshape(-1, 3)
+
+        def accept(decimated):
+            return max_deviation(source_verts, decimated) <= settings.max_deviation
+        guess = settings.decimate_ratio
+        keep_finest = False
+
+    probes = DecimationProbes(context, obj)
+    try:
+        ratio = bisect_ratio(probes, accept, guess, keep_finest)
+        # Nothing small enough: the coarsest probe
+        if ratio == 0.0:
+            ratio = min(probes.meshes)
+        if ratio != 1.0:
+            bm = bmesh.new()
+            bm.from_mesh(probes.meshes[ratio])
+            bm.to_mesh(mesh)
+            bm.free()
+            mesh.update()
+    finally:
+        probes.close()
+    return triangle_count(mesh)
+
+
+# Arguments of quadric_decimate_object for the target of the settings.
+def quadric_target(settings):
+    if settings.decimate_target == 'FACES':
+        return {"face_count": settings.target_face_count}
+    if settings.decimate_target == 'ERROR':
+        return {"max_error": settings.max_deviation}
+    return {"ratio": settings.decimate_ratio}
+
+
+# Relaxation.
+# Laplacian smoothing of some of the vertices, as products of the masked
+# rows of the neighbour-average matrix (compressed rows, built once) with the
+# vertex positions. Plain Laplacian shrinks the surface, Taubin follows every
+# step with an inflating one and HC pushes the vertices back towards where
+# they were.
+
+# Pass-band of the Taubin variant, sets the inflating step from the relaxing one
+TAUBIN_PASS_BAND = 0.1
+# Pull towards the original positions and damping of the HC variant
+HC_ALPHA = 0.1
+HC_BETA = 0.6
+
+
+# Relaxes the masked vertices (those with at least an edge) given as arrays.
+# method is 'LAPLACIAN', 'TAUBIN' or 'HC'. Returns the new positions.
+def relax_vertices(verts, edges, mask, iterations=3, relaxation_strength=0.5, method='LAPLACIAN'):
+    verts = np.array(verts, dtype=np.float64)
+    starts, neighbours, edge_of = neighbour_lists(edges, len(verts))
+    rows = np.flatnonzero(mask & (np.diff(starts) > 0))
+    if len(rows) == 0 or relaxation_strength <= 0.0:
+        return verts
+    segments, row_neighbours = gather_neighbours(starts, neighbours, rows)
+    counts = np.bincount(segments, minlength=len(rows))
+    row_starts = np.cumsum(counts) - counts
+
+    def average(values):
+        return np.add.reduceat(values[row_neighbours], row_starts, axis=0) / counts[:, None]
+
+    def smooth(strength):
+        verts[rows] += strength * (average(verts) - verts[rows])
+
+    original = verts[rows]
+    for _ in range(iterations):
+        if method == 'TAUBIN':
+            smooth(relaxation_strength)
+            smooth(1.0 / (TAUBIN_PASS_BAND - 1.0 / relaxation_strength))
+        elif method == 'HC':
+            previous = verts[rows]
+            smooth(relaxation_strength)
+            push = np.zeros_like(verts)
+            push[rows] = verts[rows] - (HC_ALPHA * original + (1.0 - HC_ALPHA) * previous)
+            verts[rows] -= HC_BETA * push[rows] + (1.0 - HC_BETA) * average(push)
+        else:
+            smooth(relaxation_strength)
+    return verts
+
+
 # To solve overlapping edges and faces, applying a relaxation logic.
-def relax_intersecting_faces(obj, iterations=3, relaxation_strength=0.5):
+def relax_intersecting_faces(obj, iterations=3, relaxation_strength=0.5, method='LAPLACIAN'):
     bpy.context.view_layer.objects.active = obj
-    bpy.ops.object.mode_set(mode='EDIT')
-    bm = bmesh.from_edit_mesh(obj.data)
-    bm.verts.ensure_lookup_table()
-    bm.faces.ensure_lookup_table()
-    
-    # Create a BVH tree and find intersecting pairs
-    bvh = BVHTree.FromBMesh(bm)
-    intersecting_pairs = bvh.overlap(bvh)
-    
-    # Extract vertices from intersecting faces
-    vertices_to_relax = set()
-    for pair in intersecting_pairs:
-        face1, face2 = pair
-        for face in [bm.faces[face1], bm.faces[face2]]:
-            for vert in face.verts:
-                vertices_to_relax.add(vert)
-    
-    # Relaxation process
-    for _ in range(iterations):
-        for vert in vertices_to_relax:
-            avg_pos = Vector((0, 0, 0))
-            for edge in vert.link_edges:
-                other_vert = edge.other_vert(vert)
-                avg_pos += other_vert.co
-            avg_pos /= len(vert.link_edges)
-            
-            # Move the vertex towards the average position of connected vertices
-            vert.co = vert.co.lerp(avg_pos, relaxation_strength)
-    
-    bmesh.update_edit_mesh(obj.data)
     bpy.ops.object.mode_set(mode='OBJECT')
+    mesh = obj.data
+
+    # Only the vertices of the faces actually intersecting are relaxed
+    intersecting_faces = self_intersecting_faces(mesh)
+    if len(intersecting_faces) == 0:
+        return
+    verts, tris, tri_faces = mesh_triangles(mesh)
+    vertices_to_relax = np.zeros(len(verts), dtype=bool)
+    vertices_to_relax[tris[np.isin(tri_faces, intersecting_faces)]] = True
+
+    edges = np.empty(len(mesh.edges) * 2, dtype=np.int64)
+    mesh.edges.foreach_get("vertices", edges)
+    verts = relax_vertices(verts, edges.reshape(-1, 2), vertices_to_relax, iterations, relaxation_strength, method)
+    mesh.vertices.foreach_set("co", verts.astype(np.float32).ravel())
+    mesh.update()
 
 
 # Fixing the overlapping edges
 def fix_intersections_and_recalculate_normals(obj):
     bpy.context.view_layer.objects.active = obj
+    bpy.ops.object.mode_set(mode='OBJECT')
+    has_intersections = len(self_intersecting_faces(obj.data)) > 0
     bpy.ops.object.mode_set(mode='EDIT')
     
     # Recalculate outside normals
     bpy.ops.mesh.select_all(action='SELECT')
     bpy.ops.mesh.normals_make_consistent(inside=False)
     
-    # Fix intersecting faces
-    bpy.ops.mesh.intersect_boolean(operation='UNION')
+    # Fix intersecting faces, if any
+    if has_intersections:
+        bpy.ops.mesh.intersect_boolean(operation='UNION')
     
     bpy.ops.object.mode_set(mode='OBJECT')
 
 
 # Checks if something is non-manifold.
 def check_non_manifold(mesh):
+    if object_diagnostics is not None and bpy.context.object is not None and bpy.context.object.data == mesh:
+        return not object_diagnostics(bpy.context.object).is_watertight
     bpy.ops.object.mode_set(mode='EDIT')
     bpy.ops.mesh.select_all(action='DESELECT')
     bpy.ops.mesh.select_non_manifold()
@@ -81,6 +623,9 @@ def check_non_manifold(mesh):
 
 # A basic non-manifold fix. Not resolutive.
 def fix_non_manifold(mesh):
+    # Nothing to fix, known without selecting in edit mode
+    if object_diagnostics is not None and not check_non_manifold(mesh):
+        return
     bpy.ops.object.mode_set(mode='EDIT')
     bpy.ops.mesh.select_all(action='DESELECT')
     bpy.ops.mesh.select_non_manifold()
@@ -89,45 +634,55 @@ def fix_non_manifold(mesh):
     bpy.ops.object.mode_set(mode='OBJECT')
 
 
+# Labels the connected parts of a mesh from its edge array, by union-find:
+# every round hooks the root of the higher end of each edge under the lower
+# one, then the paths are compressed. Returns the root vertex of each vertex.
+def connected_components(edges, vertex_count):
+    parents = np.arange(vertex_count)
+    while True:
+        roots_a, roots_b = parents[edges[:, 0]], parents[edges[:, 1]]
+        apart = roots_a != roots_b
+        if not apart.any():
+            return parents
+        np.minimum.at(parents, np.maximum(roots_a, roots_b)[apart], np.minimum(roots_a, roots_b)[apart])
+        while True:
+            grandparents = parents[parents]
+            if np.array_equal(grandparents, parents):
+                break
+            parents = grandparents
+
+
 # Checks any part of the decimated object that is not connected to the main body 
 # and smaller than a certain threhsold
 def delete_small_islands(obj, threshold=100):
     bpy.context.view_layer.objects.active = obj
-    obj.select_set(True)
-
-    # Make sure we're in object mode
     bpy.ops.object.mode_set(mode='OBJECT')
+    mesh = obj.data
 
-    # Separate by loose parts
-    bpy.ops.mesh.separate(type='LOOSE')
-    bpy.context.view_layer.update()  # Ensure the scene is updated
-
-    # Temporarily store the original object's name to avoid renaming issues
-    original_name = obj.name
-
-    # Collect objects to delete based on face count threshold
-    objects_to_delete = [o for o in bpy.context.selected_objects if len(o.data.polygons) < threshold]
-
-    # Check: if the objects to be deleted are all of them, ending this now.
-    if len(objects_to_delete) < len(bpy.context.selected_objects): 
-
-        # Delete objects
-        for obj_to_delete in objects_to_delete:
-            bpy.data.objects.remove(obj_to_delete, do_unlink=True)
+    edges = np.empty(len(mesh.edges) * 2, dtype=np.int64)
+    mesh.edges.foreach_get("vertices", edges)
+    components = connected_components(edges.reshape(-1, 2), len(mesh.vertices))
 
-        # Re-select the remaining objects for joining
-        for obj in bpy.context.view_layer.objects:
-            if obj.name.startswith(original_name):
-                obj.select_set(True)
-            else:
-                obj.select_set(False)
+    # Faces per part, counted on the first vertex of each face
+    loop_verts = np.empty(len(mesh.loops), dtype=np.int64)
+    mesh.loops.foreach_get("vertex_index", loop_verts)
+    loop_starts = np.empty(len(mesh.polygons), dtype=np.int64)
+    mesh.polygons.foreach_get("loop_start", loop_starts)
+    face_counts = np.bincount(components[loop_verts[loop_starts]], minlength=len(mesh.vertices))
+    small = face_counts[components] < threshold
 
-        # Make sure there's more than one object selected for join operation
-        if len(bpy.context.selected_objects) > 1:
-            bpy.ops.object.join()  # Join the remaining objects
+    # Check: if the parts to be deleted are all of them, ending this now.
+    if small.all() or not small.any():
+        return
 
-    # Rename the joined object to the original name
-    bpy.context.view_layer.objects.active.name = original_name
+    # Deleting the small parts in place, in a single pass
+    bm = bmesh.new()
+    bm.from_mesh(mesh)
+    bm.verts.ensure_lookup_table()
+    bmesh.ops.delete(bm, geom=[bm.verts[index] for index in np.flatnonzero(small)], context='VERTS')
+    bm.to_mesh(mesh)
+    bm.free()
+    mesh.update()
 
 
 # Fixes to be applied to the decimated mesh (or without decimating)
@@ -152,7 +707,7 @@ def fix_mesh(obj, settings):
     # Fix intersecting faces and recalculate normals if enabled
     if settings.fix_intersections:
         fix_intersections_and_recalculate_normals(obj)
-        relax_intersecting_faces(obj)
+        relax_intersecting_faces(obj, method=settings.relax_method)
         delete_small_islands(obj)
 
     # Restore original selection mode and switch back to object mode
@@ -161,6 +716,39 @@ def fix_mesh(obj, settings):
 
 
 class DecimateAndFixSettings(bpy.types.PropertyGroup):
+    decimate_method: EnumProperty(
+        name="Method",
+        description="How the mesh is decimated",
+        items=[
+            ('COLLAPSE', "Collapse", "Blender's Decimate, followed by the fixes"),
+            ('QUADRIC', "Quadric", "Built-in quadric decimation that keeps the mesh manifold, the fixes only run if still needed. UVs are not kept"),
+        ],
+        default='COLLAPSE',
+    )
+    decimate_target: EnumProperty(
+        name="Target",
+        description="What the decimation aims at",
+        items=[
+            ('RATIO', "Ratio", "A ratio of the faces"),
+            ('FACES', "Face Count", "At most this many triangles"),
+            ('ERROR', "Deviation", "As few faces as possible without moving the surface further than this"),
+        ],
+        default='RATIO',
+    )
+    target_face_count: IntProperty(
+        name="Face Count",
+        description="Triangles the decimated mesh may have at most",
+        min=4,
+        default=100000,
+    )
+    max_deviation: FloatProperty(
+        name="Max Deviation",
+        description="How far the decimated surface may move from the original, in local units",
+        min=0.0,
+        default=0.01,
+        precision=4,
+        unit='LENGTH',
+    )
     decimate_ratio: FloatProperty(
         name="Decimate Ratio",
         description="Decimate ratio for the modifier",
@@ -178,6 +766,39 @@ class DecimateAndFixSettings(bpy.types.PropertyGroup):
         description="Automatically fix intersecting faces",
         default=True,
     )
+    relax_method: EnumProperty(
+        name="Relaxation",
+        description="Smoothing of the vertices of intersecting faces",
+        items=[
+            ('LAPLACIAN', "Laplacian", "Moves each vertex towards the average of its neighbours, shrinks the surface"),
+            ('TAUBIN', "Taubin", "Laplacian steps alternated with inflating ones, keeps the volume"),
+            ('HC', "HC", "Laplacian steps corrected towards the original positions, keeps the volume"),
+        ],
+        default='LAPLACIAN',
+    )
+    lod_levels: IntProperty(
+        name="Levels",
+        description="Number of LOD meshes made below the original",
+        min=1,
+        max=8,
+        default=3,
+    )
+    lod_ratio: FloatProperty(
+        name="Level Ratio",
+        description="Faces of each level relative to the previous one",
+        min=0.05,
+        max=0.95,
+        default=0.5,
+    )
+    lod_output: EnumProperty(
+        name="Output",
+        description="How the LOD levels are added to the file",
+        items=[
+            ('OBJECTS', "Objects", "One object per level, in a new collection"),
+            ('MESHES', "Meshes", "Mesh datablocks only (with a fake user)"),
+        ],
+        default='OBJECTS',
+    )
     remesh_before_decimation: BoolProperty(
         name="Remesh Before Decimation",
         description="Apply remeshing before decimation",
@@ -205,6 +826,10 @@ class MESH_OT_decimate_and_fix(Operator):
     def invoke(self, context, event):
         return self.execute(context)
 
+    def check_face_count(self, obj, settings, faces_left):
+        if settings.decimate_target == 'FACES' and faces_left > settings.target_face_count:
+            self.report({'WARNING'}, f"{obj.name}: {faces_left} faces, could not reach {settings.target_face_count}")
+
     def execute(self, context):
 
         original_selection = context.selected_objects.copy()
@@ -237,16 +862,32 @@ class MESH_OT_decimate_and_fix(Operator):
                 bpy.context.object.data.remesh_voxel_size = settings.remesh_value
                 bpy.ops.object.voxel_remesh()
 
-            # Switch to vertex select mode for operations
-            bpy.ops.object.mode_set(mode='EDIT')
-            context.tool_settings.mesh_select_mode = (True, False, False)
+            if settings.decimate_method == 'QUADRIC':
 
-            # Add and apply Decimate modifier
-            bpy.ops.mesh.select_all(action='SELECT')  # Select all geometry
-            bpy.ops.mesh.decimate(ratio=settings.decimate_ratio)
-            
-            # Fix non-manifold geometry if necessary
-            fix_mesh(obj, settings)
+                # Manifold in, manifold out: the fixes are only for what was already there
+                quadric_decimate_object(obj, **quadric_target(settings))
+                self.check_face_count(obj, settings, triangle_count(obj.data))
+                if check_non_manifold(obj.data) or len(self_intersecting_faces(obj.data)) > 0:
+                    fix_mesh(obj, settings)
+
+            elif settings.decimate_target != 'RATIO':
+
+                # Ratio found by bisection, then the fixes as usual
+                self.check_face_count(obj, settings, decimate_to_target(context, obj, settings))
+                fix_mesh(obj, settings)
+
+            else:
+
+                # Switch to vertex select mode for operations
+                bpy.ops.object.mode_set(mode='EDIT')
+                context.tool_settings.mesh_select_mode = (True, False, False)
+
+                # Add and apply Decimate modifier
+                bpy.ops.mesh.select_all(action='SELECT')  # Select all geometry
+                bpy.ops.mesh.decimate(ratio=settings.decimate_ratio)
+                
+                # Fix non-manifold geometry if necessary
+                fix_mesh(obj, settings)
 
             # Restore original selection mode
             context.tool_settings.mesh_select_mode = original_select_mode
@@ -277,6 +918,43 @@ class MESH_OT_set_decimate_ratio(Operator):
         return {'FINISHED'}
     
     
+# LOD Chain operator. Decimated copies of each selected object, one per level.
+class MESH_OT_lod_chain(Operator):
+    bl_idname = "mesh.lod_chain"
+    bl_label = "LOD Chain"
+    bl_description = "Creates decimated copies of the selected objects at decreasing levels of detail, in a single quadric decimation pass per object"
+
+    @classmethod
+    def poll(cls, context):
+        return context.active_object is not None and context.active_object.type == 'MESH'
+
+    def execute(self, context):
+        settings = context.scene.decimate_and_fix_settings
+        bpy.ops.object.mode_set(mode='OBJECT')
+
+        for obj in context.selected_objects:
+            if obj.type != 'MESH':
+                continue
+
+            meshes = quadric_lod_meshes(obj, settings.lod_levels, settings.lod_ratio)
+            if len(meshes) < settings.lod_levels:
+                self.report({'WARNING'}, f"{obj.name}: only {len(meshes)} of {settings.lod_levels} levels, it cannot be decimated further")
+
+            if settings.lod_output == 'OBJECTS':
+                collection = bpy.data.collections.new(f"{obj.name}_LODs")
+                context.scene.collection.children.link(collection)
+                for level, mesh in enumerate(meshes, start=1):
+                    lod_object = bpy.data.objects.new(f"{obj.name}_LOD{level}", mesh)
+                    lod_object.matrix_world = obj.matrix_world.copy()
+                    collection.objects.link(lod_object)
+            else:
+                for mesh in meshes:
+                    mesh.use_fake_user = True
+
+        self.report({'INFO'}, "Finished the LOD chains")
+        return {'FINISHED'}
+
+
 # Just Fix Operator
 class MESH_OT_just_fix(Operator):
     bl_idname = "mesh.just_fix"
@@ -316,21 +994,31 @@ class MESH_PT_decimate_and_fix(Panel):
 
 
         # Decimation ratio and remesh settings
-        layout.prop(settings, "decimate_ratio")
+        layout.prop(settings, "decimate_method")
+        layout.prop(settings, "decimate_target")
+        if settings.decimate_target == 'FACES':
+            layout.prop(settings, "target_face_count")
+        elif settings.decimate_target == 'ERROR':
+            layout.prop(settings, "max_deviation")
+        else:
+            layout.prop(settings, "decimate_ratio")
         layout.prop(settings, "remesh_before_decimation")
 
         if settings.remesh_before_decimation:
             layout.prop(settings, "remesh_value")
 
         # Preset buttons in a single row
-        row = layout.row()
-        row.operator("mesh.set_decimate_ratio", text="0.25").ratio = 0.25
-        row.operator("mesh.set_decimate_ratio", text="0.1").ratio = 0.1
-        row.operator("mesh.set_decimate_ratio", text="0.025").ratio = 0.025
+        if settings.decimate_target == 'RATIO':
+            row = layout.row()
+            row.operator("mesh.set_decimate_ratio", text="0.25").ratio = 0.25
+            row.operator("mesh.set_decimate_ratio", text="0.1").ratio = 0.1
+            row.operator("mesh.set_decimate_ratio", text="0.025").ratio = 0.025
 
         # Options for the Decimation
         layout.prop(settings, "fix_non_manifold")
         layout.prop(settings, "fix_intersections")
+        if settings.fix_intersections:
+            layout.prop(settings, "relax_method")
 
         # Decimate button
         layout.operator(MESH_OT_decimate_and_fix.bl_idname)
@@ -338,12 +1026,22 @@ class MESH_PT_decimate_and_fix(Panel):
         # Just Fix button
         layout.operator("mesh.just_fix", text="Just Fix")
 
+        # LOD chain
+        layout.separator()
+        lod_column = layout.column(align=True)
+        lod_column.label(text="LOD Chain:")
+        lod_column.prop(settings, "lod_levels")
+        lod_column.prop(settings, "lod_ratio")
+        lod_column.prop(settings, "lod_output")
+        lod_column.operator(MESH_OT_lod_chain.bl_idname)
+
 
 def register():
     bpy.utils.register_class(MESH_OT_decimate_and_fix)
     bpy.utils.register_class(MESH_PT_decimate_and_fix)
     bpy.utils.register_class(MESH_OT_set_decimate_ratio)
     bpy.utils.register_class(MESH_OT_just_fix)
+    bpy.utils.register_class(MESH_OT_lod_chain)
     bpy.utils.register_class(DecimateAndFixSettings)
     bpy.types.Scene.decimate_and_fix_settings = bpy.props.PointerProperty(type=DecimateAndFixSettings)
 
@@ -352,6 +1050,7 @@ def unregister():
     bpy.utils.unregister_class(MESH_PT_decimate_and_fix)
     bpy.utils.unregister_class(MESH_OT_set_decimate_ratio)
     bpy.utils.unregister_class(MESH_OT_just_fix)
+    bpy.utils.unregister_class(MESH_OT_lod_chain)
     bpy.utils.unregister_class(DecimateAndFixSettings)
     del bpy.types.Scene.decimate_and_fix_settings
 
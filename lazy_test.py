@@ -10,80 +10,61 @@ bl_info = {
     "category": "Mesh",
 }
 
+import sys
 import bpy
+import bmesh
 from bpy.types import Operator, Panel
 from mathutils import Vector, Matrix
 
 
-
-def make_non_manifold(obj):
-    # Ensure the 3D Printing Toolbox is enabled
-    addon_key = 'mesh_3d_print_toolbox'
-    if addon_key not in bpy.context.preferences.addons:
-        bpy.ops.preferences.addon_enable(module=addon_key)
-    
-    # Save the current mode so we can return to it later
-    original_mode = obj.mode
-    
-    # Ensure object is in edit mode for the operation
-    if obj.mode != 'EDIT':
-        bpy.ops.object.mode_set(mode='EDIT')
-    
-    try:
-        # Perform the make non-manifold operation
-        bpy.ops.mesh.print3d_clean_non_manifold()
-    except AttributeError:
-        print("3D Printing Toolbox addon not installed!")
-        return {'CANCELLED'}
-    finally:
-        # Return to the original mode
-        if original_mode != 'EDIT':
-            bpy.ops.object.mode_set(mode=original_mode)
-    
-    return {'FINISHED'}
-
-
-def check_non_manifold(obj):
-    # Ensure the object is a mesh
-    if obj.type != 'MESH':
-        raise ValueError("Provided object is not a mesh")
-    
-    # Store the current mode so we can revert back to it
-    original_mode = obj.mode
-    
-    # Switch to object mode to safely switch to edit mode
-    bpy.ops.object.mode_set(mode='OBJECT')
-    bpy.context.view_layer.objects.active = obj
-    
-    # Switch to edit mode to select non-manifold vertices
-    bpy.ops.object.mode_set(mode='EDIT')
-    bpy.ops.mesh.select_all(action='DESELECT')
-    bpy.ops.mesh.select_non_manifold()
-    
-    # Switch back to object mode to read selection data
-    bpy.ops.object.mode_set(mode='OBJECT')
-    
-    # Check if any vertex is selected, indicating non-manifold vertices
-    is_manifold = any(v.select for v in obj.data.vertices)
-    
-    # Return to the original mode
-    bpy.ops.object.mode_set(mode=original_mode)
-    
-    return not is_manifold
+# The manifold repair is the one of Lazy Chip when it is enabled, whatever
+# its folder name (zip installs often have a suffix), else a basic local one.
+def lazy_chip_repair():
+    for addon_name in bpy.context.preferences.addons.keys():
+        mesh_operators = sys.modules.get(addon_name + ".mesh_operators")
+        if mesh_operators is not None and hasattr(mesh_operators, "repair_object"):
+            return mesh_operators.repair_object
+    return None
+
+
+# Basic repair on the mesh data: doubles and loose vertices, then hole filling
+# and removal of the non-manifold vertices until nothing is left to fix.
+def repair_locally(obj, max_iterations):
+    if obj.mode == 'EDIT':
+        bpy.ops.object.mode_set(mode='OBJECT')
+    bm = bmesh.new()
+    bm.from_mesh(obj.data)
+    bmesh.ops.remove_doubles(bm, verts=bm.verts[:], dist=0.0001)
+    bmesh.ops.delete(bm, geom=[vert for vert in bm.verts if not vert.link_faces], context='VERTS')
+    for i in range(max_iterations):
+        boundary_edges = [edge for edge in bm.edges if edge.is_boundary]
+        if boundary_edges:
+            bmesh.ops.holes_fill(bm, edges=boundary_edges, sides=0)
+        non_manifold_verts = [vert for vert in bm.verts if not vert.is_manifold]
+        if not non_manifold_verts:
+            if not any(edge.is_boundary for edge in bm.edges):
+                break
+            continue
+        bmesh.ops.delete(bm, geom=non_manifold_verts, context='VERTS')
+    bmesh.ops.recalc_face_normals(bm, faces=bm.faces[:])
+    bm.to_mesh(obj.data)
+    bm.free()
+    obj.data.update()
 
 
 def make_non_manifold_iterate(obj, max_iterations):
-    for i in range(max_iterations):
-        make_non_manifold(obj)
-        if not check_non_manifold(obj):
-            break
+    repair_object = lazy_chip_repair()
+    if repair_object is None:
+        repair_locally(obj, max_iterations)
+        return None
+    return repair_object(obj, max_iterations)
 
 
 
 class OBJECT_OT_test_make_manifold(Operator):
     bl_idname = "object.test_make_manifold"
     bl_label = "Test Make Manifold"
-    bl_description = "Using the 3D print toolbox make manifold."
+    bl_description = "Makes the mesh manifold with the Lazy Chip repair, or a basic one without it."
     bl_options = {'REGISTER', 'UNDO'}
 
     @classmethod
@@ -94,7 +75,8 @@ class OBJECT_OT_test_make_manifold(Operator):
     def execute(self, context):
         obj = context.active_object
 
-        make_non_manifold_iterate(obj, 10)
+        if make_non_manifold_iterate(obj, 10) is None:
+            self.report({'WARNING'}, "Lazy Chip is not enabled, used the basic repair")
 
         return {'FINISHED'}
 
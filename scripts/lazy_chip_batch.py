@@ -0,0 +1,80 @@
+# Lazy Chip over folders of models, without the UI.
+# Chips every STL/OBJ file of a folder into another one, one file at a time:
+#
+#   blender -b --factory-startup --python-exit-code 1 -P scripts/lazy_chip_batch.py -- \
+#       --input models/ --output chipped/ [--preset stonechipping] [--resolution 96] [--report timings.json]
+#
+# The settings start from the Lazy Chip defaults, then the preset if given,
+# then the single values given on the command line. Every file is imported,
+# chipped, repaired if not watertight and exported with the same relative
+# path; the time of each step is printed and written to the JSON report.
+# The exit code is 1 if any file failed. The same pipeline can be run from the
+# bpy module through lazy_chip.batch.chip_folder.
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lazy_chip.batch import chip_folder, batch_params, budget_settings, write_report
+from lazy_chip.preset_operators import PRESETS
+
+
+# Command line flags of the single damage settings: (flag, attribute, type, help)
+PARAMETER_FLAGS = [
+    ("--resolution", "resolution", int, "Remesh resolution"),
+    ("--edge-relax", "edge_relax", float, "Smoothing of the remeshed edges"),
+    ("--edge-push", "edge_push", float, "How much the noise pushes in rather than out"),
+    ("--noise-scale", "noise_scale", float, "Size of the damage noise"),
+    ("--noise-strength", "noise_strength", float, "Depth of the damage"),
+    ("--noise-contrast", "noise_contrast", float, "Contrast of the damage noise"),
+    ("--seed", "seed", int, "Noise seed, the same for all files unless --random-seed"),
+    ("--simplify", "simplify_damage_ratio", float, "Decimation ratio of the damaged surface (1 = none)"),
+    ("--intersect", "intersect_mode", str.upper, "BOOLEAN to intersect with the original, CLAMP to clamp the vertices inside it"),
+]
+
+
+def parse_arguments():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(description="Lazy Chip over folders of STL/OBJ models")
+    parser.add_argument("--input", required=True, help="Folder of the models to chip")
+    parser.add_argument("--output", required=True, help="Folder the chipped models are written to")
+    parser.add_argument("--recursive", action="store_true", help="Also chip the models of the subfolders")
+    parser.add_argument("--format", choices=["stl", "obj"], default=None, help="Output format, the input one by default")
+    parser.add_argument("--preset", choices=list(PRESETS), default=None, help="Material preset the settings start from")
+    for flag, attribute, value_type, help_text in PARAMETER_FLAGS:
+        parser.add_argument(flag, dest=attribute, type=value_type, default=None, help=help_text)
+    parser.add_argument("--fixed-scale", type=float, default=None, help="Size the damage is relative to, instead of each object's smallest dimension")
+    parser.add_argument("--random-seed", action="store_true", help="A different seed for every file")
+    parser.add_argument("--attempts", type=int, default=5, help="Seeds tried per object until it is watertight")
+    parser.add_argument("--no-repair", action="store_true", help="Do not repair the objects that are not watertight")
+    parser.add_argument("--voxel-budget", type=int, default=256, help="Millions of remesh voxels an object may use")
+    parser.add_argument("--memory-budget", type=int, default=4096, help="Estimated peak memory (MB) an object may use")
+    parser.add_argument("--over-budget", choices=["TILE", "CLAMP", "WARN"], default="TILE", help="What to do with objects over budget")
+    parser.add_argument("--report", default=None, help="Where to write the JSON timing report, <output>/lazy_chip_report.json by default")
+    return parser.parse_args(argv)
+
+
+def main():
+    arguments = parse_arguments()
+    values = {attribute: getattr(arguments, attribute) for flag, attribute, value_type, help_text in PARAMETER_FLAGS}
+    if arguments.fixed_scale is not None:
+        values.update(fixed_scale_check=True, fixed_scale=arguments.fixed_scale)
+    params = batch_params(arguments.preset, **values)
+    budget = budget_settings(arguments.voxel_budget, arguments.memory_budget, arguments.over_budget)
+
+    reports = chip_folder(arguments.input, arguments.output, params, arguments.attempts, budget,
+                          repair=not arguments.no_repair, output_format=arguments.format,
+                          recursive=arguments.recursive, random_seed=arguments.random_seed)
+
+    report_path = arguments.report or os.path.join(arguments.output, "lazy_chip_report.json")
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    write_report(reports, report_path)
+    failed = [report for report in reports if "error" in report]
+    print("%d files chipped, %d failed, %.1fs in total. Report written to %s" % (
+        len(reports) - len(failed), len(failed), sum(report["total"] for report in reports), report_path))
+    if failed:
+        sys.exit(1)
+
+
+main()
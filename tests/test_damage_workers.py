@@ -0,0 +1,115 @@
+import pytest
+
+bpy = pytest.importorskip("bpy")
+
+from types import SimpleNamespace
+from lazy_chip import damage
+
+
+class RecordingPool:
+    """
+    Worker pool returning every job at once, recording what was submitted.
+    """
+
+    def __init__(self):
+        self.submitted = []
+        self.pending = []
+
+    def submit(self, key, verts, tris, params, label=None, weights=None):
+        self.submitted.append(key)
+        self.pending.append(key)
+
+    def results(self, timeout=None):
+        while self.pending:
+            yield (self.pending.pop(0), None, None)
+
+    def labels_in_flight(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class FakeObject:
+    def __init__(self, name):
+        self.name = name
+
+    def select_set(self, state):
+        pass
+
+
+class ModalApplyDamage:
+    """
+    The modal path of Apply Damage, without the window manager.
+    """
+    records_journal = False
+    bl_label = damage.LAZYCHIP_OP_applydamage.bl_label
+    invoke = damage.LAZYCHIP_OP_applydamage.invoke
+    tick = damage.LAZYCHIP_OP_applydamage.tick
+    resubmit = damage.LAZYCHIP_OP_applydamage.resubmit
+    check_object = damage.LAZYCHIP_OP_applydamage.check_object
+    submit_workers = damage.LAZYCHIP_OP_applydamage.submit_workers
+
+    def __init__(self, objects):
+        self.objects = objects
+
+    def selected_meshes(self, context):
+        return list(self.objects)
+
+    def read_source(self, scene, current_mesh):
+        return None, None, None
+
+    def planned_params(self, scene, current_mesh, can_tile):
+        return None
+
+    def receive_worker_result(self, context, result):
+        (object_name, attempt), verts, faces = result
+        return next(current_mesh for current_mesh in self.objects if current_mesh.name == object_name), attempt
+
+    def report(self, level, message):
+        pass
+
+
+def run_modal(monkeypatch, object_count, attempts, watertight_from_attempt):
+    pool = RecordingPool()
+    attempts_of = {}
+
+    def is_watertight_mesh(current_mesh):
+        attempts_of[current_mesh.name] = attempts_of.get(current_mesh.name, -1) + 1
+        return attempts_of[current_mesh.name] >= watertight_from_attempt
+
+    monkeypatch.setattr(damage, "worker_pool", lambda weathering_props: pool)
+    monkeypatch.setattr(damage, "take_preview_result", lambda current_mesh, params: False)
+    monkeypatch.setattr(damage, "is_watertight_mesh", is_watertight_mesh)
+    monkeypatch.setattr(damage.DamageParameters, "from_props", staticmethod(lambda weathering_props: None))
+
+    weathering_props = SimpleNamespace(
+        use_engine_property=True, use_workers_property=True, speculative_seeds_property=1,
+        attempts_property=attempts, fix_between_steps_property=False, random_seed_property=False)
+    window_manager = SimpleNamespace(
+        progress_begin=lambda low, high: None, event_timer_add=lambda interval, window=None: None,
+        modal_handler_add=lambda operator: None)
+    context = SimpleNamespace(
+        scene=SimpleNamespace(weathering_props=weathering_props), window=None, window_manager=window_manager,
+        view_layer=SimpleNamespace(objects=SimpleNamespace(active=None)))
+
+    operator = ModalApplyDamage([FakeObject("Object" + str(index)) for index in range(object_count)])
+    assert operator.invoke(context, None) == {'RUNNING_MODAL'}
+    while operator.tick(context):
+        pass
+    return operator, pool
+
+
+def test_workers_submit_each_object_once(monkeypatch):
+    operator, pool = run_modal(monkeypatch, 5, attempts=3, watertight_from_attempt=0)
+    assert sorted(pool.submitted) == [("Object" + str(index), 0) for index in range(5)]
+    assert operator.done == 5
+    assert operator.failed == 0
+
+
+def test_workers_resubmit_only_retries(monkeypatch):
+    operator, pool = run_modal(monkeypatch, 4, attempts=3, watertight_from_attempt=1)
+    assert len(pool.submitted) == 8
+    assert sorted(attempt for object_name, attempt in pool.submitted) == [0] * 4 + [1] * 4
+    assert operator.done == 4
+    assert operator.failed == 0